@@ -13,6 +13,10 @@ from .models import (
     ProductIncome,
     Sale,
     ProductCategory,
+    ApiToken,
+    IdempotencyKey,
+    SaleArchive,
+    SaleMonthlySummary,
 )
 from .telegram_utils import send_application_status
 
@@ -177,7 +181,7 @@ class ShopAdmin(admin.ModelAdmin):
         "total_sales_display",
         "created_at",
     ]
-    list_filter = ["is_active", "category", "created_at"]
+    list_filter = ["is_active", "category", "shard", "created_at"]
     search_fields = ["name", "owner__username", "phone"]
     readonly_fields = ["created_at", "updated_at", "approved_date", "shop_stats"]
     list_editable = ["is_active"]
@@ -311,12 +315,12 @@ class ProductAdmin(admin.ModelAdmin):
         "created_at",
     ]
     list_filter = ["shop", "created_at"]
-    search_fields = ["name", "shop__name"]
+    search_fields = ["name", "barcode", "shop__name"]
     readonly_fields = ["added_by", "created_at", "updated_at", "product_stats"]
     date_hierarchy = "created_at"
 
     fieldsets = (
-        ("Asosiy Ma'lumotlar", {"fields": ("shop", "name", "image")}),
+        ("Asosiy Ma'lumotlar", {"fields": ("shop", "name", "barcode", "image")}),
         ("Narx va Miqdor", {"fields": ("price", "quantity")}),
         ("Statistika", {"fields": ("product_stats",), "classes": ("collapse",)}),
         (
@@ -535,6 +539,67 @@ class ProductCategoryAdmin(admin.ModelAdmin):
     product_count.short_description = "Mahsulotlar soni"
 
 
+@admin.register(ApiToken)
+class ApiTokenAdmin(admin.ModelAdmin):
+    list_display = ["name", "user", "is_active", "created_at", "last_used_at"]
+    list_filter = ["is_active"]
+    search_fields = ["name", "user__username"]
+    readonly_fields = ["key", "created_at", "last_used_at"]
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ["key", "scope", "user", "status_code", "created_at", "expires_at"]
+    list_filter = ["scope"]
+    search_fields = ["key", "user__username"]
+    readonly_fields = [field.name for field in IdempotencyKey._meta.fields]
+
+
+@admin.register(SaleArchive)
+class SaleArchiveAdmin(admin.ModelAdmin):
+    list_display = [
+        "id",
+        "product",
+        "shop",
+        "quantity",
+        "total_amount",
+        "is_cancelled",
+        "created_at",
+    ]
+    list_filter = ["is_cancelled", "shop"]
+    search_fields = ["product__name", "customer_name"]
+    list_select_related = ["product", "shop"]
+    date_hierarchy = "created_at"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(SaleMonthlySummary)
+class SaleMonthlySummaryAdmin(admin.ModelAdmin):
+    list_display = [
+        "month",
+        "product",
+        "shop",
+        "sales_count",
+        "sold_quantity",
+        "revenue",
+        "cancelled_amount",
+    ]
+    list_filter = ["shop"]
+    list_select_related = ["product", "shop"]
+    date_hierarchy = "month"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 # Admin panel sozlamalari
 admin.site.site_header = "🏪 ShopControl Boshqaruv Paneli"
 admin.site.site_title = "ShopControl Admin"
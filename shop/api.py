@@ -0,0 +1,267 @@
+# shop/api.py
+"""Oflayn kassa (POS) ilovalari uchun JSON API"""
+import json
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from . import metrics, sharding
+from .counters import OutOfStock, record_sale
+from .decorators import api_token_required
+from .models import Product, Sale, SaleArchive
+from .watermarks import touch_shop
+
+API_SETTINGS = getattr(settings, "SHOP_API", {})
+MAX_BATCH = API_SETTINGS.get("MAX_BATCH", 500)
+
+
+@require_GET
+@api_token_required
+def pos_catalog(request, shop_id):
+    """
+    Do'kon katalogi. `?since=<ISO sana>` berilsa faqat shundan keyin
+    o'zgargan mahsulotlar qaytariladi.
+    """
+    shop = request.shop
+    products = Product.objects.filter(shop=shop).order_by("id")
+
+    since = request.GET.get("since")
+    if since:
+        since_dt = parse_datetime(since)
+        if since_dt is None:
+            return JsonResponse(
+                {"status": "error", "message": "since noto'g'ri formatda"}, status=400
+            )
+        products = products.filter(updated_at__gt=since_dt)
+
+    rows = [
+        {
+            "id": row["id"],
+            "name": row["name"],
+            "price": str(row["price"]),
+            "quantity": row["quantity"],
+            "unit": row["unit"],
+            "category": row["category__name"],
+            "barcode": row["barcode"],
+        }
+        for row in products.values(
+            "id", "name", "price", "quantity", "unit", "category__name", "barcode"
+        )
+    ]
+
+    return JsonResponse(
+        {
+            "shop": {"id": shop.id, "name": shop.name},
+            "generated_at": timezone.now().isoformat(),
+            "products": rows,
+        }
+    )
+
+
+INTEGER_FIELDS = ("product_id", "quantity")
+
+
+def _non_integer_field(payload):
+    """
+    Butun son bo'lishi kerak bo'lgan maydoni noto'g'ri birinchi qator:
+    (indeks, maydon) yoki None. JSON dagi 2.7, true yoki "2" jimgina 2 ga
+    aylanib hisobga yozilmasligi kerak.
+    """
+    for index, item in enumerate(payload):
+        if not isinstance(item, dict):
+            continue
+        for field in INTEGER_FIELDS:
+            if field not in item:
+                continue
+            value = item[field]
+            if isinstance(value, bool) or not isinstance(value, int):
+                return index, field
+    return None
+
+
+def _parse_lines(payload):
+    """Kelgan qatorlarni tekshirish: (to'g'ri qatorlar, xato natijalar)"""
+    lines = []
+    errors = []
+    seen = set()
+
+    for index, item in enumerate(payload):
+        raw_uuid = item.get("uuid") if isinstance(item, dict) else None
+        try:
+            client_uuid = uuid.UUID(str(raw_uuid))
+            product_id = item["product_id"]
+            quantity = item["quantity"]
+            if quantity <= 0:
+                raise ValueError
+        except (KeyError, TypeError, ValueError):
+            errors.append(
+                {"index": index, "uuid": raw_uuid, "status": "invalid"}
+            )
+            continue
+
+        if client_uuid in seen:
+            errors.append(
+                {"index": index, "uuid": str(client_uuid), "status": "duplicate"}
+            )
+            continue
+        seen.add(client_uuid)
+
+        lines.append(
+            {
+                "index": index,
+                "uuid": client_uuid,
+                "product_id": product_id,
+                "quantity": quantity,
+                "customer_name": str(item.get("customer_name") or "")[:200],
+            }
+        )
+
+    return lines, errors
+
+
+def _apply_batch(shop, user, lines):
+    """Butun paketni bitta tranzaksiyada qo'llash"""
+    results = []
+
+    with transaction.atomic(using=sharding.shard_for(shop)):
+        uuids = [line["uuid"] for line in lines]
+        # client_uuid bazada yagona: boshqa do'kon sotuvining id si berilmaydi
+        existing = {}
+        for model in (Sale, SaleArchive):
+            for client_uuid, sale_id, owner_id in model.objects.filter(
+                client_uuid__in=uuids
+            ).values_list("client_uuid", "id", "shop_id"):
+                existing[client_uuid] = sale_id if owner_id == shop.id else None
+        prices = dict(
+            Product.objects.filter(
+                shop=shop, id__in={line["product_id"] for line in lines}
+            ).values_list("id", "price")
+        )
+
+        new_sales = []
+        for line in lines:
+            result = {"index": line["index"], "uuid": str(line["uuid"])}
+
+            if line["uuid"] in existing:
+                sale_id = existing[line["uuid"]]
+                if sale_id is None:
+                    result.update(status="conflict", message="UUID boshqa sotuvda ishlatilgan")
+                else:
+                    result.update(status="duplicate", sale_id=sale_id)
+                results.append(result)
+                continue
+
+            if line["product_id"] not in prices:
+                result.update(status="invalid", message="Mahsulot topilmadi")
+                results.append(result)
+                continue
+
+            unit_price = prices[line["product_id"]]
+            sale = Sale(
+                shop=shop,
+                product_id=line["product_id"],
+                quantity=line["quantity"],
+                unit_price=unit_price,
+                total_amount=Decimal(line["quantity"]) * unit_price,
+                customer_name=line["customer_name"],
+                cashier=user,
+                client_uuid=line["uuid"],
+            )
+            # Atomar kamaytirish: omborda yetarli bo'lsagina yangilanadi
+            try:
+                record_sale(sale)
+            except OutOfStock as exc:
+                result.update(status="conflict", available=exc.available)
+                results.append(result)
+                continue
+            new_sales.append((result, sale))
+
+        sharding.assign_ids([sale for _, sale in new_sales])
+        Sale.objects.bulk_create([sale for _, sale in new_sales])
+        if new_sales:
+            # bulk_create signal yubormaydi - sotuvlar belgisi bir marta
+            touch_shop(shop.id, sales=True)
+        for result, sale in new_sales:
+            result.update(status="created", sale_id=sale.id, total_amount=str(sale.total_amount))
+            results.append(result)
+
+    if new_sales:
+        metrics.inc("shop_sales_total", len(new_sales), shop_id=shop.id)
+
+    return results
+
+
+@csrf_exempt
+@require_POST
+@api_token_required
+def pos_sync_sales(request, shop_id):
+    """
+    Oflayn yozilgan sotuvlarni yuklash.
+
+    So'rov: {"sales": [{"uuid": "...", "product_id": 1, "quantity": 2,
+                       "customer_name": ""}, ...]}
+    Har bir qator uchun natija: created / duplicate / conflict / invalid.
+    """
+    try:
+        payload = json.loads(request.body)
+        items = payload["sales"]
+        if not isinstance(items, list):
+            raise TypeError
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse(
+            {"status": "error", "message": "JSON noto'g'ri formatda"}, status=400
+        )
+
+    if len(items) > MAX_BATCH:
+        return JsonResponse(
+            {"status": "error", "message": f"Bir paketda ko'pi bilan {MAX_BATCH} ta sotuv"},
+            status=400,
+        )
+
+    invalid = _non_integer_field(items)
+    if invalid is not None:
+        index, field = invalid
+        return JsonResponse(
+            {
+                "status": "error",
+                "message": f"sales[{index}].{field} butun son bo'lishi kerak",
+                "index": index,
+            },
+            status=400,
+        )
+
+    lines, results = _parse_lines(items)
+
+    if lines:
+        try:
+            results += _apply_batch(request.shop, request.user, lines)
+        except IntegrityError:
+            # Parallel sinxronizatsiya xuddi shu UUID ni yozib ulgurgan -
+            # qayta urinishda ular "duplicate" bo'lib chiqadi
+            try:
+                results += _apply_batch(request.shop, request.user, lines)
+            except IntegrityError:
+                # Paket butunlay bekor qilindi - kassa uni keyinroq qayta yuboradi
+                results += [
+                    {
+                        "index": line["index"],
+                        "uuid": str(line["uuid"]),
+                        "status": "conflict",
+                        "message": "Parallel yuklash bilan to'qnashuv, qayta yuboring",
+                    }
+                    for line in lines
+                ]
+
+    results.sort(key=lambda result: result["index"])
+    summary = {}
+    for result in results:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+
+    return JsonResponse({"status": "ok", "summary": summary, "results": results})
@@ -0,0 +1,179 @@
+# shop/archive.py
+"""
+Eski sotuvlarni arxivlash.
+
+Sale jadvalida faqat oxirgi SHOP_ARCHIVE["HORIZON_DAYS"] kunlik sotuvlar
+qoladi, eskilari SaleArchive ga ko'chiriladi va har bir (mahsulot, oy)
+uchun SaleMonthlySummary yig'indisi yangilanadi - shu tufayli umumiy
+statistika aniq qoladi, lekin hisoblashda butun tarix skan qilinmaydi.
+
+Har bir bo'lak alohida tranzaksiyada ko'chiriladi, shuning uchun jarayon
+to'xtab qolsa keyingi ishga tushirishda davom etadi.
+"""
+import heapq
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from . import cache as shop_cache
+from . import sharding
+from .models import Sale, SaleArchive, SaleArchiveState, SaleMonthlySummary
+from .watermarks import touch_shop
+
+ARCHIVE = getattr(settings, "SHOP_ARCHIVE", {})
+
+SALE_FIELDS = [field.attname for field in Sale._meta.concrete_fields]
+ARCHIVE_RELATED = ("product", "cashier", "cancelled_by", "restored_by")
+
+
+def archive_cutoff(now=None, horizon_days=None):
+    """Arxivlash chegarasi: (hozir - horizon) oyining birinchi kuni"""
+    if horizon_days is None:
+        horizon_days = ARCHIVE.get("HORIZON_DAYS", 365)
+    now = timezone.localtime(now or timezone.now())
+    day = (now - timedelta(days=horizon_days)).date().replace(day=1)
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def get_archived_before(shop_id):
+    """Shu sanadan oldingi sotuvlar arxivda bo'lishi mumkin (yo'q bo'lsa None)"""
+    return (
+        SaleArchiveState.objects.filter(shop_id=shop_id)
+        .values_list("archived_before", flat=True)
+        .first()
+    )
+
+
+def _add_to_summaries(shop_id, sales):
+    totals = defaultdict(lambda: defaultdict(Decimal))
+    for sale in sales:
+        month = timezone.localtime(sale.created_at).date().replace(day=1)
+        row = totals[(sale.product_id, month)]
+        if sale.is_cancelled:
+            row["cancelled_count"] += 1
+            row["cancelled_quantity"] += sale.quantity
+            row["cancelled_amount"] += sale.total_amount
+        else:
+            row["sales_count"] += 1
+            row["sold_quantity"] += sale.quantity
+            row["revenue"] += sale.total_amount
+
+    for (product_id, month), values in totals.items():
+        updated = SaleMonthlySummary.objects.filter(
+            product_id=product_id, month=month
+        ).update(**{name: F(name) + value for name, value in values.items()})
+        if not updated:
+            SaleMonthlySummary.objects.create(
+                shop_id=shop_id, product_id=product_id, month=month, **values
+            )
+
+
+def archive_chunk(shop_id, cutoff, batch_size):
+    """Bitta bo'lakni ko'chirish; ko'chirilgan sotuvlar sonini qaytaradi"""
+    alias = sharding.shard_for(shop_id)
+    with transaction.atomic(using=alias):
+        sales = list(
+            Sale.objects.select_for_update()
+            .filter(shop_id=shop_id, created_at__lt=cutoff)
+            .order_by("id")[:batch_size]
+        )
+        if not sales:
+            return 0
+
+        SaleArchive.objects.bulk_create(
+            [
+                SaleArchive(**{name: getattr(sale, name) for name in SALE_FIELDS})
+                for sale in sales
+            ]
+        )
+        _add_to_summaries(shop_id, sales)
+        # delete() har bir sotuv uchun signal yuborardi (har biri Shop ni
+        # yangilaydi) - bo'lak uchun belgi va mahsulot versiyalari bir marta
+        sharding.delete_rows(alias, Sale, "id__in", [sale.id for sale in sales])
+        touch_shop(shop_id, sales=True)
+        product_ids = {sale.product_id for sale in sales}
+        transaction.on_commit(
+            lambda: [shop_cache.bump_product(product_id) for product_id in product_ids],
+            using=alias,
+        )
+
+    return len(sales)
+
+
+def archive_shop(shop_id, cutoff, batch_size=None):
+    """
+    Do'konning cutoff dan oldingi sotuvlarini bo'laklab ko'chirish.
+    Har bir bo'lakdan keyin ko'chirilganlar sonini yield qiladi.
+    """
+    batch_size = batch_size or ARCHIVE.get("BATCH_SIZE", 2000)
+
+    # Chegara ko'chirishdan oldin yoziladi: jarayon o'rtasida ham
+    # chegaradan oldingi oraliq uchun ikkala jadval o'qiladi
+    state, created = SaleArchiveState.objects.get_or_create(
+        shop_id=shop_id, defaults={"archived_before": cutoff}
+    )
+    if not created and state.archived_before < cutoff:
+        state.archived_before = cutoff
+        state.save(update_fields=["archived_before", "updated_at"])
+
+    while True:
+        moved = archive_chunk(shop_id, cutoff, batch_size)
+        if not moved:
+            break
+        yield moved
+
+
+def archived_totals(**filters):
+    """Arxivdagi yig'indilar (shop_id= yoki product_id= bo'yicha)"""
+    totals = SaleMonthlySummary.objects.filter(**filters).aggregate(
+        sold_quantity=Sum("sold_quantity"),
+        revenue=Sum("revenue"),
+        cancelled_quantity=Sum("cancelled_quantity"),
+        cancelled_amount=Sum("cancelled_amount"),
+    )
+    return {
+        "sold_quantity": totals["sold_quantity"] or 0,
+        "revenue": totals["revenue"] or Decimal("0.00"),
+        "cancelled_quantity": totals["cancelled_quantity"] or 0,
+        "cancelled_amount": totals["cancelled_amount"] or Decimal("0.00"),
+    }
+
+
+def sales_in_range(shop_id, start=None, end=None, product_id=None, limit=None):
+    """
+    Sotuvlar ro'yxati (yangilari birinchi). Arxiv faqat so'ralgan oraliq
+    arxivlangan davrga tushganda o'qiladi. start/end - aware datetime.
+    """
+    filters = {"shop_id": shop_id}
+    if product_id is not None:
+        filters["product_id"] = product_id
+    if start is not None:
+        filters["created_at__gte"] = start
+    if end is not None:
+        filters["created_at__lt"] = end
+
+    hot = sharding.select_related(Sale.objects.filter(**filters), *ARCHIVE_RELATED)
+    if limit is not None:
+        hot = hot[:limit]
+    hot = list(hot)
+
+    archived_before = get_archived_before(shop_id)
+    reaches_archive = archived_before is not None and (
+        start is None or start < archived_before
+    )
+    if limit is not None and len(hot) >= limit:
+        reaches_archive = False
+    if not reaches_archive:
+        return hot
+
+    cold = sharding.select_related(SaleArchive.objects.filter(**filters), *ARCHIVE_RELATED)
+    if limit is not None:
+        cold = cold[:limit]
+
+    merged = heapq.merge(hot, cold, key=lambda sale: sale.created_at, reverse=True)
+    return list(merged)[:limit]
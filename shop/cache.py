@@ -0,0 +1,205 @@
+# shop/cache.py
+"""
+Statistika uchun kesh qatlami.
+
+Kalitlar versiyalangan: har bir do'kon (katalog va sotuvlar) hamda har bir
+mahsulot uchun alohida versiya saqlanadi. Ma'lumot o'zgarganda versiya
+yangilanadi (signals.py), eski kalitlar esa o'z-o'zidan eskirib ketadi.
+"""
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import metrics
+
+SHOP_CACHE = getattr(settings, "SHOP_CACHE", {})
+
+CACHE_ALIAS = SHOP_CACHE.get("ALIAS", "default")
+STATS_TIMEOUT = SHOP_CACHE.get("STATS_TIMEOUT", 300)
+LOCK_TIMEOUT = SHOP_CACHE.get("LOCK_TIMEOUT", 10)
+LOCK_WAIT = SHOP_CACHE.get("LOCK_WAIT", 2.0)
+
+# Versiya doiralari
+SHOP_CATALOG = "catalog"
+SHOP_SALES = "sales"
+PRODUCT = "product"
+BOT = "bot"
+
+_MISSING = object()
+
+# Jarayon ichidagi hisoblagichlar (sozlash uchun)
+_counters = Counter()
+
+# Bir xil kalit uchun parallel hisoblashni bitta oqimga yig'ish
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def _version_key(scope, obj_id):
+    return f"shop:v:{scope}:{obj_id}"
+
+
+def _new_version():
+    return time.time_ns()
+
+
+def get_versions(*pairs):
+    """(doira, id) juftliklari uchun versiyalarni bitta so'rovda olish"""
+    cache = get_cache()
+    keys = [_version_key(scope, obj_id) for scope, obj_id in pairs]
+    found = cache.get_many(keys)
+
+    missing = {key: _new_version() for key in keys if key not in found}
+    if missing:
+        # Versiya yo'qolgan bo'lsa (masalan, keshdan chiqarilgan) yangisini berish
+        for key, version in missing.items():
+            if not cache.add(key, version, None):
+                missing[key] = cache.get(key, version)
+        found.update(missing)
+
+    return [found[key] for key in keys]
+
+
+def get_version(scope, obj_id):
+    return get_versions((scope, obj_id))[0]
+
+
+def bump_version(scope, obj_id):
+    """Versiyani yangilash - eski kalitlar endi ishlatilmaydi"""
+    get_cache().set(_version_key(scope, obj_id), _new_version(), None)
+    _counters["invalidations"] += 1
+
+
+def bump_shop(shop_id, catalog=False, sales=False):
+    if catalog:
+        bump_version(SHOP_CATALOG, shop_id)
+    if sales:
+        bump_version(SHOP_SALES, shop_id)
+
+
+def bump_product(product_id):
+    bump_version(PRODUCT, product_id)
+
+
+def shop_versions(shop_id):
+    """Do'konning (katalog, sotuv) versiyalari"""
+    return get_versions((SHOP_CATALOG, shop_id), (SHOP_SALES, shop_id))
+
+
+def attach_shop_versions(shops):
+    """
+    Har bir do'konga `cache_version` qo'shish (shablon bo'laklari kaliti uchun).
+    Barcha versiyalar bitta get_many() bilan olinadi.
+    """
+    shops = list(shops)
+    pairs = []
+    for shop in shops:
+        pairs += [(SHOP_CATALOG, shop.id), (SHOP_SALES, shop.id)]
+    versions = get_versions(*pairs) if pairs else []
+
+    for index, shop in enumerate(shops):
+        catalog_version, sales_version = versions[2 * index : 2 * index + 2]
+        shop.cache_version = f"{catalog_version}-{sales_version}"
+    return shops
+
+
+class _KeyLock:
+    def __init__(self, key):
+        self.key = key
+
+    def __enter__(self):
+        with _locks_guard:
+            entry = _locks.get(self.key)
+            if entry is None:
+                entry = _locks[self.key] = [threading.Lock(), 0]
+            entry[1] += 1
+        entry[0].acquire()
+        return self
+
+    def __exit__(self, *exc):
+        with _locks_guard:
+            entry = _locks[self.key]
+            entry[0].release()
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _locks[self.key]
+
+
+def get_or_compute(key, compute, timeout=None):
+    """
+    Keshdan olish yoki hisoblash.
+
+    Bir vaqtda kelgan bir nechta miss faqat bitta hisoblashga olib keladi:
+    jarayon ichida - qulf orqali, jarayonlar o'rtasida - cache.add() qulfi orqali.
+    """
+    cache = get_cache()
+    timeout = STATS_TIMEOUT if timeout is None else timeout
+
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        _counters["hits"] += 1
+        return value
+
+    with _KeyLock(key):
+        # Qulfni kutayotganda boshqa oqim hisoblab qo'ygan bo'lishi mumkin
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            _counters["hits"] += 1
+            _counters["coalesced"] += 1
+            return value
+
+        _counters["misses"] += 1
+        lock_key = f"{key}:lock"
+
+        acquired = cache.add(lock_key, 1, LOCK_TIMEOUT)
+        if not acquired:
+            # Boshqa jarayon hisoblayapti - biroz kutib ko'ramiz
+            deadline = time.monotonic() + LOCK_WAIT
+            delay = 0.01
+            while time.monotonic() < deadline:
+                time.sleep(delay)
+                value = cache.get(key, _MISSING)
+                if value is not _MISSING:
+                    _counters["coalesced"] += 1
+                    return value
+                delay = min(delay * 2, 0.2)
+            _counters["lock_timeouts"] += 1
+
+        try:
+            value = compute()
+            cache.set(key, value, timeout)
+        finally:
+            if acquired:
+                cache.delete(lock_key)
+
+        return value
+
+
+def get_cache_stats():
+    """Hit/miss hisoblagichlari"""
+    stats = dict(_counters)
+    for name in ("hits", "misses", "coalesced", "lock_timeouts", "invalidations"):
+        stats.setdefault(name, 0)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    stats["backend"] = settings.CACHES[CACHE_ALIAS]["BACKEND"]
+    return stats
+
+
+def reset_cache_stats():
+    _counters.clear()
+
+
+metrics.register_collector(
+    lambda: [
+        ("shop_cache_requests_total", {"result": "hit"}, _counters["hits"]),
+        ("shop_cache_requests_total", {"result": "miss"}, _counters["misses"]),
+    ]
+)
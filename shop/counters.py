@@ -0,0 +1,195 @@
+# shop/counters.py
+"""
+Product hisoblagichlari (total_income_qty, sold_qty, revenue, cancelled_qty).
+
+Hisoblagichlar va ombor miqdori bitta UPDATE ... SET x = x + n so'rovida
+o'zgaradi, shuning uchun parallel so'rovlarda ham yo'qolmaydi. Ombordan
+ayirish WHERE quantity >= n sharti bilan - qoldiq manfiy bo'lmaydi. update()
+signal yubormaydi - kesh versiyalari shu yerda yangilanadi va jonli panelga
+hodisa yuboriladi (events.py).
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import (
+    DecimalField,
+    F,
+    IntegerField,
+    OuterRef,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import cache as shop_cache
+from . import events, sharding
+from .models import Product, ProductIncome, Sale, SaleMonthlySummary
+from .watermarks import touch_shop
+
+
+class OutOfStock(ValueError):
+    """Omborda yetarli mahsulot yo'q - tranzaksiya bekor qilinishi kerak"""
+
+    def __init__(self, product_id, available):
+        super().__init__(f"Omborda yetarli mahsulot yo'q! Mavjud: {available} dona")
+        self.product_id = product_id
+        self.available = available
+
+
+def _apply(product_id, shop_id=None, event="stock", require=None, **deltas):
+    """require - ombordan ayiriladigan miqdor: kam bo'lsa OutOfStock"""
+    if shop_id is None:
+        located = sharding.locate(product_id=product_id)
+        shop_id = located[0] if located else None
+
+    # So'rovlar chaqiruvchi tranzaksiyani ochgan do'kon bazasiga (so'rovdan
+    # tashqarida joriy baza "default")
+    with sharding.use_shop(shop_id):
+        products = Product.objects.filter(pk=product_id)
+        if require is not None:
+            products = products.filter(quantity__gte=require)
+        values = {name: F(name) + delta for name, delta in deltas.items()}
+        if not products.update(updated_at=timezone.now(), **values) and require is not None:
+            available = (
+                Product.objects.filter(pk=product_id).values_list("quantity", flat=True).first()
+            )
+            raise OutOfStock(product_id, available)
+
+        touch_shop(shop_id, catalog=True)
+        transaction.on_commit(
+            lambda: shop_cache.bump_product(product_id), using=sharding.current()
+        )
+        events.publish(shop_id, event, [product_id])
+
+
+def record_income(product_id, quantity, shop_id=None):
+    """Kirim: ombor miqdori mahsulot formasida o'zgaradi, bu yerda faqat hisoblagich"""
+    _apply(product_id, shop_id, event="income", total_income_qty=quantity)
+
+
+def record_sale(sale):
+    """
+    Yangi sotuv: ombordan ayirish va sotuv hisoblagichlari. Ombor yetmasa
+    OutOfStock - sotuv bilan bitta tranzaksiyada chaqirilishi kerak.
+    """
+    _apply(
+        sale.product_id,
+        sale.shop_id,
+        event="sale",
+        require=sale.quantity,
+        quantity=-sale.quantity,
+        sold_qty=sale.quantity,
+        revenue=sale.total_amount,
+    )
+
+
+def record_cancel(sale):
+    """Bekor qilish: omborga qaytarish"""
+    _apply(
+        sale.product_id,
+        sale.shop_id,
+        event="cancel",
+        quantity=sale.quantity,
+        sold_qty=-sale.quantity,
+        revenue=-sale.total_amount,
+        cancelled_qty=sale.quantity,
+    )
+
+
+def record_restore(sale):
+    """Qayta tiklash: bekor qilishning teskarisi (ombor yetmasa OutOfStock)"""
+    _apply(
+        sale.product_id,
+        sale.shop_id,
+        event="restore",
+        require=sale.quantity,
+        quantity=-sale.quantity,
+        sold_qty=sale.quantity,
+        revenue=sale.total_amount,
+        cancelled_qty=-sale.quantity,
+    )
+
+
+def _total(model, field, output_field, **filters):
+    subquery = (
+        model.objects.filter(product=OuterRef("pk"), **filters)
+        .order_by()
+        .values("product")
+        .annotate(total=Sum(field))
+        .values("total")
+    )
+    return Coalesce(
+        Subquery(subquery, output_field=output_field), Value(0), output_field=output_field
+    )
+
+
+def counter_report(shop_id):
+    """
+    Do'kon mahsulotlarining joriy va haqiqiy (kirim, joriy sotuvlar va arxiv
+    yig'indilaridan hisoblangan) qiymatlari - bitta so'rovda.
+    [(product_id, joriy, haqiqiy), ...]
+    """
+    integer = IntegerField()
+    money = DecimalField(max_digits=16, decimal_places=2)
+
+    rows = (
+        Product.objects.filter(shop_id=shop_id)
+        .order_by("id")
+        .annotate(
+            exp_income=_total(ProductIncome, "quantity", integer),
+            exp_sold=_total(Sale, "quantity", integer, is_cancelled=False),
+            exp_revenue=_total(Sale, "total_amount", money, is_cancelled=False),
+            exp_cancelled=_total(Sale, "quantity", integer, is_cancelled=True),
+            arch_sold=_total(SaleMonthlySummary, "sold_quantity", integer),
+            arch_revenue=_total(SaleMonthlySummary, "revenue", money),
+            arch_cancelled=_total(SaleMonthlySummary, "cancelled_quantity", integer),
+        )
+        .values(
+            "id",
+            *Product.COUNTER_FIELDS,
+            "exp_income",
+            "exp_sold",
+            "exp_revenue",
+            "exp_cancelled",
+            "arch_sold",
+            "arch_revenue",
+            "arch_cancelled",
+        )
+    )
+
+    report = []
+    for row in rows:
+        current = {name: row[name] for name in Product.COUNTER_FIELDS}
+        expected = {
+            "total_income_qty": row["exp_income"],
+            "sold_qty": row["exp_sold"] + row["arch_sold"],
+            "revenue": Decimal(row["exp_revenue"]) + Decimal(row["arch_revenue"]),
+            "cancelled_qty": row["exp_cancelled"] + row["arch_cancelled"],
+        }
+        report.append((row["id"], current, expected))
+    return report
+
+
+def find_drift(shop_id):
+    """Hisoblagichi haqiqiy qiymatdan farq qiladigan mahsulotlar"""
+    return [
+        (product_id, current, expected)
+        for product_id, current, expected in counter_report(shop_id)
+        if current != expected
+    ]
+
+
+def repair(drift):
+    """find_drift natijasini bazaga yozish"""
+    now = timezone.now()
+    products = [
+        Product(id=product_id, updated_at=now, **expected)
+        for product_id, _current, expected in drift
+    ]
+    Product.objects.bulk_update(
+        products, (*Product.COUNTER_FIELDS, "updated_at"), batch_size=500
+    )
+    for product_id, _current, _expected in drift:
+        shop_cache.bump_product(product_id)
@@ -1,7 +1,25 @@
 # shop/decorators.py (yangi fayl yaratish)
+import hashlib
+import time
+import uuid
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.staticfiles.storage import staticfiles_storage
 from django.core.exceptions import PermissionDenied
+from django.db import IntegrityError, transaction
+from django.http import HttpResponseRedirect, JsonResponse
 from django.shortcuts import get_object_or_404
-from .models import Shop, Sale
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+from . import metrics, sharding
+from .models import ApiToken, IdempotencyKey, Shop, Sale
+
+IDEMPOTENCY = getattr(settings, "SHOP_IDEMPOTENCY", {})
+CONDITIONAL = getattr(settings, "SHOP_CONDITIONAL_GET", {})
 
 
 def owner_required(view_func):
@@ -62,3 +80,219 @@ def cashier_or_above_required(view_func):
         return view_func(request, *args, **kwargs)
 
     return _wrapped_view
+
+
+def api_token_required(view_func):
+    """API uchun: `Authorization: Token <kalit>` va do'kon xodimi ekanligi"""
+
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        header = request.headers.get("Authorization", "")
+        scheme, _, key = header.partition(" ")
+        if scheme != "Token" or not key:
+            return JsonResponse({"status": "error", "message": "Token kerak"}, status=401)
+
+        token = (
+            ApiToken.objects.select_related("user")
+            .filter(key=key.strip(), is_active=True, user__is_active=True)
+            .first()
+        )
+        if token is None:
+            return JsonResponse(
+                {"status": "error", "message": "Token noto'g'ri"}, status=401
+            )
+
+        # last_used_at ni har so'rovda emas, daqiqada bir marta yangilash
+        now = timezone.now()
+        if token.last_used_at is None or (now - token.last_used_at).total_seconds() > 60:
+            ApiToken.objects.filter(pk=token.pk).update(last_used_at=now)
+
+        request.user = token.user
+        request.api_token = token
+
+        shop_id = kwargs.get("shop_id")
+        if shop_id:
+            shop = Shop.objects.filter(id=shop_id, is_active=True).first()
+            if shop is None:
+                return JsonResponse(
+                    {"status": "error", "message": "Do'kon topilmadi"}, status=404
+                )
+            if shop.owner_id != token.user_id and not shop.staff.filter(
+                user_id=token.user_id
+            ).exists():
+                return JsonResponse(
+                    {"status": "error", "message": "Bu do'kon uchun huquq yo'q"},
+                    status=403,
+                )
+            request.shop = shop
+
+        return view_func(request, *args, **kwargs)
+
+    return _wrapped_view
+
+
+def _replay(request, alias, key, scope):
+    """Takroriy so'rov: birinchi so'rov natijasini qaytarish"""
+    keys = IdempotencyKey.objects.using(alias)
+    deadline = time.monotonic() + IDEMPOTENCY.get("WAIT", 2.0)
+    while True:
+        record = keys.filter(key=key).first()
+        if record is None or record.is_completed or time.monotonic() >= deadline:
+            break
+        # Birinchi so'rov hali ishlanmoqda - natijani biroz kutish
+        time.sleep(0.05)
+
+    if record is None or record.user_id != request.user.id or record.scope != scope:
+        messages.error(request, "Forma eskirgan, iltimos qaytadan yuboring.")
+        return HttpResponseRedirect(request.get_full_path())
+
+    metrics.inc("shop_idempotent_replays_total", scope=scope)
+
+    if not record.is_completed:
+        messages.warning(request, "So'rov hali bajarilmoqda, iltimos kuting.")
+        return HttpResponseRedirect(request.get_full_path())
+
+    messages.info(request, "Bu amal allaqachon bajarilgan.")
+    response = HttpResponseRedirect(record.location)
+    response.status_code = record.status_code
+    return response
+
+
+def _queued_levels(request):
+    """Shu so'rovda navbatga qo'yilgan xabarlar darajalari (o'qilmaydi)"""
+    storage = messages.get_messages(request)
+    return [message.level for message in getattr(storage, "_queued_messages", ())]
+
+
+def idempotent(scope):
+    """
+    POST formalar uchun: `idempotency_key` maydoni (yoki Idempotency-Key
+    sarlavhasi) bo'yicha birinchi natijani saqlash va takroriy yuborishda
+    amalni qayta bajarmasdan o'sha natijani qaytarish.
+    Kalit yo'q bo'lsa view odatdagidek ishlaydi.
+
+    Kalit view bilan bitta tranzaksiyada (do'kon bazasida) yoziladi - jarayon
+    o'rtada to'xtasa kalit ham, amal ham qolmaydi. Faqat muvaffaqiyatli
+    redirect saqlanadi: xato yoki ogohlantirish xabari bilan qaytgan javob
+    (masalan, "allaqachon bekor qilinmagan") amal bajarilmaganini bildiradi.
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            raw_key = None
+            if request.method == "POST":
+                raw_key = request.POST.get("idempotency_key") or request.headers.get(
+                    "Idempotency-Key"
+                )
+            try:
+                key = uuid.UUID(str(raw_key)) if raw_key else None
+            except ValueError:
+                key = None
+            if key is None:
+                return view_func(request, *args, **kwargs)
+
+            alias = sharding.current()
+            keys = IdempotencyKey.objects.using(alias)
+            now = timezone.now()
+            with transaction.atomic(using=alias):
+                # Muddati o'tgan kalit (tozalash hali ishlamagan bo'lsa) yangidek qabul qilinadi
+                keys.filter(key=key, expires_at__lte=now).delete()
+                try:
+                    with transaction.atomic(using=alias):
+                        record = keys.create(
+                            key=key,
+                            user=request.user,
+                            scope=scope,
+                            expires_at=now + timedelta(seconds=IDEMPOTENCY.get("TTL", 86400)),
+                        )
+                except IntegrityError:
+                    record = None
+                else:
+                    queued = len(_queued_levels(request))
+                    response = view_func(request, *args, **kwargs)
+                    failed = any(
+                        level >= messages.WARNING for level in _queued_levels(request)[queued:]
+                    )
+
+                    # Faqat yakunlangan amal saqlanadi; xato bilan qayta chizilgan
+                    # forma yoki rad etilgan amal yangi kalit bilan qayta yuborilishi mumkin
+                    if (
+                        not failed
+                        and response.status_code in (301, 302, 303)
+                        and len(response["Location"]) <= 255
+                    ):
+                        keys.filter(pk=record.pk).update(
+                            status_code=response.status_code, location=response["Location"]
+                        )
+                    else:
+                        keys.filter(pk=record.pk).delete()
+
+            if record is None:
+                return _replay(request, alias, key, scope)
+            return response
+
+        return _wrapped_view
+
+    return decorator
+
+
+def conditional_page(watermarks):
+    """
+    Shartli GET (ETag/Last-Modified): sahifa o'zgarmagan bo'lsa view
+    umuman ishlamaydi - bitta belgi so'rovidan keyin 304 qaytariladi.
+
+    watermarks(**kwargs, user_id=...) - o'zgarish vaqtlari (tuple) yoki None
+    (sahifani ko'rish huquqi yo'q bo'lsa ham None: rad etilgan javobga
+    ETag/Last-Modified qo'shilmaydi va 304 berilmaydi). ETag ga
+    foydalanuvchi, CSRF cookie, URL va statik fayllar versiyasi ham
+    qo'shiladi - boshqa foydalanuvchi yoki deploydan keyingi sahifa mos
+    kelmaydi. Ko'rsatilmagan xabarlar (messages) bo'lsa tekshiruv
+    o'tkazib yuboriladi, aks holda ular 304 ortida qolib ketadi.
+    """
+
+    def lookup(request, *args, **kwargs):
+        if not hasattr(request, "_watermarks"):
+            request._watermarks = None
+            if CONDITIONAL.get("ENABLED", True) and not len(
+                messages.get_messages(request)
+            ):
+                request._watermarks = watermarks(*args, user_id=request.user.pk, **kwargs)
+        return request._watermarks
+
+    def etag(request, *args, **kwargs):
+        marks = lookup(request, *args, **kwargs)
+        if not marks:
+            return None
+        parts = [
+            request.resolver_match.view_name if request.resolver_match else "",
+            str(request.user.pk),
+            request.META.get("CSRF_COOKIE", ""),
+            request.get_full_path(),
+            CONDITIONAL.get("VERSION", ""),
+            getattr(staticfiles_storage, "manifest_hash", ""),
+            *(mark.isoformat() for mark in marks),
+        ]
+        return hashlib.md5("|".join(parts).encode(), usedforsecurity=False).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        marks = lookup(request, *args, **kwargs)
+        return max(marks) if marks else None
+
+    def decorator(view_func):
+        conditional_view = condition(etag_func=etag, last_modified_func=last_modified)(
+            view_func
+        )
+
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if request._watermarks:
+                # Brauzer har safar tekshirsin (Last-Modified bo'yicha taxminiy
+                # yangilik hisoblamasin), umumiy proksilar saqlamasin
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+
+        return _wrapped_view
+
+    return decorator
@@ -0,0 +1,198 @@
+# shop/events.py
+"""
+Do'kon paneli uchun jonli hodisalar (Server-Sent Events).
+
+Sotuv, bekor qilish, tiklash va ombor o'zgarishlari commit dan keyin shu
+jarayondagi obunachilarga tarqatiladi (jarayon ichidagi pub/sub). Har bir
+hodisa uchun xabar bir marta tayyorlanadi - do'kon statistikasi (keshdan)
+va o'zgargan mahsulot qatorlari, mutlaq qiymatlar bilan - va barcha ochiq
+panellarga bir xil satr yuboriladi. Obunachi bo'lmasa hech narsa qilinmaydi.
+
+Boshqa worker dagi o'zgarishlar bu jarayonga yetib kelmaydi, navbat
+to'lib tashlab yuborilgan hodisalar ham yo'qoladi. Shuning uchun oqim har
+HEARTBEAT soniyada do'kon belgilarini (watermarks.py) tekshiradi va
+o'zgargan bo'lsa to'liq holatni ("snapshot") yuboradi - statistika ham
+shu belgilar bo'yicha, kesh versiyasiga tayanmasdan.
+
+publish() ni kesh versiyalari yangilangandan keyin chaqirish kerak:
+on_commit navbati tartib bilan bajariladi, statistika yangi versiya
+ostida hisoblanadi.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.template.loader import render_to_string
+
+from . import metrics, sharding
+from .models import Product
+from .stats import get_shop_stats, get_shop_stats_at
+from .templatetags.shop_filters import format_price_with_currency, format_quantity
+from .watermarks import shop_watermarks
+
+EVENTS = getattr(settings, "SHOP_EVENTS", {})
+
+# Panel kartalari: statistika kaliti -> formatlash filtri
+STAT_FORMATS = {
+    "total_products_count": format_quantity,
+    "total_products_quantity": format_quantity,
+    "remaining_value": format_price_with_currency,
+    "total_sales": format_price_with_currency,
+    "total_sales_quantity": format_quantity,
+    "total_cancelled": format_price_with_currency,
+    "cancelled_quantity": format_quantity,
+    "net_sales": format_price_with_currency,
+}
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+# shop_id -> {Subscriber, ...}
+_subscribers = defaultdict(set)
+_lock = threading.Lock()
+
+
+class Subscriber:
+    """Bitta ochiq panel: o'z event loop idagi navbat"""
+
+    def __init__(self, shop_id):
+        self.shop_id = shop_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=EVENTS.get("QUEUE_SIZE", 100))
+
+    def _put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Sekin mijoz: keyingi heartbeat snapshot bilan tiklanadi
+            metrics.inc("shop_events_dropped_total")
+
+    def deliver(self, message):
+        # publish() sinxron oqimdan (view, sync_to_async) chaqiriladi
+        self.loop.call_soon_threadsafe(self._put, message)
+
+
+def subscribe(shop_id):
+    subscriber = Subscriber(shop_id)
+    with _lock:
+        _subscribers[shop_id].add(subscriber)
+    return subscriber
+
+
+def unsubscribe(subscriber):
+    with _lock:
+        subscribers = _subscribers.get(subscriber.shop_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del _subscribers[subscriber.shop_id]
+
+
+def subscriber_count():
+    with _lock:
+        return sum(len(subscribers) for subscribers in _subscribers.values())
+
+
+metrics.register_gauge("shop_event_subscribers", subscriber_count)
+
+
+def to_micros(value):
+    return None if value is None else (value - _EPOCH) // timedelta(microseconds=1)
+
+
+def from_micros(value):
+    return _EPOCH + timedelta(microseconds=value)
+
+
+def format_event(kind, payload):
+    data = json.dumps(payload, cls=DjangoJSONEncoder, ensure_ascii=False)
+    return f"event: {kind}\ndata: {data}\n\n"
+
+
+def build_payload(shop_id, product_ids=(), changed_since=None, stats=None):
+    """
+    Panel uchun mutlaq holat: statistika kartalari va mahsulot qatorlari
+    (HTML bo'laklari shablondagi bilan bir xil). O'chirilgan mahsulotlar
+    "removed" ro'yxatida.
+    """
+    if stats is None:
+        stats = get_shop_stats(shop_id)
+
+    products = Product.objects.filter(shop_id=shop_id)
+    if changed_since is not None:
+        products = products.filter(updated_at__gt=changed_since)
+    else:
+        products = products.filter(pk__in=product_ids)
+    products = list(products.only("id", "shop_id", "price", "quantity", "unit"))
+
+    found = {product.pk for product in products}
+    return {
+        "stats": {
+            key: {"value": stats[key], "html": str(formatter(stats[key]))}
+            for key, formatter in STAT_FORMATS.items()
+        },
+        "products": [
+            {
+                "id": product.pk,
+                "stock_html": render_to_string(
+                    "shop/includes/product_stock.html", {"product": product}
+                ),
+                "value_html": str(format_price_with_currency(product.get_total_value())),
+            }
+            for product in products
+        ],
+        "removed": [pk for pk in product_ids if pk not in found],
+    }
+
+
+def _broadcast(shop_id, kind, product_ids):
+    with _lock:
+        subscribers = list(_subscribers.get(shop_id, ()))
+    if not subscribers:
+        return
+
+    message = format_event(kind, build_payload(shop_id, product_ids))
+    for subscriber in subscribers:
+        subscriber.deliver(message)
+    metrics.inc("shop_events_published_total", kind=kind)
+
+
+def publish(shop_id, kind, product_ids=()):
+    """Hodisani joriy tranzaksiya commit bo'lgandan keyin tarqatish"""
+    if not EVENTS.get("ENABLED", True) or shop_id is None:
+        return
+    product_ids = tuple(product_ids)
+    transaction.on_commit(
+        lambda: _broadcast(shop_id, kind, product_ids), using=sharding.shard_for(shop_id)
+    )
+
+
+def snapshot(shop_id, seen):
+    """
+    Heartbeat tekshiruvi: belgilar `seen` dan keyin o'zgargan bo'lsa
+    (boshqa worker, tashlab yuborilgan hodisa, qayta ulanish) -
+    statistika va shu vaqtdan beri o'zgargan mahsulotlar.
+    (yangi belgilar, xabar yoki None)
+    """
+    # Oqim so'rov kontekstidan tashqarida - baza har safar aniqlanadi
+    # (do'kon oqim ochiq turganda boshqa bazaga ko'chirilishi mumkin)
+    with sharding.use_shop(shop_id):
+        marks = shop_watermarks(shop_id)
+        if marks is None or marks == seen:
+            return seen, None
+
+        # Belgilar statistikadan oldin o'qiladi - oradagi o'zgarish keyingi
+        # tekshiruvda yana ko'rinadi, yo'qolmaydi
+        catalog_seen = seen[0] if seen else None
+        # Statistika kesh versiyasi bo'yicha emas, belgilar bo'yicha: boshqa
+        # worker dagi yozuvdan keyin bu jarayonning versiyasi eskirgan bo'lishi mumkin
+        payload = build_payload(
+            shop_id,
+            changed_since=catalog_seen or marks[0],
+            stats=get_shop_stats_at(shop_id, marks),
+        )
+    return marks, format_event("snapshot", payload)
@@ -0,0 +1,189 @@
+# shop/facets.py
+"""
+Do'kon sahifasidagi mahsulotlar filtri: kategoriya, birlik va qoldiq holati.
+
+Barcha fasetlar sonlari bitta GROUP BY so'rovidan (kategoriya x birlik x
+holat) Python da yig'iladi va katalog versiyasi bo'yicha keshlanadi. Har
+bir faset soni boshqa tanlangan filtrlar hisobga olingan holda sanaladi;
+filtrlangan mahsulotlar soni ham shu qatorlardan - alohida COUNT yo'q.
+"""
+from collections import Counter
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db.models import Case, CharField, Count, Value, When
+
+from . import cache as shop_cache
+from .models import Product
+
+PAGE_SIZE = getattr(settings, "SHOP_PRODUCT_LIST", {}).get("PAGE_SIZE", 50)
+
+# Shablondagi rang chegaralari bilan bir xil (shop/includes/product_stock.html)
+LOW_STOCK = 10
+
+STOCK_LABELS = {
+    "in_stock": "Mavjud",
+    "low": "Kam qolgan",
+    "out": "Tugagan",
+}
+UNIT_LABELS = dict(Product.UNIT_CHOICES)
+
+FACETS = (
+    ("category", "Kategoriya"),
+    ("unit", "Birlik"),
+    ("stock", "Qoldiq"),
+)
+
+
+def stock_status():
+    return Case(
+        When(quantity__gt=LOW_STOCK, then=Value("in_stock")),
+        When(quantity__gt=0, then=Value("low")),
+        default=Value("out"),
+        output_field=CharField(),
+    )
+
+
+def compute_facet_rows(shop_id):
+    """[(kategoriya id, kategoriya nomi, birlik, holat, soni), ...]"""
+    rows = (
+        Product.objects.filter(shop_id=shop_id)
+        .annotate(stock=stock_status())
+        .values("category_id", "category__name", "unit", "stock")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    return [
+        (row["category_id"], row["category__name"], row["unit"], row["stock"], row["count"])
+        for row in rows
+    ]
+
+
+def get_facet_rows(shop_id):
+    version = shop_cache.get_version(shop_cache.SHOP_CATALOG, shop_id)
+    key = f"shop:facets:{shop_id}:{version}"
+    return shop_cache.get_or_compute(key, lambda: compute_facet_rows(shop_id))
+
+
+def parse_filters(params):
+    """GET parametrlaridan tanlangan filtrlar (noto'g'ri qiymatlar tashlanadi)"""
+    selected = {}
+
+    category = params.get("category", "")
+    if category == "none" or category.isdigit():
+        selected["category"] = category
+    if params.get("unit") in UNIT_LABELS:
+        selected["unit"] = params["unit"]
+    if params.get("stock") in STOCK_LABELS:
+        selected["stock"] = params["stock"]
+    return selected
+
+
+def filter_products(products, selected):
+    category = selected.get("category")
+    if category == "none":
+        products = products.filter(category__isnull=True)
+    elif category:
+        products = products.filter(category_id=int(category))
+    if "unit" in selected:
+        products = products.filter(unit=selected["unit"])
+    if "stock" in selected:
+        products = products.annotate(stock=stock_status()).filter(stock=selected["stock"])
+    return products
+
+
+def _values(row):
+    category_id, _name, unit, stock, _count = row
+    return {
+        "category": str(category_id) if category_id else "none",
+        "unit": unit,
+        "stock": stock,
+    }
+
+
+def _matches(values, selected, skip=None):
+    return all(values[name] == value for name, value in selected.items() if name != skip)
+
+
+def _url(selected, **changes):
+    query = {**selected, **changes}
+    return f"?{urlencode({name: value for name, value in query.items() if value is not None})}"
+
+
+def build_facets(rows, selected):
+    """
+    Shablon uchun fasetlar va filtrga mos mahsulotlar soni.
+    (fasetlar, jami)
+    """
+    labels = {
+        "category": {"none": "Kategoriyasiz"},
+        "unit": UNIT_LABELS,
+        "stock": STOCK_LABELS,
+    }
+    counts = {name: Counter() for name, _title in FACETS}
+    total = 0
+    for row in rows:
+        values = _values(row)
+        if values["category"] != "none":
+            labels["category"][values["category"]] = row[1]
+        for name, _title in FACETS:
+            if _matches(values, selected, skip=name):
+                counts[name][values[name]] += row[4]
+        if _matches(values, selected):
+            total += row[4]
+
+    facets = []
+    for name, title in FACETS:
+        options = set(counts[name])
+        if name in selected:
+            options.add(selected[name])
+        if name == "category":
+            order = sorted(options, key=lambda value: (value == "none", labels[name].get(value, "")))
+        else:
+            order = [value for value in labels[name] if value in options]
+        facets.append(
+            {
+                "name": name,
+                "title": title,
+                "options": [
+                    {
+                        "value": value,
+                        "label": labels[name].get(value, value),
+                        "count": counts[name][value],
+                        "selected": selected.get(name) == value,
+                        # Tanlangan variant bosilsa filtr olib tashlanadi
+                        "url": _url(
+                            selected, **{name: None if selected.get(name) == value else value}
+                        ),
+                    }
+                    for value in order
+                ],
+            }
+        )
+    return facets, total
+
+
+def paginate(total, selected, page, page_size=PAGE_SIZE):
+    """Sahifa raqami va qo'shni sahifalar havolalari (jami fasetlardan ma'lum)"""
+    num_pages = max(1, -(-total // page_size))
+    try:
+        number = min(max(1, int(page or 1)), num_pages)
+    except ValueError:
+        number = 1
+
+    def url(page):
+        return _url(selected, page=page)
+
+    return {
+        "number": number,
+        "num_pages": num_pages,
+        "offset": (number - 1) * page_size,
+        "limit": number * page_size,
+        "previous_url": url(number - 1) if number > 1 else None,
+        "next_url": url(number + 1) if number < num_pages else None,
+    }
+
+
+def cache_key(selected, page):
+    """Mahsulotlar jadvali bo'lagi kaliti (filtr va sahifa)"""
+    return _url(dict(sorted(selected.items())), page=page["number"])
@@ -1,7 +1,7 @@
 # shop/forms.py
 from django import forms
 from django.contrib.auth.models import User
-from .models import ShopApplication, Shop, Product, ShopStaff, Sale
+from .models import ShopApplication, Shop, Product, ShopStaff, Sale, normalize_barcode
 
 
 class RegisterForm(forms.ModelForm):
@@ -141,7 +141,7 @@ class ProductForm(forms.ModelForm):
 
     class Meta:
         model = Product
-        fields = ["name", "category", "image", "price", "quantity", "unit"]
+        fields = ["name", "category", "image", "price", "quantity", "unit", "barcode"]
         widgets = {
             "name": forms.TextInput(
                 attrs={"class": "form-control", "placeholder": "Mahsulot nomi"}
@@ -165,6 +165,13 @@ class ProductForm(forms.ModelForm):
                 }
             ),
             "unit": forms.Select(attrs={"class": "form-control"}),
+            "barcode": forms.TextInput(
+                attrs={
+                    "class": "form-control",
+                    "placeholder": "Skanerlang yoki kiriting (ixtiyoriy)",
+                    "autocomplete": "off",
+                }
+            ),
         }
         labels = {
             "name": "Mahsulot nomi",
@@ -173,8 +180,26 @@ class ProductForm(forms.ModelForm):
             "price": "Narxi",
             "quantity": "Miqdori",
             "unit": "Miqdor birligi",
+            "barcode": "Shtrix-kod / SKU",
         }
 
+    def __init__(self, *args, **kwargs):
+        shop = kwargs.pop("shop", None)
+        super().__init__(*args, **kwargs)
+        # Yangi mahsulotda do'kon formadan tashqarida beriladi
+        self.shop = shop or (self.instance.shop if self.instance.shop_id else None)
+
+    def clean_barcode(self):
+        """(do'kon, kod) yagonaligi - shop formada yo'q, Django uni tekshirmaydi"""
+        barcode = normalize_barcode(self.cleaned_data.get("barcode"))
+        if barcode and self.shop is not None:
+            taken = Product.objects.filter(shop=self.shop, barcode=barcode).exclude(
+                pk=self.instance.pk
+            )
+            if taken.exists():
+                raise forms.ValidationError("Bu shtrix-kod do'konda boshqa mahsulotga berilgan!")
+        return barcode
+
 
 class StaffForm(forms.Form):
     """Xodim qo'shish formasi"""
@@ -0,0 +1,202 @@
+# shop/log_utils.py
+"""
+Log sozlamalari: JSON formatlash, so'rov konteksti, rate-limit va
+asinxron (QueueHandler/QueueListener) handlerlar.
+
+settings.LOGGING_CONFIG shu moduldagi configure_logging ga qaratilgan.
+"""
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.config
+import os
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+from django.conf import settings
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+request_var = contextvars.ContextVar("request", default=None)
+
+# LogRecord ning standart atributlari - qolganlari "extra" hisoblanadi
+_RECORD_ATTRS = set(
+    logging.LogRecord("", 0, "", 0, "", (), None).__dict__
+) | {"message", "asctime", "request_id", "user_id", "shop_id", "suppressed"}
+
+_listeners = []
+_hooks_registered = False
+
+
+class RequestContextFilter(logging.Filter):
+    """Yozuvga request_id, user_id va shop_id qo'shish"""
+
+    def filter(self, record):
+        request = request_var.get()
+        record.request_id = request_id_var.get()
+
+        # Foydalanuvchi faqat allaqachon yuklangan bo'lsa olinadi -
+        # log yozish uchun qo'shimcha sessiya/DB so'rovi qilinmaydi
+        user = getattr(request, "_cached_user", None)
+        record.user_id = user.pk if user is not None and user.is_authenticated else None
+
+        match = getattr(request, "resolver_match", None)
+        record.shop_id = match.kwargs.get("shop_id") if match else None
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Bir xil joydan chiqayotgan xabarlarni cheklash: har bir (logger, daraja,
+    fayl, qator) uchun `per` soniyada ko'pi bilan `rate` ta yozuv.
+    O'tkazib yuborilganlar soni keyingi yozuvda `suppressed` bo'lib chiqadi.
+    """
+
+    def __init__(self, rate=20, per=60, min_level="WARNING"):
+        super().__init__()
+        self.rate = rate
+        self.per = per
+        self.min_level = logging.getLevelName(min_level)
+        self.buckets = {}
+
+    def filter(self, record):
+        if record.levelno < self.min_level:
+            return True
+
+        key = (record.name, record.levelno, record.pathname, record.lineno)
+        now = time.monotonic()
+        bucket = self.buckets.get(key)
+
+        if bucket is None or now - bucket[0] >= self.per:
+            if len(self.buckets) > 10000:
+                self.buckets.clear()
+            suppressed = bucket[2] if bucket else 0
+            self.buckets[key] = [now, 1, 0]
+            if suppressed:
+                record.suppressed = suppressed
+            return True
+
+        if bucket[1] < self.rate:
+            bucket[1] += 1
+            return True
+
+        bucket[2] += 1
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    """Bir qatorli JSON log yozuvi"""
+
+    def format(self, record):
+        data = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "user_id": getattr(record, "user_id", None),
+            "shop_id": getattr(record, "shop_id", None),
+        }
+
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            data["suppressed"] = suppressed
+
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                data[key] = value
+
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exception"] = record.exc_text
+        if record.stack_info:
+            data["stack"] = record.stack_info
+
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class StructuredQueueHandler(QueueHandler):
+    """
+    Standart prepare() xabarni formatlab, traceback ni unga qo'shib
+    yuboradi va exc_info/exc_text ni tozalaydi - JsonFormatter "exception"
+    maydonini ko'rmaydi. Bu yerda faqat xabar argumentlari qo'yiladi va
+    traceback matnga aylantiriladi (frame lar navbatda ushlab turilmaydi),
+    exc_text, stack_info va qo'shimcha maydonlar yozuvda qoladi.
+    """
+
+    _exception_formatter = logging.Formatter()
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self._exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _restart_listeners():
+    # fork dan keyin (gunicorn --preload) oqimlar bolaga o'tmaydi
+    for listener in _listeners:
+        listener._thread = None
+        listener.start()
+
+
+def _stop_listeners(listeners=None):
+    """Navbatdagi yozuvlarni yozib, oqimlarni to'xtatish (qayta chaqirsa bo'ladi)"""
+    for listener in _listeners if listeners is None else listeners:
+        if listener._thread is not None:
+            listener.stop()
+
+
+def _make_async(config):
+    """
+    Har bir handlerni QueueHandler bilan almashtirish: so'rov oqimi faqat
+    navbatga yozadi, diskka/stdout ga yozish esa alohida oqimda bo'ladi.
+    Filtrlar (kontekst, rate-limit) so'rov oqimida qoladi - shunda
+    cheklangan yozuvlar navbatga ham tushmaydi.
+    """
+    loggers = [logging.getLogger()] + [
+        logging.getLogger(name) for name in config.get("loggers", {})
+    ]
+
+    proxies = {}
+    for logger in loggers:
+        for index, handler in enumerate(logger.handlers):
+            if isinstance(handler, QueueHandler):
+                continue
+            proxy = proxies.get(handler)
+            if proxy is None:
+                log_queue = queue.SimpleQueue()
+                proxy = StructuredQueueHandler(log_queue)
+                proxy.setLevel(handler.level)
+                proxy.filters = handler.filters
+                handler.filters = []
+
+                listener = QueueListener(log_queue, handler, respect_handler_level=True)
+                listener.start()
+                _listeners.append(listener)
+                proxies[handler] = proxy
+            logger.handlers[index] = proxy
+
+    global _hooks_registered
+    if _listeners and not _hooks_registered:
+        _hooks_registered = True
+        atexit.register(_stop_listeners)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=_restart_listeners)
+
+
+def configure_logging(config):
+    """settings.LOGGING_CONFIG: dictConfig + ixtiyoriy asinxron handlerlar"""
+    if not config:
+        return
+    logging.config.dictConfig(config)
+
+    if getattr(settings, "SHOP_LOGGING", {}).get("ASYNC", True):
+        _make_async(config)
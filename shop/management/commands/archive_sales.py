@@ -0,0 +1,55 @@
+# shop/management/commands/archive_sales.py
+"""
+Eski sotuvlarni SaleArchive ga ko'chirish (cron orqali, masalan har kecha):
+
+    python manage.py archive_sales
+    python manage.py archive_sales --horizon-days 180 --shop 3
+
+To'xtatilgan ishga tushirish shunchaki qayta ishga tushiriladi - allaqachon
+ko'chirilgan bo'laklar takrorlanmaydi.
+"""
+from django.core.management.base import BaseCommand
+
+from shop import sharding
+from shop.archive import archive_cutoff, archive_shop
+from shop.models import Sale
+
+
+class Command(BaseCommand):
+    help = "Eski sotuvlarni arxiv jadvaliga bo'laklab ko'chirish"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--horizon-days", type=int, default=None)
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument("--shop", type=int, action="append", dest="shops")
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Faqat nechta sotuv ko'chishini ko'rsatish"
+        )
+
+    def handle(self, *args, **options):
+        cutoff = archive_cutoff(horizon_days=options["horizon_days"])
+        self.stdout.write(f"Chegara: {cutoff:%Y-%m-%d}")
+
+        # Sotuvlar do'kon bazalarida (shop/sharding.py) - har biridan alohida
+        shop_ids = []
+        count = 0
+        for alias in sharding.aliases():
+            old_sales = Sale.objects.using(alias).filter(created_at__lt=cutoff)
+            if options["shops"]:
+                old_sales = old_sales.filter(shop_id__in=options["shops"])
+            shop_ids += old_sales.order_by().values_list("shop_id", flat=True).distinct()
+            if options["dry_run"]:
+                count += old_sales.count()
+
+        if options["dry_run"]:
+            self.stdout.write(f"{count} ta sotuv, {len(shop_ids)} ta do'kon ko'chiriladi")
+            return
+
+        total = 0
+        for shop_id in shop_ids:
+            with sharding.use_shop(shop_id):
+                moved = sum(archive_shop(shop_id, cutoff, options["batch_size"]))
+            self.stdout.write(f"  do'kon #{shop_id}: {moved} ta ko'chirildi")
+            total += moved
+
+        self.stdout.write(self.style.SUCCESS(f"Jami arxivlandi: {total} ta sotuv"))
@@ -0,0 +1,157 @@
+# shop/management/commands/assign_barcodes.py
+"""
+Mavjud katalogga shtrix-kodlarni ommaviy berish:
+
+    python manage.py assign_barcodes                  # kodsiz mahsulotlarga ichki EAN-13
+    python manage.py assign_barcodes --shop 3 --dry-run
+    python manage.py assign_barcodes --shop 3 --csv codes.csv
+
+Ichki kodlar "2" (do'kon ichidagi kodlar oralig'i) + 11 xonali mahsulot
+id + nazorat raqami - mahsulot id si bo'yicha yagona, skaner printeri
+bilan chop etish mumkin. CSV da "product_id,barcode" ustunlari (sarlavha
+bilan); faqat shu do'kon mahsulotlari, kodlar fayl ichida takrorlanmasligi
+kerak. Yozish bitta tranzaksiyada, bulk_update bilan.
+"""
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from shop import cache as shop_cache
+from shop.models import Product, Shop, normalize_barcode
+from shop.sharding import current, use_shop
+from shop.watermarks import touch_shop
+
+INTERNAL_PREFIX = "2"
+
+
+def ean13(digits):
+    """12 xonaga EAN-13 nazorat raqamini qo'shish"""
+    total = sum(int(digit) * (3 if index % 2 else 1) for index, digit in enumerate(digits))
+    return f"{digits}{(10 - total % 10) % 10}"
+
+
+def internal_barcode(product_id):
+    return ean13(f"{INTERNAL_PREFIX}{product_id:011d}")
+
+
+class Command(BaseCommand):
+    help = "Mahsulotlarga shtrix-kod berish (ichki EAN-13 yoki CSV dan)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--shop", type=int, action="append", dest="shops")
+        parser.add_argument("--csv", dest="csv_path", help="product_id,barcode fayli")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        shop_ids = options["shops"] or list(
+            Shop.objects.order_by("id").values_list("id", flat=True)
+        )
+        if options["csv_path"]:
+            if len(shop_ids) != 1:
+                raise CommandError("--csv bilan bitta --shop ko'rsatilishi kerak")
+            codes = self.read_csv(options["csv_path"])
+
+        total = 0
+        for shop_id in shop_ids:
+            with use_shop(shop_id):
+                existing = dict(
+                    Product.objects.filter(shop_id=shop_id, barcode__isnull=False)
+                    .values_list("barcode", "id")
+                )
+                if options["csv_path"]:
+                    assignments = self.from_csv(shop_id, codes, existing)
+                else:
+                    assignments = self.generate(shop_id, existing)
+
+                total += len(assignments)
+                if assignments and not options["dry_run"]:
+                    self.save(shop_id, assignments)
+                if assignments:
+                    self.stdout.write(f"  do'kon #{shop_id}: {len(assignments)} ta mahsulot")
+
+        verb = "Beriladi" if options["dry_run"] else "Berildi"
+        self.stdout.write(self.style.SUCCESS(f"{verb}: {total} ta shtrix-kod"))
+
+    def read_csv(self, path):
+        codes = {}
+        try:
+            with open(path, newline="", encoding="utf-8-sig") as f:
+                for line, row in enumerate(csv.DictReader(f), start=2):
+                    try:
+                        product_id = int(row["product_id"])
+                    except (KeyError, TypeError, ValueError):
+                        raise CommandError(f"{path}:{line}: product_id noto'g'ri")
+                    barcode = normalize_barcode(row.get("barcode"))
+                    if barcode is None or len(barcode) > 64:
+                        raise CommandError(f"{path}:{line}: barcode noto'g'ri")
+                    codes[product_id] = barcode
+        except OSError as exc:
+            raise CommandError(str(exc))
+
+        duplicates = len(codes) - len(set(codes.values()))
+        if duplicates:
+            raise CommandError(f"Faylda {duplicates} ta takroriy shtrix-kod bor")
+        return codes
+
+    def from_csv(self, shop_id, codes, existing):
+        """{product_id: barcode} - faqat shu do'kon mahsulotlari, band kodlarsiz"""
+        found = set(
+            Product.objects.filter(shop_id=shop_id, pk__in=codes).values_list("id", flat=True)
+        )
+        for product_id in sorted(set(codes) - found):
+            self.stderr.write(f"  #{product_id}: mahsulot do'konda topilmadi")
+
+        current = {product_id: barcode for barcode, product_id in existing.items()}
+        assignments = {
+            product_id: codes[product_id]
+            for product_id in found
+            if current.get(product_id) != codes[product_id]
+        }
+        # Boshqa mahsulotdagi kod faqat o'sha mahsulot ham yangi kod olsa
+        # bo'shaydi; rad etilgan qator boshqasini ham band qilib qo'yishi mumkin
+        changed = True
+        while changed:
+            changed = False
+            for product_id, barcode in sorted(assignments.items()):
+                owner = existing.get(barcode)
+                if owner is not None and owner not in assignments:
+                    self.stderr.write(f"  #{product_id}: {barcode} #{owner} da band")
+                    del assignments[product_id]
+                    changed = True
+        return assignments
+
+    def generate(self, shop_id, existing):
+        assignments = {}
+        products = Product.objects.filter(shop_id=shop_id, barcode__isnull=True)
+        for product_id in products.values_list("id", flat=True).order_by("id"):
+            barcode = internal_barcode(product_id)
+            if barcode in existing:
+                self.stderr.write(f"  #{product_id}: {barcode} #{existing[barcode]} da band")
+                continue
+            assignments[product_id] = barcode
+        return assignments
+
+    def save(self, shop_id, assignments):
+        now = timezone.now()
+        products = list(Product.objects.filter(pk__in=assignments).only("id", "barcode"))
+        for product in products:
+            product.barcode = assignments[product.pk]
+            product.updated_at = now
+
+        with transaction.atomic(using=current()):
+            # Kodlar mahsulotlar orasida almashtirilsa UPDATE o'rtasida
+            # yagonalik buzilmasligi uchun avval bo'shatiladi
+            Product.objects.filter(shop_id=shop_id, barcode__in=assignments.values()).update(
+                barcode=None
+            )
+            Product.objects.bulk_update(products, ["barcode", "updated_at"], batch_size=500)
+
+            # update()/bulk_update() signal yubormaydi
+            touch_shop(shop_id, catalog=True)
+            for product_id in assignments:
+                transaction.on_commit(
+                    lambda product_id=product_id: shop_cache.bump_product(product_id),
+                    using=current(),
+                )
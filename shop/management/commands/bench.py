@@ -0,0 +1,396 @@
+# shop/management/commands/bench.py
+"""
+Benchmark: sintetik ma'lumotlar bilan shop/urls.py dagi barcha sahifalarni o'lchash.
+
+    python manage.py bench --sales 1000000 --output bench.json
+    python manage.py bench --output new.json --compare bench.json
+"""
+import json
+import platform
+import random
+import statistics
+import time
+import tracemalloc
+from decimal import Decimal
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext,
+    override_settings,
+    setup_databases,
+    teardown_databases,
+)
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+
+from shop import urls as shop_urls
+from shop.cache import get_cache
+from shop.counters import find_drift, repair
+from shop.models import (
+    Product,
+    ProductCategory,
+    ProductIncome,
+    Sale,
+    Shop,
+    ShopCategory,
+    ShopStaff,
+)
+
+# Taqqoslashda e'tiborga olinadigan ko'rsatkichlar
+COMPARED_METRICS = ("p50_ms", "p95_ms", "queries", "peak_memory_kb")
+
+# Juda kichik farqlar (shovqin) regressiya hisoblanmaydi
+MIN_DELTA = {"p50_ms": 1.0, "p95_ms": 2.0, "peak_memory_kb": 64}
+
+# Benchmark keshi jarayon ichida: umumiy keshdagi versiyalar, login cheklovi
+# va sahifa bo'laklari tozalanmaydi, test bazasi id lari bilan yozilgan
+# kalitlar esa ishlab turgan saytga ko'rinmaydi
+BENCH_CACHES = {
+    alias: {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": f"shop-bench-{alias}",
+    }
+    for alias in settings.CACHES
+}
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = (len(values) - 1) * pct / 100
+    lower = int(index)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (index - lower)
+
+
+class Command(BaseCommand):
+    help = "Sintetik ma'lumotlar bilan barcha do'kon sahifalarini benchmark qilish"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--shops", type=int, default=3)
+        parser.add_argument("--products", type=int, default=200, help="Har bir do'kon uchun")
+        parser.add_argument("--staff", type=int, default=3, help="Har bir do'kon uchun")
+        parser.add_argument("--sales", type=int, default=20000, help="Jami sotuvlar")
+        parser.add_argument("--cancel-rate", type=float, default=0.05)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--warmup", type=int, default=2)
+        parser.add_argument(
+            "--cold",
+            action="store_true",
+            help="Har bir so'rovdan oldin keshni tozalash",
+        )
+        parser.add_argument("--only", nargs="*", help="Faqat shu URL nomlari")
+        parser.add_argument("--output", help="JSON hisobot fayli")
+        parser.add_argument("--compare", help="Taqqoslash uchun avvalgi hisobot")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.2,
+            help="Ruxsat etilgan o'sish (0.2 = 20%%)",
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options["compare"]:
+            try:
+                with open(options["compare"], encoding="utf-8") as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Baseline o'qib bo'lmadi: {e}")
+
+        # Benchmark alohida test bazalarida (SHOP_SHARDS dagi do'kon bazalari
+        # ham) va alohida keshda ishlaydi - asosiy bazalar va keshga tegmaydi
+        with override_settings(CACHES=BENCH_CACHES):
+            old_config = setup_databases(
+                verbosity=0, interactive=False, aliases=set(connections), serialized_aliases=set()
+            )
+            try:
+                started = time.perf_counter()
+                fixtures = self.seed(options)
+                seed_seconds = time.perf_counter() - started
+                self.stdout.write(f"Ma'lumotlar tayyor: {seed_seconds:.1f} s")
+
+                results = self.run_views(fixtures, options)
+            finally:
+                teardown_databases(old_config, verbosity=0)
+
+        report = {
+            "meta": {
+                "created_at": timezone.now().isoformat(),
+                "django": django.get_version(),
+                "python": platform.python_version(),
+                "seed": options["seed"],
+                "scale": {
+                    "shops": options["shops"],
+                    "products": options["products"],
+                    "staff": options["staff"],
+                    "sales": options["sales"],
+                },
+                "iterations": options["iterations"],
+                "cold": options["cold"],
+                "seed_seconds": round(seed_seconds, 2),
+            },
+            "views": results,
+        }
+
+        self.print_table(results)
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f"Hisobot saqlandi: {options['output']}"))
+
+        if baseline is not None:
+            regressions = self.compare(baseline, report, options["threshold"])
+            if regressions:
+                raise CommandError(f"{len(regressions)} ta regressiya topildi")
+            self.stdout.write(self.style.SUCCESS("Regressiya topilmadi"))
+
+    # --- Ma'lumot yaratish ---
+
+    def seed(self, options):
+        rng = random.Random(options["seed"])
+        batch_size = options["batch_size"]
+        password = make_password("bench-password")
+
+        owner = User.objects.create(
+            username="bench_owner",
+            password=password,
+            is_staff=True,
+            is_superuser=True,
+        )
+
+        shop_category = ShopCategory.objects.create(name="Benchmark")
+        product_categories = ProductCategory.objects.bulk_create(
+            [ProductCategory(name=f"Kategoriya {i}") for i in range(10)]
+        )
+
+        shops = Shop.objects.bulk_create(
+            [
+                Shop(
+                    owner=owner,
+                    name=f"Do'kon {i}",
+                    category=shop_category,
+                    phone=f"+99890{i:07d}",
+                )
+                for i in range(options["shops"])
+            ]
+        )
+
+        staff_users = User.objects.bulk_create(
+            [
+                User(username=f"bench_staff_{i}", password=password)
+                for i in range(options["shops"] * options["staff"])
+            ],
+            batch_size=batch_size,
+        )
+        ShopStaff.objects.bulk_create(
+            [
+                ShopStaff(
+                    shop=shops[i // options["staff"]],
+                    user=user,
+                    role="admin" if i % options["staff"] == 0 else "cashier",
+                    added_by=owner,
+                )
+                for i, user in enumerate(staff_users)
+            ],
+            batch_size=batch_size,
+        )
+
+        units = [choice for choice, _ in Product.UNIT_CHOICES]
+        products = Product.objects.bulk_create(
+            [
+                Product(
+                    shop=shop,
+                    name=f"Mahsulot {shop_index}-{i}",
+                    category=rng.choice(product_categories),
+                    price=Decimal(rng.randrange(1000, 500000, 500)),
+                    quantity=rng.randrange(0, 1000),
+                    unit=rng.choice(units),
+                    added_by=owner,
+                )
+                for shop_index, shop in enumerate(shops)
+                for i in range(options["products"])
+            ],
+            batch_size=batch_size,
+        )
+
+        ProductIncome.objects.bulk_create(
+            [
+                ProductIncome(product=product, quantity=product.quantity, added_by=owner)
+                for product in products
+            ],
+            batch_size=batch_size,
+        )
+
+        cashiers = [owner] + staff_users
+        remaining = options["sales"]
+        while remaining > 0:
+            size = min(batch_size, remaining)
+            batch = []
+            for _ in range(size):
+                product = rng.choice(products)
+                quantity = rng.randint(1, 5)
+                cancelled = rng.random() < options["cancel_rate"]
+                batch.append(
+                    Sale(
+                        shop_id=product.shop_id,
+                        product=product,
+                        quantity=quantity,
+                        unit_price=product.price,
+                        total_amount=product.price * quantity,
+                        cashier=rng.choice(cashiers),
+                        is_cancelled=cancelled,
+                        cancelled_by=owner if cancelled else None,
+                        cancelled_at=timezone.now() if cancelled else None,
+                    )
+                )
+            Sale.objects.bulk_create(batch)
+            remaining -= size
+
+        # bulk_create hisoblagichlarni yangilamaydi
+        for shop in shops:
+            repair(find_drift(shop.id))
+
+        first_sale = Sale.objects.filter(shop=shops[0], is_cancelled=False).first()
+        cancelled_sale = Sale.objects.filter(shop=shops[0], is_cancelled=True).first()
+
+        return {
+            "owner": owner,
+            "kwargs": {
+                "shop_id": shops[0].id,
+                "product_id": products[0].id,
+                "sale_id": first_sale.id if first_sale else None,
+            },
+            # restore_sale faqat bekor qilingan sotuv uchun ma'noli
+            "restore_sale_id": cancelled_sale.id if cancelled_sale else None,
+        }
+
+    # --- O'lchash ---
+
+    def iter_targets(self, fixtures, only):
+        for pattern in shop_urls.urlpatterns:
+            if not isinstance(pattern, URLPattern) or not pattern.name:
+                continue
+            if only and pattern.name not in only:
+                continue
+
+            kwargs = {}
+            for param in pattern.pattern.converters:
+                if param == "sale_id" and pattern.name == "restore_sale":
+                    kwargs[param] = fixtures["restore_sale_id"]
+                else:
+                    kwargs[param] = fixtures["kwargs"].get(param)
+
+            if any(value is None for value in kwargs.values()):
+                self.stdout.write(self.style.WARNING(f"O'tkazib yuborildi: {pattern.name}"))
+                continue
+
+            yield pattern.name, reverse(pattern.name, kwargs=kwargs)
+
+    def run_views(self, fixtures, options):
+        client = Client()
+        owner = fixtures["owner"]
+        client.force_login(owner)
+        cache = get_cache()
+        cache.clear()
+
+        results = {}
+        for name, path in self.iter_targets(fixtures, options["only"]):
+            # logout sessiyani tugatadi - har safar qayta kiramiz
+            relogin = name == "logout"
+
+            def request():
+                if options["cold"]:
+                    cache.clear()
+                response = client.get(path)
+                if relogin:
+                    client.force_login(owner)
+                return response
+
+            for _ in range(options["warmup"]):
+                request()
+
+            timings = []
+            queries = []
+            status = None
+            for _ in range(options["iterations"]):
+                with CaptureQueriesContext(connection) as ctx:
+                    started = time.perf_counter()
+                    response = request()
+                    timings.append((time.perf_counter() - started) * 1000)
+                queries.append(len(ctx.captured_queries))
+                status = response.status_code
+
+            # Xotira alohida o'lchanadi - tracemalloc vaqtni buzmasligi uchun
+            tracemalloc.start()
+            request()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            results[name] = {
+                "path": path,
+                "status": status,
+                "mean_ms": round(statistics.fmean(timings), 3),
+                "p50_ms": round(percentile(timings, 50), 3),
+                "p90_ms": round(percentile(timings, 90), 3),
+                "p95_ms": round(percentile(timings, 95), 3),
+                "p99_ms": round(percentile(timings, 99), 3),
+                "max_ms": round(max(timings), 3),
+                "queries": int(statistics.median(queries)),
+                "peak_memory_kb": round(peak / 1024, 1),
+            }
+
+        return results
+
+    # --- Hisobot ---
+
+    def print_table(self, results):
+        header = f"{'view':<22}{'status':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'SQL':>6}{'mem KB':>10}"
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for name, row in results.items():
+            self.stdout.write(
+                f"{name:<22}{row['status']:>7}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}"
+                f"{row['p99_ms']:>10.2f}{row['queries']:>6}{row['peak_memory_kb']:>10.1f}"
+            )
+
+    def compare(self, baseline, report, threshold):
+        if baseline.get("meta", {}).get("scale") != report["meta"]["scale"]:
+            self.stdout.write(
+                self.style.WARNING("Diqqat: baseline boshqa hajmdagi ma'lumotlar bilan olingan")
+            )
+
+        regressions = []
+        for name, row in report["views"].items():
+            old = baseline.get("views", {}).get(name)
+            if old is None:
+                continue
+            for metric in COMPARED_METRICS:
+                before, after = old.get(metric), row[metric]
+                if before is None:
+                    continue
+                if metric == "queries":
+                    # So'rovlar soni deterministik - har qanday o'sish regressiya
+                    regressed = after > before
+                else:
+                    regressed = after - before > MIN_DELTA[metric] and after > before * (
+                        1 + threshold
+                    )
+                if regressed:
+                    regressions.append((name, metric, before, after))
+
+        for name, metric, before, after in regressions:
+            self.stdout.write(
+                self.style.ERROR(f"REGRESSIYA {name}.{metric}: {before} -> {after}")
+            )
+        return regressions
@@ -0,0 +1,235 @@
+# shop/management/commands/bench_concurrency.py
+"""
+Benchmark: bir xil worker soni (taxminan bir xil xotira) bilan sinxron
+gunicorn (WSGI) va uvicorn (ASGI) profillarini parallel so'rovlarda
+taqqoslash.
+
+    python manage.py bench_concurrency --username admin --workers 2 --concurrency 100
+    python manage.py bench_concurrency --username admin --profiles asgi --only bot_status
+
+Serverlar website/gunicorn_conf.py bilan alohida jarayonda ishga tushadi
+va asosiy bazadan o'qiydi. So'rovlar --username dagi mavjud foydalanuvchi
+sessiyasi bilan yuboriladi (cache_stats uchun superuser kerak) - bazaga
+yangi foydalanuvchi yozilmaydi, sessiya esa oxirida o'chiriladi.
+"""
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+from .bench import percentile
+
+DEFAULT_VIEWS = ("bot_status", "telegram_users", "cache_stats")
+
+CONF = Path(settings.BASE_DIR) / "website" / "gunicorn_conf.py"
+
+
+def _descendants(pid):
+    pids = [pid]
+    for task in Path(f"/proc/{pid}/task").glob("*"):
+        try:
+            children = (task / "children").read_text().split()
+        except OSError:
+            continue
+        for child in children:
+            pids += _descendants(int(child))
+    return pids
+
+
+def _rss_kb(pid):
+    """Jarayon va uning barcha bolalari RSS yig'indisi (Linux /proc)"""
+    total = 0
+    for current in _descendants(pid):
+        try:
+            status = Path(f"/proc/{current}/status").read_text()
+        except OSError:
+            continue
+        for line in status.splitlines():
+            if line.startswith("VmRSS:"):
+                total += int(line.split()[1])
+    return total
+
+
+class Command(BaseCommand):
+    help = "WSGI (gunicorn sync) va ASGI (uvicorn) profillarini parallel so'rovlarda taqqoslash"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--username", required=True, help="Sessiya uchun mavjud foydalanuvchi"
+        )
+        parser.add_argument(
+            "--profiles", nargs="+", default=["wsgi", "asgi"], choices=["wsgi", "asgi"]
+        )
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument("--concurrency", type=int, default=50)
+        parser.add_argument("--requests", type=int, default=2000, help="Har bir URL uchun")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--only", nargs="*", help="Faqat shu URL nomlari")
+        parser.add_argument("--startup-timeout", type=float, default=30.0)
+        parser.add_argument("--output", help="JSON hisobot fayli")
+
+    def handle(self, *args, **options):
+        try:
+            import aiohttp  # noqa: F401
+        except ImportError:
+            raise CommandError("aiohttp o'rnatilmagan")
+
+        views = options["only"] or list(DEFAULT_VIEWS)
+        paths = {name: reverse(name) for name in views}
+
+        user = User.objects.filter(username=options["username"], is_active=True).first()
+        if user is None:
+            raise CommandError(f"Foydalanuvchi topilmadi: {options['username']}")
+        if not user.is_superuser:
+            self.stdout.write(
+                self.style.WARNING("Superuser emas - ba'zi URL lar 200 qaytarmaydi")
+            )
+
+        client = Client()
+        client.force_login(user)
+        cookies = {settings.SESSION_COOKIE_NAME: client.cookies[settings.SESSION_COOKIE_NAME].value}
+
+        results = {}
+        try:
+            for profile in options["profiles"]:
+                self.stdout.write(f"\n== {profile} ({options['workers']} worker) ==")
+                results[profile] = self.run_profile(profile, paths, cookies, options)
+        finally:
+            client.logout()
+
+        self.print_table(results)
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "workers": options["workers"],
+                        "concurrency": options["concurrency"],
+                        "requests": options["requests"],
+                        "profiles": results,
+                    },
+                    f,
+                    indent=2,
+                )
+            self.stdout.write(self.style.SUCCESS(f"Hisobot saqlandi: {options['output']}"))
+
+    # --- Server ---
+
+    def run_profile(self, profile, paths, cookies, options):
+        env = {
+            **os.environ,
+            "SERVER_PROFILE": profile,
+            "GUNICORN_WORKERS": str(options["workers"]),
+            "GUNICORN_BIND": f"127.0.0.1:{options['port']}",
+            "DJANGO_SETTINGS_MODULE": os.environ.get(
+                "DJANGO_SETTINGS_MODULE", "website.settings"
+            ),
+        }
+        process = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", str(CONF)],
+            cwd=settings.BASE_DIR,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        base_url = f"http://127.0.0.1:{options['port']}"
+        try:
+            asyncio.run(self.wait_ready(process, base_url, options["startup_timeout"]))
+            rss_idle_kb = _rss_kb(process.pid)
+
+            rows = {}
+            for name, path in paths.items():
+                row = asyncio.run(
+                    self.load(base_url + path, cookies, options["requests"], options["concurrency"])
+                )
+                row["rss_kb"] = _rss_kb(process.pid)
+                rows[name] = row
+                self.stdout.write(
+                    f"  {name:<20} {row['rps']:>8.1f} rps  "
+                    f"p50 {row['p50_ms']:.1f} ms  p95 {row['p95_ms']:.1f} ms  "
+                    f"xato {row['errors']}"
+                )
+            return {"rss_idle_kb": rss_idle_kb, "views": rows}
+        finally:
+            process.send_signal(signal.SIGTERM)
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    async def wait_ready(self, process, base_url, timeout):
+        import aiohttp
+
+        deadline = time.monotonic() + timeout
+        async with aiohttp.ClientSession() as session:
+            while time.monotonic() < deadline:
+                if process.poll() is not None:
+                    raise CommandError(f"Server ishga tushmadi (kod {process.returncode})")
+                try:
+                    async with session.get(base_url + reverse("login")) as response:
+                        if response.status < 500:
+                            return
+                except aiohttp.ClientError:
+                    pass
+                await asyncio.sleep(0.2)
+        raise CommandError("Server javob bermadi")
+
+    # --- Yuklama ---
+
+    async def load(self, url, cookies, total, concurrency):
+        import aiohttp
+
+        latencies = []
+        errors = 0
+        queue = iter(range(total))
+
+        async def worker(session):
+            nonlocal errors
+            for _ in queue:
+                started = time.perf_counter()
+                try:
+                    async with session.get(url, allow_redirects=False) as response:
+                        await response.read()
+                        if response.status != 200:
+                            errors += 1
+                except aiohttp.ClientError:
+                    errors += 1
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        connector = aiohttp.TCPConnector(limit=concurrency)
+        async with aiohttp.ClientSession(connector=connector, cookies=cookies) as session:
+            started = time.perf_counter()
+            await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+
+        return {
+            "rps": round(total / elapsed, 1),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "errors": errors,
+        }
+
+    # --- Natija ---
+
+    def print_table(self, results):
+        self.stdout.write("")
+        header = f"{'Profil':<8} {'URL':<20} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'RSS MB':>8}"
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for profile, data in results.items():
+            for name, row in data["views"].items():
+                self.stdout.write(
+                    f"{profile:<8} {name:<20} {row['rps']:>9.1f} {row['p50_ms']:>9.1f} "
+                    f"{row['p95_ms']:>9.1f} {row['rss_kb'] / 1024:>8.1f}"
+                )
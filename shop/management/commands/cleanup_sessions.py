@@ -0,0 +1,65 @@
+# shop/management/commands/cleanup_sessions.py
+"""
+Muddati o'tgan Django sessiyalari va eskirgan BotSession yozuvlarini
+kichik bo'laklarda o'chirish (cron orqali, masalan har soatda):
+
+    python manage.py cleanup_sessions
+    python manage.py cleanup_sessions --batch-size 200 --pause 0.1
+
+Har bir bo'lak alohida qisqa tranzaksiya - SQLite bazasi uzoq vaqt
+qulflanib qolmaydi va parallel so'rovlar kutib qolmaydi.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from shop.models import BotSession
+
+
+class Command(BaseCommand):
+    help = "Eskirgan sessiyalarni bo'laklab o'chirish"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--pause", type=float, default=0.05, help="Bo'laklar orasidagi pauza (soniya)"
+        )
+
+    def delete_in_batches(self, queryset, pk_name, batch_size, pause):
+        total = 0
+        while True:
+            pks = list(queryset.values_list(pk_name, flat=True)[:batch_size])
+            if not pks:
+                return total
+            deleted, _ = queryset.model.objects.filter(**{f"{pk_name}__in": pks}).delete()
+            total += deleted
+            if len(pks) < batch_size:
+                return total
+            time.sleep(pause)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        batch_size = options["batch_size"]
+        pause = options["pause"]
+
+        sessions = self.delete_in_batches(
+            Session.objects.filter(expire_date__lt=now), "session_key", batch_size, pause
+        )
+
+        timeout = settings.BOT_SETTINGS.get("SESSION_TIMEOUT", 3600)
+        bot_sessions = self.delete_in_batches(
+            BotSession.objects.filter(last_activity__lt=now - timedelta(seconds=timeout)),
+            "id",
+            batch_size,
+            pause,
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"O'chirildi: {sessions} ta sessiya, {bot_sessions} ta bot sessiyasi"
+            )
+        )
@@ -0,0 +1,36 @@
+# shop/management/commands/purge_idempotency_keys.py
+"""
+Muddati o'tgan idempotentlik kalitlarini o'chirish (cron orqali, masalan har soatda):
+
+    python manage.py purge_idempotency_keys
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from shop import sharding
+from shop.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Muddati o'tgan idempotentlik kalitlarini bo'laklab o'chirish"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        batch_size = options["batch_size"]
+        total = 0
+
+        # Kalitlar do'kon bazalarida ham (shop/decorators.py - idempotent)
+        for alias in sharding.aliases():
+            keys = IdempotencyKey.objects.using(alias)
+            while True:
+                ids = list(
+                    keys.filter(expires_at__lte=now).values_list("id", flat=True)[:batch_size]
+                )
+                if not ids:
+                    break
+                total += keys.filter(id__in=ids).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f"O'chirildi: {total} ta kalit"))
@@ -0,0 +1,82 @@
+# shop/management/commands/rebalance_shards.py
+"""
+Do'konlarni bazalar (SHOP_SHARDS, shop/sharding.py) orasida taqsimlash:
+
+    python manage.py rebalance_shards                    # bazalar yuklamasi
+    python manage.py rebalance_shards --move 12 --to shard2
+    python manage.py rebalance_shards --plan             # ko'chirish rejasi
+    python manage.py rebalance_shards --apply            # rejani bajarish
+
+Yuklama - bazadagi joriy sotuvlar soni. Reja eng og'ir bazadan eng
+yengiliga farqni kamaytiradigan do'konlarni ko'chiradi. Ko'chirish
+paytida do'konga yozuvchi so'rovlar 503 oladi (odatda bir necha soniya),
+o'qish ishlayveradi. Yangi baza avval migratsiya qilinishi kerak:
+python manage.py migrate --database <baza>.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from shop import sharding
+
+
+class Command(BaseCommand):
+    help = "Do'konlarni bazalar orasida ko'chirish va yuklamani tenglash"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--move", type=int, metavar="SHOP_ID")
+        parser.add_argument("--to", dest="target", metavar="BAZA")
+        parser.add_argument("--plan", action="store_true")
+        parser.add_argument("--apply", action="store_true")
+        parser.add_argument(
+            "--grace", type=float, default=None, help="Boshlangan so'rovlarni kutish (soniya)"
+        )
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if not sharding.enabled():
+            raise CommandError("Bitta baza sozlangan (SHOP_SHARDS muhit o'zgaruvchisi)")
+
+        if options["move"] is not None:
+            if not options["target"]:
+                raise CommandError("--move bilan --to ko'rsatilishi kerak")
+            if options["target"] not in sharding.aliases():
+                raise CommandError(f"Noma'lum baza: {options['target']}")
+            self.move(options["move"], options["target"], options)
+            return
+
+        loads = sharding.shard_loads()
+        self.show(loads)
+        if not (options["plan"] or options["apply"]):
+            return
+
+        moves = sharding.plan_moves(loads)
+        if not moves:
+            self.stdout.write(self.style.SUCCESS("Bazalar tenglashgan"))
+            return
+        for shop_id, source, target in moves:
+            self.stdout.write(
+                f"  do'kon #{shop_id}: {source} -> {target} ({loads[source][shop_id]} ta sotuv)"
+            )
+        if options["apply"]:
+            for shop_id, _source, target in moves:
+                self.move(shop_id, target, options)
+            self.show(sharding.shard_loads())
+
+    def show(self, loads):
+        for alias, shops in loads.items():
+            self.stdout.write(
+                f"{alias}: {len(shops)} ta do'kon, {sum(shops.values())} ta sotuv"
+            )
+
+    def move(self, shop_id, target, options):
+        self.stdout.write(f"do'kon #{shop_id} -> {target} ...")
+        try:
+            copied = sharding.move_shop(
+                shop_id, target, grace=options["grace"], batch_size=options["batch_size"]
+            )
+        except sharding.ShardMoveError as exc:
+            raise CommandError(f"Ko'chirish bekor qilindi: {exc}")
+        if not copied:
+            self.stdout.write(f"  do'kon #{shop_id} allaqachon {target} da")
+            return
+        details = ", ".join(f"{name}: {count}" for name, count in copied.items())
+        self.stdout.write(self.style.SUCCESS(f"  ko'chirildi ({details})"))
@@ -0,0 +1,98 @@
+# shop/management/commands/reconcile_stock.py
+"""
+Ombor qoldig'ini kirim/sotuv tarixi bilan solishtirish (barcha do'konlar):
+
+    python manage.py reconcile_stock
+    python manage.py reconcile_stock --workers 8 --history 10
+    python manage.py reconcile_stock --shop 3 --repair
+
+Do'konlar jarayonlar hovuzida parallel tekshiriladi. Eslatma: mahsulot
+formasida miqdorni kamaytirish tarixga yozilmaydi - bunday mahsulotlar
+ham farq sifatida chiqadi, --repair dan oldin tarixni ko'rib chiqing.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from shop.models import Shop
+from shop.reconcile import audit_shop, repair_stock, stock_history
+from shop.sharding import use_shop
+
+
+def _audit(shop_id):
+    with use_shop(shop_id):
+        return shop_id, audit_shop(shop_id)
+
+
+class Command(BaseCommand):
+    help = "Ombor qoldig'ini tarix bilan solishtirish va (--repair bilan) tuzatish"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--shop", type=int, action="append", dest="shops")
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count() or 1, help="Parallel jarayonlar"
+        )
+        parser.add_argument(
+            "--history", type=int, default=5, help="Har bir farq uchun oxirgi yozuvlar (0 - yo'q)"
+        )
+        parser.add_argument("--repair", action="store_true")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        shop_ids = Shop.objects.order_by("id").values_list("id", flat=True)
+        if options["shops"]:
+            shop_ids = shop_ids.filter(id__in=options["shops"])
+        shop_ids = list(shop_ids)
+
+        workers = max(1, min(options["workers"], len(shop_ids)))
+        if workers == 1:
+            results = map(_audit, shop_ids)
+        else:
+            # Bola jarayonlar (fork) ota jarayon ulanishini meros olmasligi kerak
+            connections.close_all()
+            pool = ProcessPoolExecutor(max_workers=workers)
+            results = pool.map(_audit, shop_ids, chunksize=max(1, len(shop_ids) // (workers * 4)))
+
+        total = repaired = 0
+        try:
+            for shop_id, mismatches in results:
+                if not mismatches:
+                    continue
+                total += len(mismatches)
+                with use_shop(shop_id):
+                    self.report(shop_id, mismatches, options["history"])
+                    if options["repair"]:
+                        repaired += repair_stock(shop_id, mismatches)
+        finally:
+            if workers > 1:
+                pool.shutdown()
+
+        elapsed = time.perf_counter() - started
+        summary = f"{len(shop_ids)} ta do'kon, {elapsed:.1f} s"
+        if not total:
+            self.stdout.write(self.style.SUCCESS(f"Barcha qoldiqlar to'g'ri ({summary})"))
+        elif options["repair"]:
+            self.stdout.write(self.style.SUCCESS(f"Tuzatildi: {repaired} ta mahsulot ({summary})"))
+        else:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Farq: {total} ta mahsulot ({summary}), tuzatish uchun --repair"
+                )
+            )
+
+    def report(self, shop_id, mismatches, history):
+        for item in mismatches:
+            self.stdout.write(
+                f"  do'kon #{shop_id}, mahsulot #{item['product_id']} ({item['name']}): "
+                f"qoldiq {item['quantity']}, kutilgan {item['expected']} "
+                f"(kirim {item['income']} - sotuv {item['sold']} - arxiv {item['archived_sold']})"
+            )
+            if history:
+                for created_at, kind, quantity in stock_history(item["product_id"], history):
+                    self.stdout.write(
+                        f"      {created_at:%Y-%m-%d %H:%M}  {kind:<7} {quantity:+d}"
+                    )
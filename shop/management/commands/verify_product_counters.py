@@ -0,0 +1,54 @@
+# shop/management/commands/verify_product_counters.py
+"""
+Product hisoblagichlarini kirim/sotuv tarixi bilan solishtirish:
+
+    python manage.py verify_product_counters
+    python manage.py verify_product_counters --repair --shop 3
+"""
+from django.core.management.base import BaseCommand
+
+from shop.counters import find_drift, repair
+from shop.models import Shop
+from shop.sharding import use_shop
+
+
+class Command(BaseCommand):
+    help = "Mahsulot hisoblagichlarini tekshirish va (--repair bilan) tuzatish"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--shop", type=int, action="append", dest="shops")
+        parser.add_argument("--repair", action="store_true")
+
+    def handle(self, *args, **options):
+        shop_ids = Shop.objects.order_by("id").values_list("id", flat=True)
+        if options["shops"]:
+            shop_ids = shop_ids.filter(id__in=options["shops"])
+
+        total = 0
+        for shop_id in shop_ids:
+            with use_shop(shop_id):
+                drift = find_drift(shop_id)
+            if not drift:
+                continue
+            total += len(drift)
+
+            for product_id, current, expected in drift:
+                changes = ", ".join(
+                    f"{name}: {current[name]} -> {expected[name]}"
+                    for name in current
+                    if current[name] != expected[name]
+                )
+                self.stdout.write(f"  do'kon #{shop_id}, mahsulot #{product_id}: {changes}")
+
+            if options["repair"]:
+                with use_shop(shop_id):
+                    repair(drift)
+
+        if not total:
+            self.stdout.write(self.style.SUCCESS("Barcha hisoblagichlar to'g'ri"))
+        elif options["repair"]:
+            self.stdout.write(self.style.SUCCESS(f"Tuzatildi: {total} ta mahsulot"))
+        else:
+            self.stdout.write(
+                self.style.WARNING(f"Farq: {total} ta mahsulot (tuzatish uchun --repair)")
+            )
@@ -0,0 +1,324 @@
+# shop/metrics.py
+"""
+Prometheus formatidagi metrikalar.
+
+Har bir jarayon o'z hisoblagichlarini oddiy dict larda yig'adi. `+=`
+o'qish-o'zgartirish-yozish (gthread worker larda oqimlar bir-birining
+qiymatini yo'qotadi), shuning uchun yozuvlar qulf ostida. Bir nechta
+gunicorn worker bo'lsa, har biri vaqti-vaqti bilan o'z holatini
+SHOP_METRICS["DIR"] ga <pid>.json qilib yozadi, /metrics esa barcha
+fayllarni yig'ib beradi. O'lgan jarayonning hisoblagichlari retired.json
+ga qo'shilib, fayli o'chiriladi - pid qayta berilsa yangi jarayon uni
+ustidan yozmaydi.
+"""
+import fcntl
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+
+METRICS = getattr(settings, "SHOP_METRICS", {})
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    "shop_http_request_duration_seconds": ("histogram", "So'rov davomiyligi (URL nomi bo'yicha)"),
+    "shop_db_queries_total": ("counter", "SQL so'rovlar soni (URL nomi bo'yicha)"),
+    "shop_sales_total": ("counter", "Sotuvlar soni (do'kon bo'yicha)"),
+    "shop_sale_cancellations_total": ("counter", "Bekor qilingan sotuvlar soni"),
+    "shop_sale_restores_total": ("counter", "Qayta tiklangan sotuvlar soni"),
+    "shop_sale_transition_conflicts_total": ("counter", "Bajarilmagan bekor qilish/tiklash (holat allaqachon o'zgargan)"),
+    "shop_telegram_messages_total": ("counter", "Telegram xabarlari (natija bo'yicha)"),
+    "shop_cache_requests_total": ("counter", "Statistika keshi murojaatlari (hit/miss)"),
+    "shop_cache_hit_ratio": ("gauge", "Statistika keshi hit ulushi"),
+    "shop_login_throttled_total": ("counter", "Cheklangan login urinishlari (ip/username)"),
+    "shop_idempotent_replays_total": ("counter", "Takroriy yuborilgan formalar (qayta bajarilmagan)"),
+    "shop_barcode_scans_total": ("counter", "Skaner so'rovlari (topildi/topilmadi)"),
+    "shop_events_published_total": ("counter", "Jonli panelga tarqatilgan hodisalar (turi bo'yicha)"),
+    "shop_events_dropped_total": ("counter", "Navbat to'lgani uchun tashlangan hodisalar"),
+    "shop_event_subscribers": ("gauge", "Ochiq jonli panel ulanishlari"),
+    "shop_shard_moves_total": ("counter", "Boshqa bazaga ko'chirilgan do'konlar"),
+    "shop_shard_moving_rejections_total": ("counter", "Do'kon ko'chirilayotganda rad etilgan yozuvchi so'rovlar"),
+}
+
+# (nom, labels) -> qiymat
+_counters = defaultdict(float)
+# (nom, labels) -> [bucket hisoblagichlari..., sum, count]
+_histograms = {}
+# nom -> qiymatni qaytaruvchi funksiya (scrape paytida chaqiriladi)
+_gauge_callbacks = {}
+# Boshqa modullarda yig'ilgan hisoblagichlar: [(nom, labels, qiymat), ...]
+_collectors = []
+
+_lock = threading.Lock()
+
+_last_flush = 0.0
+# Fayl shu jarayon tomonidan yozilganmi (fork dan keyin pid o'zgaradi)
+_flushed_pid = None
+
+RETIRED = "retired.json"
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] += value
+
+
+def observe(name, value, **labels):
+    key = (name, _labels(labels))
+    with _lock:
+        series = _histograms.get(key)
+        if series is None:
+            series = _histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                series[index] += 1
+                break
+        series[-2] += value
+        series[-1] += 1
+
+
+def register_gauge(name, callback):
+    _gauge_callbacks[name] = callback
+
+
+def register_collector(callback):
+    _collectors.append(callback)
+
+
+def snapshot():
+    """Joriy jarayon holati (JSON ga yoziladigan ko'rinishda)"""
+    gauges = {}
+    for name, callback in list(_gauge_callbacks.items()):
+        try:
+            gauges[name] = float(callback())
+        except Exception:
+            continue
+
+    with _lock:
+        counters = [[name, labels, value] for (name, labels), value in _counters.items()]
+        histograms = [
+            [name, labels, list(series)] for (name, labels), series in _histograms.items()
+        ]
+    for collector in _collectors:
+        for name, labels, value in collector():
+            counters.append([name, _labels(labels), value])
+
+    return {
+        "pid": os.getpid(),
+        "counters": counters,
+        "histograms": histograms,
+        "gauges": gauges,
+    }
+
+
+def get_metrics_dir():
+    directory = METRICS.get("DIR")
+    return str(directory) if directory else None
+
+
+def _read(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def _dir_lock(directory):
+    """Jarayonlararo qulf: retired.json ni o'zgartirish va yig'ish uchun"""
+    with open(os.path.join(directory, ".lock"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _retire(directory, filename):
+    """
+    O'lgan jarayon hisoblagichlari va gistogrammalarini retired.json ga
+    qo'shib, faylini o'chirish (gauge lar tashlanadi). _dir_lock ostida.
+    """
+    path = os.path.join(directory, filename)
+    data = _read(path)
+    if data is not None:
+        retired_path = os.path.join(directory, RETIRED)
+        retired = _read(retired_path) or {"pid": None, "counters": [], "histograms": []}
+        counters = defaultdict(float)
+        histograms = {}
+        for source in (retired, data):
+            for name, labels, value in source["counters"]:
+                counters[(name, tuple(map(tuple, labels)))] += value
+            for name, labels, series in source["histograms"]:
+                total = histograms.setdefault(
+                    (name, tuple(map(tuple, labels))), [0] * len(series)
+                )
+                for index, value in enumerate(series):
+                    total[index] += value
+        _write(
+            retired_path,
+            {
+                "pid": None,
+                "counters": [[name, labels, value] for (name, labels), value in counters.items()],
+                "histograms": [
+                    [name, labels, series] for (name, labels), series in histograms.items()
+                ],
+                "gauges": {},
+            },
+        )
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def flush(force=False):
+    """Jarayon holatini faylga yozish (ko'p jarayonli rejim)"""
+    global _last_flush, _flushed_pid
+
+    directory = get_metrics_dir()
+    if not directory:
+        return
+
+    now = time.monotonic()
+    if not force and now - _last_flush < METRICS.get("FLUSH_INTERVAL", 5):
+        return
+    _last_flush = now
+
+    os.makedirs(directory, exist_ok=True)
+    pid = os.getpid()
+    filename = f"{pid}.json"
+    if _flushed_pid != pid:
+        # Shu pid li oldingi (o'lgan) jarayon fayli - ustidan yozilmaydi
+        with _dir_lock(directory):
+            if os.path.exists(os.path.join(directory, filename)):
+                _retire(directory, filename)
+        _flushed_pid = pid
+    _write(os.path.join(directory, filename), snapshot())
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _worker_pid(filename):
+    name = filename[: -len(".json")]
+    return int(name) if name.isdigit() else None
+
+
+def collect():
+    """Barcha jarayonlar holatini yig'ish"""
+    directory = get_metrics_dir()
+    if not directory:
+        snapshots = [snapshot()]
+    else:
+        flush(force=True)
+        snapshots = []
+        with _dir_lock(directory):
+            for filename in os.listdir(directory):
+                pid = _worker_pid(filename) if filename.endswith(".json") else None
+                if pid is not None and pid != os.getpid() and not _pid_alive(pid):
+                    _retire(directory, filename)
+            for filename in os.listdir(directory):
+                if not filename.endswith(".json"):
+                    continue
+                data = _read(os.path.join(directory, filename))
+                if data is not None:
+                    snapshots.append(data)
+
+    counters = defaultdict(float)
+    histograms = {}
+    gauges = defaultdict(float)
+
+    for data in snapshots:
+        for name, labels, value in data["counters"]:
+            counters[(name, tuple(map(tuple, labels)))] += value
+        for name, labels, series in data["histograms"]:
+            key = (name, tuple(map(tuple, labels)))
+            total = histograms.setdefault(key, [0] * len(series))
+            for index, value in enumerate(series):
+                total[index] += value
+        # O'lgan worker lar retired.json da - gauge lari u yerga o'tmaydi
+        for name, value in data["gauges"].items():
+            gauges[name] += value
+
+    # Hit ulushi jarayonlar yig'indisidan hisoblanadi
+    hits = counters.get(("shop_cache_requests_total", (("result", "hit"),)), 0)
+    misses = counters.get(("shop_cache_requests_total", (("result", "miss"),)), 0)
+    gauges["shop_cache_hit_ratio"] = hits / (hits + misses) if hits + misses else 0.0
+
+    return counters, histograms, gauges
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+def render():
+    """Prometheus text exposition format (0.0.4)"""
+    counters, histograms, gauges = collect()
+
+    series_by_name = defaultdict(list)
+    for (name, labels), value in sorted(counters.items()):
+        series_by_name[name].append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    for (name, labels), series in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, series):
+            cumulative += count
+            series_by_name[name].append(
+                f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}"
+            )
+        series_by_name[name].append(
+            f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {series[-1]}"
+        )
+        series_by_name[name].append(f"{name}_sum{_format_labels(labels)} {repr(float(series[-2]))}")
+        series_by_name[name].append(f"{name}_count{_format_labels(labels)} {series[-1]}")
+
+    for name, value in sorted(gauges.items()):
+        series_by_name[name].append(f"{name} {_format_value(value)}")
+
+    lines = []
+    for name, series in series_by_name.items():
+        kind, help_text = HELP.get(name, ("untyped", name))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(series)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,435 @@
+# shop/middleware.py
+import cProfile
+import logging
+import sys
+import time
+import uuid
+from contextlib import ExitStack
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+
+from . import metrics, sharding
+from .log_utils import request_id_var, request_var
+
+logger = logging.getLogger("shop.perf")
+slow_logger = logging.getLogger("shop.perf.slow")
+
+INSTRUMENTATION = getattr(settings, "SHOP_INSTRUMENTATION", {})
+PROFILING = getattr(settings, "SHOP_PROFILING", {})
+METRICS = getattr(settings, "SHOP_METRICS", {})
+
+BASE_DIR = str(Path(settings.BASE_DIR).resolve())
+THIS_FILE = __file__
+
+
+def find_query_origin():
+    """
+    So'rov qayerdan chaqirilganini topish: shablon qatori va/yoki
+    loyihadagi view qatori.
+    """
+    template_origin = None
+    code_origin = None
+
+    frame = sys._getframe(2)
+    while frame is not None and (template_origin is None or code_origin is None):
+        code = frame.f_code
+
+        if template_origin is None and code.co_name == "render_annotated":
+            node = frame.f_locals.get("self")
+            token = getattr(node, "token", None)
+            origin = getattr(node, "origin", None)
+            if token is not None and origin is not None:
+                template_origin = f"{origin.template_name}:{token.lineno}"
+
+        filename = code.co_filename
+        if (
+            code_origin is None
+            and filename.startswith(BASE_DIR)
+            and filename != THIS_FILE
+            and "site-packages" not in filename
+        ):
+            relative = filename[len(BASE_DIR) + 1 :]
+            code_origin = f"{relative}:{frame.f_lineno} in {code.co_name}"
+
+        frame = frame.f_back
+
+    return " <- ".join(part for part in (template_origin, code_origin) if part)
+
+
+class RequestContextMiddleware:
+    """
+    Log yozuvlari uchun so'rov konteksti (request_id, user_id, shop_id).
+    X-Request-ID sarlavhasi bo'lsa o'shani ishlatadi va javobga qaytaradi.
+    ASGI da asinxron ishlaydi - async view lar oqimga o'tkazilmaydi.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        request_id, tokens = self.enter(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            self.exit(tokens)
+
+        response["X-Request-ID"] = request_id
+        return response
+
+    async def __acall__(self, request):
+        request_id, tokens = self.enter(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.exit(tokens)
+
+        response["X-Request-ID"] = request_id
+        return response
+
+    @staticmethod
+    def enter(request):
+        request_id = (request.headers.get("X-Request-ID") or uuid.uuid4().hex)[:64]
+        return request_id, (request_id_var.set(request_id), request_var.set(request))
+
+    @staticmethod
+    def exit(tokens):
+        id_token, request_token = tokens
+        request_id_var.reset(id_token)
+        request_var.reset(request_token)
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class _QueryRecorder:
+    """connection.execute_wrapper() uchun: har bir so'rov vaqtini yozib borish"""
+
+    def __init__(self):
+        self.queries = []
+        self.fingerprints = {}
+        self.origins = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - started) * 1000
+            self.queries.append((sql, duration))
+
+            # sql - parametrlarsiz shablon, shuning uchun bir xil so'rovlar
+            # bir xil kalitga tushadi. Manba faqat ikkinchi marta uchraganda
+            # qidiriladi - oddiy so'rovlar uchun stack yurilmaydi.
+            count = self.fingerprints.get(sql, 0) + 1
+            self.fingerprints[sql] = count
+            if count == 2:
+                self.origins[sql] = find_query_origin()
+
+    @property
+    def total_ms(self):
+        return sum(duration for _, duration in self.queries)
+
+    def slowest(self, limit):
+        return sorted(self.queries, key=lambda item: item[1], reverse=True)[:limit]
+
+    def duplicates(self, threshold):
+        return [
+            {"sql": sql, "count": count, "origin": self.origins.get(sql, "")}
+            for sql, count in sorted(
+                self.fingerprints.items(), key=lambda item: item[1], reverse=True
+            )
+            if count >= threshold
+        ]
+
+
+class QueryInstrumentationMiddleware:
+    """
+    So'rov uchun SQL soni, SQL vaqti, eng sekin so'rovlar va view vaqtini
+    o'lchash. SHOP_INSTRUMENTATION["ENABLED"] bo'lmasa umuman ulanmaydi.
+    """
+
+    def __init__(self, get_response):
+        if not INSTRUMENTATION.get("ENABLED"):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_ms = INSTRUMENTATION.get("SLOW_REQUEST_MS", 500)
+        self.top_queries = INSTRUMENTATION.get("TOP_QUERIES", 5)
+        self.duplicate_threshold = INSTRUMENTATION.get("DUPLICATE_THRESHOLD", 3)
+
+    def __call__(self, request):
+        recorder = _QueryRecorder()
+        started = time.perf_counter()
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+
+        total_ms = (time.perf_counter() - started) * 1000
+        db_ms = recorder.total_ms
+        view_ms = total_ms - db_ms
+        query_count = len(recorder.queries)
+
+        response["Server-Timing"] = (
+            f'db;dur={db_ms:.1f};desc="{query_count} queries", '
+            f"view;dur={view_ms:.1f}, total;dur={total_ms:.1f}"
+        )
+
+        match = getattr(request, "resolver_match", None)
+        duplicates = recorder.duplicates(self.duplicate_threshold)
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "total_ms": round(total_ms, 1),
+            "view_ms": round(view_ms, 1),
+            "db_ms": round(db_ms, 1),
+            "queries": query_count,
+            "duplicates": len(duplicates),
+        }
+
+        logger.info(
+            "%s %s %s", request.method, request.path, response.status_code,
+            extra={"perf": record},
+        )
+
+        for duplicate in duplicates:
+            logger.warning(
+                "N+1: %s marta takrorlandi (%s): %s",
+                duplicate["count"],
+                duplicate["origin"] or "manba noma'lum",
+                duplicate["sql"],
+            )
+
+        if total_ms >= self.slow_ms:
+            record["top_queries"] = [
+                {"sql": sql, "ms": round(duration, 2)}
+                for sql, duration in recorder.slowest(self.top_queries)
+            ]
+            record["duplicate_queries"] = duplicates
+            slow_logger.warning(
+                "Sekin so'rov: %s %s (%.0f ms)", request.method, request.path, total_ms,
+                extra={"perf": record},
+            )
+
+        return response
+
+
+class ProfilerMiddleware:
+    """
+    Superuser uchun so'rovni cProfile bilan profillash.
+
+    Yoqish: `X-Profile: 1` sarlavhasi yoki `?_profile=1` parametri.
+    Natija SHOP_PROFILING["DIR"] ga saqlanadi va admin sahifasida ko'rinadi.
+    SHOP_PROFILING["ENABLED"] bo'lmasa middleware umuman ulanmaydi.
+    """
+
+    def __init__(self, get_response):
+        if not PROFILING.get("ENABLED"):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not (
+            request.headers.get("X-Profile") or request.GET.get("_profile")
+        ) or not request.user.is_superuser:
+            return self.get_response(request)
+
+        from .profiling import save_profile
+
+        recorder = _QueryRecorder()
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        total_ms = (time.perf_counter() - started) * 1000
+
+        match = getattr(request, "resolver_match", None)
+        kwargs = match.kwargs if match else {}
+        name = save_profile(
+            profiler,
+            {
+                "view": match.view_name if match else None,
+                "path": request.get_full_path(),
+                "method": request.method,
+                "shop_id": kwargs.get("shop_id") or self.resolve_shop_id(kwargs),
+                "user": request.user.username,
+                "status": response.status_code,
+                "total_ms": round(total_ms, 1),
+                "queries": len(recorder.queries),
+                "db_ms": round(recorder.total_ms, 1),
+            },
+        )
+        response["X-Profile-Name"] = name
+        return response
+
+    @staticmethod
+    def resolve_shop_id(kwargs):
+        from .models import Product, Sale
+
+        if "product_id" in kwargs:
+            return (
+                Product.objects.filter(id=kwargs["product_id"])
+                .values_list("shop_id", flat=True)
+                .first()
+            )
+        if "sale_id" in kwargs:
+            return (
+                Sale.objects.filter(id=kwargs["sale_id"])
+                .values_list("shop_id", flat=True)
+                .first()
+            )
+        return None
+
+
+class MetricsMiddleware:
+    """
+    So'rov davomiyligi va SQL soni metrikalari (URL nomi bo'yicha).
+
+    ASGI da faqat davomiylik yoziladi: async ORM so'rovlari boshqa oqimning
+    ulanishida bajariladi, execute_wrapper ularni ko'rmaydi.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not METRICS.get("ENABLED"):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        counter = _QueryCounter()
+        started = time.perf_counter()
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+
+        view = self.record(request, started)
+        metrics.inc("shop_db_queries_total", counter.count, view=view)
+        metrics.flush()
+
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, started)
+        metrics.flush()
+        return response
+
+    @staticmethod
+    def record(request, started):
+        match = getattr(request, "resolver_match", None)
+        view = match.url_name if match and match.url_name else "unmatched"
+
+        metrics.observe(
+            "shop_http_request_duration_seconds",
+            time.perf_counter() - started,
+            view=view,
+            method=request.method,
+        )
+        return view
+
+
+class ShardMiddleware:
+    """
+    Joriy do'kon bazasi (shop/sharding.py) - URL dagi shop_id, product_id
+    yoki sale_id bo'yicha. Do'kon boshqa bazaga ko'chirilayotganda yozuvchi
+    so'rovlar 503 oladi. Bitta baza bo'lsa middleware ulanmaydi.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+    def __init__(self, get_response):
+        if not sharding.enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        shop = self.locate(request)
+        if shop is None:
+            return self.get_response(request)
+        if self.is_blocked(request, shop):
+            return self.moving_response()
+        with sharding.using(shop[1], shop[0]):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        shop = await sync_to_async(self.locate)(request)
+        if shop is None:
+            return await self.get_response(request)
+        if self.is_blocked(request, shop):
+            return self.moving_response()
+        # Oqimli javob (SSE) tanasi kontekstdan tashqarida o'qiladi -
+        # u o'z bazasini o'zi aniqlaydi (events.snapshot)
+        with sharding.using(shop[1], shop[0]):
+            return await self.get_response(request)
+
+    @staticmethod
+    def locate(request):
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        return sharding.locate(**match.kwargs)
+
+    def is_blocked(self, request, shop):
+        _shop_id, _alias, is_moving = shop
+        return is_moving and request.method not in self.SAFE_METHODS
+
+    @staticmethod
+    def moving_response():
+        metrics.inc("shop_shard_moving_rejections_total")
+        response = HttpResponse(
+            "Do'kon ma'lumotlari ko'chirilmoqda, birozdan keyin qayta urinib ko'ring.",
+            status=503,
+            content_type="text/plain; charset=utf-8",
+        )
+        response["Retry-After"] = str(sharding.SHARDS.get("MOVE_GRACE", 5) + 5)
+        return response
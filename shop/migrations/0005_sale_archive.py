@@ -0,0 +1,79 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0004_idempotency_keys'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaleArchiveState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('archived_before', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('shop', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='archive_state', to='shop.shop')),
+            ],
+            options={
+                'verbose_name': 'Arxiv holati',
+                'verbose_name_plural': 'Arxiv holatlari',
+            },
+        ),
+        migrations.CreateModel(
+            name='SaleArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('quantity', models.IntegerField(verbose_name='Miqdor')),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Birlik narxi')),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Umumiy summa')),
+                ('customer_name', models.CharField(blank=True, max_length=200, verbose_name='Mijoz ismi')),
+                ('is_cancelled', models.BooleanField(default=False, verbose_name='Bekor qilingan')),
+                ('cancelled_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('restored_at', models.DateTimeField(blank=True, null=True)),
+                ('restoration_reason', models.TextField(blank=True)),
+                ('client_uuid', models.UUIDField(blank=True, null=True, unique=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('cancelled_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('cashier', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_sales', to='shop.product')),
+                ('restored_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_sales', to='shop.shop')),
+            ],
+            options={
+                'verbose_name': 'Arxivlangan sotuv',
+                'verbose_name_plural': 'Arxivlangan sotuvlar',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['shop', 'created_at'], name='shop_salear_shop_id_02c03f_idx'), models.Index(fields=['product', 'created_at'], name='shop_salear_product_a6f7e6_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SaleMonthlySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='Oy')),
+                ('sales_count', models.IntegerField(default=0)),
+                ('sold_quantity', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('cancelled_count', models.IntegerField(default=0)),
+                ('cancelled_quantity', models.IntegerField(default=0)),
+                ('cancelled_amount', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sale_summaries', to='shop.product')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sale_summaries', to='shop.shop')),
+            ],
+            options={
+                'verbose_name': "Oylik sotuv yig'indisi",
+                'verbose_name_plural': "Oylik sotuv yig'indilari",
+                'ordering': ['-month'],
+                'indexes': [models.Index(fields=['shop', 'month'], name='shop_salemo_shop_id_7589ce_idx')],
+                'unique_together': {('product', 'month')},
+            },
+        ),
+    ]
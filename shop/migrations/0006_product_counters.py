@@ -0,0 +1,85 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:56
+
+from django.db import migrations, models
+from django.db.models import Q, Sum
+
+
+def fill_counters(apps, schema_editor):
+    Product = apps.get_model("shop", "Product")
+    ProductIncome = apps.get_model("shop", "ProductIncome")
+    Sale = apps.get_model("shop", "Sale")
+    SaleMonthlySummary = apps.get_model("shop", "SaleMonthlySummary")
+
+    counters = {}
+
+    def add(product_id, **values):
+        row = counters.setdefault(
+            product_id,
+            {"total_income_qty": 0, "sold_qty": 0, "revenue": 0, "cancelled_qty": 0},
+        )
+        for name, value in values.items():
+            row[name] += value or 0
+
+    for row in ProductIncome.objects.values("product_id").annotate(total=Sum("quantity")):
+        add(row["product_id"], total_income_qty=row["total"])
+
+    for row in Sale.objects.values("product_id").annotate(
+        sold=Sum("quantity", filter=Q(is_cancelled=False)),
+        revenue=Sum("total_amount", filter=Q(is_cancelled=False)),
+        cancelled=Sum("quantity", filter=Q(is_cancelled=True)),
+    ):
+        add(
+            row["product_id"],
+            sold_qty=row["sold"],
+            revenue=row["revenue"],
+            cancelled_qty=row["cancelled"],
+        )
+
+    for row in SaleMonthlySummary.objects.values("product_id").annotate(
+        sold=Sum("sold_quantity"),
+        revenue=Sum("revenue"),
+        cancelled=Sum("cancelled_quantity"),
+    ):
+        add(
+            row["product_id"],
+            sold_qty=row["sold"],
+            revenue=row["revenue"],
+            cancelled_qty=row["cancelled"],
+        )
+
+    Product.objects.bulk_update(
+        [Product(id=product_id, **values) for product_id, values in counters.items()],
+        ["total_income_qty", "sold_qty", "revenue", "cancelled_qty"],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_sale_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='cancelled_qty',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Bekor qilingan'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='revenue',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=16, verbose_name='Jami tushum'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='sold_qty',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Jami sotilgan'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='total_income_qty',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Jami kirim'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
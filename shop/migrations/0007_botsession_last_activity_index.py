@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0006_product_counters'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='botsession',
+            name='last_activity',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
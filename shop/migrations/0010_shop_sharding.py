@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0009_product_barcode'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Model')),
+                ('next_id', models.BigIntegerField(verbose_name='Keyingi id')),
+            ],
+            options={
+                'verbose_name': 'Id ketma-ketligi',
+                'verbose_name_plural': 'Id ketma-ketliklari',
+            },
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='is_moving',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='shard',
+            field=models.CharField(default='default', editable=False, max_length=50, verbose_name='Baza'),
+        ),
+    ]
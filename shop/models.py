@@ -1,4 +1,6 @@
 # shop/models.py
+import secrets
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
@@ -76,6 +78,18 @@ class Shop(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # O'zgarish belgilari (shop/watermarks.py): sahifalar ETag/Last-Modified i
+    catalog_changed_at = models.DateTimeField(default=timezone.now, editable=False)
+    sales_changed_at = models.DateTimeField(default=timezone.now, editable=False)
+    # Mahsulot va sotuvlar saqlanadigan baza (shop/sharding.py)
+    shard = models.CharField(
+        max_length=50, default="default", editable=False, verbose_name="Baza"
+    )
+    is_moving = models.BooleanField(default=False, editable=False)
+
+    WATERMARK_FIELDS = ("catalog_changed_at", "sales_changed_at")
+    # Faqat manage.py rebalance_shards o'zgartiradi
+    ROUTING_FIELDS = ("shard", "is_moving")
 
     class Meta:
         verbose_name = "Do'kon"
@@ -85,6 +99,24 @@ class Shop(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        from .sharding import enabled, pick_shard
+
+        if self._state.adding and enabled() and self.shard == "default":
+            self.shard = pick_shard()
+
+        # Belgilarni eski qiymat bilan ustidan yozmaslik (orqaga ketmasligi
+        # kerak), bazani esa ko'chirish paytida eski obyekt bilan qaytarmaslik
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.WATERMARK_FIELDS + self.ROUTING_FIELDS
+            ]
+
+        super().save(*args, **kwargs)
+
     def get_total_products(self):
         """Jami mahsulotlar soni"""
         return self.products.count()
@@ -103,7 +135,8 @@ class Shop(models.Model):
         result = self.sales.filter(is_cancelled=False).aggregate(
             total=Sum("total_amount")
         )
-        return result["total"] or Decimal("0.00")
+        archived = self.sale_summaries.aggregate(total=Sum("revenue"))
+        return (result["total"] or Decimal("0.00")) + (archived["total"] or 0)
 
     def get_total_cancelled_amount(self):
         """Jami bekor qilingan summa"""
@@ -112,14 +145,16 @@ class Shop(models.Model):
         result = self.sales.filter(is_cancelled=True).aggregate(
             total=Sum("total_amount")
         )
-        return result["total"] or Decimal("0.00")
+        archived = self.sale_summaries.aggregate(total=Sum("cancelled_amount"))
+        return (result["total"] or Decimal("0.00")) + (archived["total"] or 0)
 
     def get_total_sales_quantity(self):
         """Jami sotilgan mahsulotlar miqdori"""
         from django.db.models import Sum
 
         result = self.sales.filter(is_cancelled=False).aggregate(total=Sum("quantity"))
-        return result["total"] or 0
+        archived = self.sale_summaries.aggregate(total=Sum("sold_quantity"))
+        return (result["total"] or 0) + (archived["total"] or 0)
 
     def get_remaining_value(self):
         """Qolgan mahsulotlarning umumiy qiymati"""
@@ -129,7 +164,27 @@ class Shop(models.Model):
         return total
 
 
-class ShopStaff(models.Model):
+class ShardedModel(models.Model):
+    """
+    Do'kon bazasida saqlanadigan model (shop/sharding.py). Bazalar bo'lingan
+    bo'lsa yangi qator id si umumiy ketma-ketlikdan olinadi.
+    """
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.pk is None:
+            from .sharding import allocate_ids
+
+            ids = allocate_ids(type(self))
+            if ids:
+                self.pk = ids[0]
+                kwargs["force_insert"] = True
+        super().save(*args, **kwargs)
+
+
+class ShopStaff(ShardedModel):
     """Do'kon xodimlari"""
 
     ROLE_CHOICES = [
@@ -156,7 +211,13 @@ class ShopStaff(models.Model):
         return f"{self.user.username} - {self.shop.name} ({self.get_role_display()})"
 
 
-class Product(models.Model):
+def normalize_barcode(value):
+    """Skaner yoki formadan kelgan kod: bo'shliqlarsiz, bo'sh bo'lsa None"""
+    value = (value or "").strip()
+    return value or None
+
+
+class Product(ShardedModel):
     """Mahsulotlar"""
 
     # Miqdor birliklari
@@ -193,14 +254,35 @@ class Product(models.Model):
         default="dona",
         verbose_name="Miqdor birligi",
     )
+    # Skaner uchun: do'kon ichida yagona, (shop, barcode) indeksi orqali qidiriladi.
+    # Bo'sh qiymat NULL saqlanadi - yagonalik faqat berilgan kodlarga tegishli
+    barcode = models.CharField(
+        max_length=64, null=True, blank=True, verbose_name="Shtrix-kod / SKU"
+    )
     added_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Hisoblagichlar - faqat shop/counters.py dagi F() yangilashlari orqali
+    # o'zgaradi (tekshirish: manage.py verify_product_counters)
+    total_income_qty = models.IntegerField(default=0, editable=False, verbose_name="Jami kirim")
+    sold_qty = models.IntegerField(default=0, editable=False, verbose_name="Jami sotilgan")
+    revenue = models.DecimalField(
+        max_digits=16, decimal_places=2, default=0, editable=False, verbose_name="Jami tushum"
+    )
+    cancelled_qty = models.IntegerField(default=0, editable=False, verbose_name="Bekor qilingan")
+
+    COUNTER_FIELDS = ("total_income_qty", "sold_qty", "revenue", "cancelled_qty")
+
     class Meta:
         verbose_name = "Mahsulot"
         verbose_name_plural = "Mahsulotlar"
         ordering = ["-created_at"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["shop", "barcode"], name="product_unique_shop_barcode"
+            )
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.shop.name}"
@@ -211,17 +293,11 @@ class Product(models.Model):
 
     def get_total_income(self):
         """Jami kirim"""
-        from django.db.models import Sum
-
-        result = self.income_history.aggregate(total=Sum("quantity"))
-        return result["total"] or 0
+        return self.total_income_qty
 
     def get_total_sold(self):
         """Jami sotilgan"""
-        from django.db.models import Sum
-
-        result = self.sales.filter(is_cancelled=False).aggregate(total=Sum("quantity"))
-        return result["total"] or 0
+        return self.sold_qty
 
     def get_remaining(self):
         """Qoldiq"""
@@ -229,12 +305,7 @@ class Product(models.Model):
 
     def get_total_revenue(self):
         """Jami tushum"""
-        from django.db.models import Sum
-
-        result = self.sales.filter(is_cancelled=False).aggregate(
-            total=Sum("total_amount")
-        )
-        return result["total"] or Decimal("0.00")
+        return self.revenue
 
     def get_total_value(self):
         """Qolgan mahsulotning qiymati"""
@@ -263,10 +334,21 @@ class Product(models.Model):
         if self.quantity < 0:
             self.quantity = 0
 
+        # Bo'sh shtrix-kod NULL - aks holda ikkinchi "" yagonalikni buzadi
+        self.barcode = normalize_barcode(self.barcode)
+
+        # Hisoblagichlarni eski qiymat bilan ustidan yozmaslik
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+
         super().save(*args, **kwargs)
 
 
-class ProductIncome(models.Model):
+class ProductIncome(ShardedModel):
     """Mahsulot kirimi tarixi"""
 
     product = models.ForeignKey(
@@ -284,8 +366,16 @@ class ProductIncome(models.Model):
     def __str__(self):
         return f"{self.product.name} - {self.quantity} dona"
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if adding:
+            from .counters import record_income
+
+            record_income(self.product_id, self.quantity, self.product.shop_id)
 
-class Sale(models.Model):
+
+class Sale(ShardedModel):
     """Sotuvlar"""
 
     shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name="sales")
@@ -329,6 +419,12 @@ class Sale(models.Model):
     restoration_reason = models.TextField(
         blank=True, verbose_name="Qayta tiklash sababi"
     )
+    # Oflayn kassadan kelgan sotuvlar uchun (takroriy yuklashdan himoya)
+    client_uuid = models.UUIDField(
+        null=True, blank=True, unique=True, editable=False, verbose_name="Mijoz UUID"
+    )
+
+    is_archived = False
 
     class Meta:
         verbose_name = "Sotuv"
@@ -345,21 +441,10 @@ class Sale(models.Model):
 
     def restore_sale(self, user, reason=""):
         """Sotuvni qayta tiklash"""
-        if not self.is_cancelled:
-            raise ValueError("Bu sotuv allaqachon bekor qilinmagan!")
+        from .transitions import restore_sale
 
-        self.is_cancelled = False
-        self.restored_by = user
-        self.restoration_reason = reason
-        from django.utils import timezone
-
-        self.restored_at = timezone.now()
-        self.save()
-
-        # Mahsulot miqdorini kamaytirish
-        product = self.product
-        product.quantity -= self.quantity
-        product.save()
+        if not restore_sale(self, user, reason):
+            raise ValueError("Bu sotuv allaqachon bekor qilinmagan!")
 
         return self
 
@@ -401,6 +486,106 @@ class Sale(models.Model):
         }
 
 
+class SaleArchive(ShardedModel):
+    """
+    Arxivlangan (eski) sotuvlar. Ustunlar Sale bilan bir xil, id saqlanadi.
+    Bekor qilish/tiklash arxivdagi sotuvlar uchun mavjud emas.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    shop = models.ForeignKey(
+        Shop, on_delete=models.CASCADE, related_name="archived_sales"
+    )
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="archived_sales"
+    )
+    quantity = models.IntegerField(verbose_name="Miqdor")
+    unit_price = models.DecimalField(
+        max_digits=12, decimal_places=2, verbose_name="Birlik narxi"
+    )
+    total_amount = models.DecimalField(
+        max_digits=12, decimal_places=2, verbose_name="Umumiy summa"
+    )
+    customer_name = models.CharField(
+        max_length=200, blank=True, verbose_name="Mijoz ismi"
+    )
+    cashier = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, related_name="+"
+    )
+    is_cancelled = models.BooleanField(default=False, verbose_name="Bekor qilingan")
+    cancelled_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    cancelled_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField()
+    restored_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    restored_at = models.DateTimeField(null=True, blank=True)
+    restoration_reason = models.TextField(blank=True)
+    client_uuid = models.UUIDField(null=True, blank=True, unique=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    is_archived = True
+
+    class Meta:
+        verbose_name = "Arxivlangan sotuv"
+        verbose_name_plural = "Arxivlangan sotuvlar"
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["shop", "created_at"]),
+            models.Index(fields=["product", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} - {self.quantity} dona (arxiv)"
+
+
+class SaleMonthlySummary(ShardedModel):
+    """Arxivlangan sotuvlarning oylik yig'indisi (mahsulot bo'yicha)"""
+
+    shop = models.ForeignKey(
+        Shop, on_delete=models.CASCADE, related_name="sale_summaries"
+    )
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="sale_summaries"
+    )
+    month = models.DateField(verbose_name="Oy")
+    sales_count = models.IntegerField(default=0)
+    sold_quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    cancelled_count = models.IntegerField(default=0)
+    cancelled_quantity = models.IntegerField(default=0)
+    cancelled_amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Oylik sotuv yig'indisi"
+        verbose_name_plural = "Oylik sotuv yig'indilari"
+        ordering = ["-month"]
+        unique_together = ["product", "month"]
+        indexes = [models.Index(fields=["shop", "month"])]
+
+    def __str__(self):
+        return f"{self.product_id} - {self.month:%Y-%m}"
+
+
+class SaleArchiveState(models.Model):
+    """Do'kon sotuvlari qaysi sanagacha arxivga ko'chirilgani"""
+
+    shop = models.OneToOneField(
+        Shop, on_delete=models.CASCADE, related_name="archive_state"
+    )
+    archived_before = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Arxiv holati"
+        verbose_name_plural = "Arxiv holatlari"
+
+    def __str__(self):
+        return f"{self.shop} - {self.archived_before:%Y-%m-%d}"
+
+
 class TelegramUser(models.Model):
     """Telegram foydalanuvchilari"""
 
@@ -434,7 +619,7 @@ class BotSession(models.Model):
     session_data = models.JSONField(default=dict, verbose_name="Sessiya ma'lumotlari")
     is_active = models.BooleanField(default=True, verbose_name="Faol")
     created_at = models.DateTimeField(auto_now_add=True)
-    last_activity = models.DateTimeField(auto_now=True)
+    last_activity = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         verbose_name = "Bot sessiyasi"
@@ -459,3 +644,69 @@ class ProductCategory(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class ApiToken(models.Model):
+    """Kassa ilovalari uchun API tokenlari"""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="api_tokens")
+    key = models.CharField(max_length=64, unique=True, editable=False, verbose_name="Kalit")
+    name = models.CharField(max_length=100, blank=True, verbose_name="Qurilma nomi")
+    is_active = models.BooleanField(default=True, verbose_name="Faol")
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "API token"
+        verbose_name_plural = "API tokenlar"
+
+    def __str__(self):
+        return f"{self.user.username} - {self.name or self.key[:8]}"
+
+    def save(self, *args, **kwargs):
+        if not self.key:
+            self.key = secrets.token_hex(20)
+        super().save(*args, **kwargs)
+
+
+class IdSequence(models.Model):
+    """
+    Bazalar bo'lingan holatda do'kon modellari id lari shu yerdan bloklab
+    olinadi - do'kon boshqa bazaga ko'chirilganda ham id lar to'qnashmaydi.
+    """
+
+    name = models.CharField(max_length=100, unique=True, verbose_name="Model")
+    next_id = models.BigIntegerField(verbose_name="Keyingi id")
+
+    class Meta:
+        verbose_name = "Id ketma-ketligi"
+        verbose_name_plural = "Id ketma-ketliklari"
+
+    def __str__(self):
+        return f"{self.name}: {self.next_id}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Forma yuborishlarining takrorlanishidan himoya: har bir forma uchun
+    bitta kalit va birinchi so'rov natijasi (redirect manzili).
+    """
+
+    key = models.UUIDField(unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    scope = models.CharField(max_length=50)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    location = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = "Idempotentlik kaliti"
+        verbose_name_plural = "Idempotentlik kalitlari"
+
+    def __str__(self):
+        return f"{self.scope} - {self.key}"
+
+    @property
+    def is_completed(self):
+        return self.status_code is not None
@@ -0,0 +1,121 @@
+# shop/profiling.py
+"""Saqlangan profillar: yozish, o'qish va admin sahifalari"""
+import json
+import pstats
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.http import Http404
+from django.shortcuts import render
+from django.utils import timezone
+
+PROFILING = getattr(settings, "SHOP_PROFILING", {})
+
+
+def get_profile_dir():
+    return Path(PROFILING.get("DIR", Path(settings.BASE_DIR) / "profiles"))
+
+
+def save_profile(profiler, metadata):
+    """Profilni .prof fayl va .json metama'lumot sifatida saqlash"""
+    profile_dir = get_profile_dir()
+    profile_dir.mkdir(parents=True, exist_ok=True)
+
+    created_at = timezone.now()
+    name = "{}-{}-{}".format(
+        created_at.strftime("%Y%m%d%H%M%S"),
+        (metadata.get("view") or "unknown").replace(":", "_"),
+        uuid.uuid4().hex[:8],
+    )
+    metadata = dict(metadata, name=name, created_at=created_at.isoformat())
+
+    profiler.dump_stats(profile_dir / f"{name}.prof")
+    with open(profile_dir / f"{name}.json", "w", encoding="utf-8") as f:
+        json.dump(metadata, f, ensure_ascii=False, indent=2)
+
+    prune_profiles(PROFILING.get("MAX_PROFILES", 200))
+    return name
+
+
+def prune_profiles(keep):
+    """Eng eski profillarni o'chirish"""
+    files = sorted(get_profile_dir().glob("*.json"), reverse=True)
+    for meta_path in files[keep:]:
+        meta_path.with_suffix(".prof").unlink(missing_ok=True)
+        meta_path.unlink(missing_ok=True)
+
+
+def list_profiles(limit=100):
+    profile_dir = get_profile_dir()
+    if not profile_dir.exists():
+        return []
+
+    profiles = []
+    for meta_path in sorted(profile_dir.glob("*.json"), reverse=True)[:limit]:
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+def load_profile(name):
+    """Profil va uning eng og'ir (cumulative) funksiyalari"""
+    profile_dir = get_profile_dir()
+    meta_path = profile_dir / f"{name}.json"
+    prof_path = profile_dir / f"{name}.prof"
+
+    # Nomda katalog ajratgichlari bo'lmasligi kerak
+    if meta_path.parent != profile_dir or not prof_path.exists():
+        raise Http404("Profil topilmadi")
+
+    with open(meta_path, encoding="utf-8") as f:
+        metadata = json.load(f)
+
+    stats = pstats.Stats(str(prof_path))
+    rows = []
+    for (filename, lineno, func), (cc, nc, tt, ct, _callers) in stats.stats.items():
+        rows.append(
+            {
+                "function": f"{func} ({filename}:{lineno})",
+                "calls": nc if nc == cc else f"{nc}/{cc}",
+                "tottime_ms": round(tt * 1000, 2),
+                "cumtime_ms": round(ct * 1000, 2),
+            }
+        )
+    rows.sort(key=lambda row: row["cumtime_ms"], reverse=True)
+
+    return metadata, rows
+
+
+def _superuser_only(request):
+    if not request.user.is_superuser:
+        raise PermissionDenied("Faqat superuser profillarni ko'ra oladi!")
+
+
+def profiles_view(request):
+    """Admin: oxirgi profillar ro'yxati"""
+    _superuser_only(request)
+    context = {
+        **admin.site.each_context(request),
+        "title": "So'rov profillari",
+        "profiles": list_profiles(),
+    }
+    return render(request, "admin/shop/profiles.html", context)
+
+
+def profile_detail_view(request, name):
+    """Admin: bitta profilning eng og'ir funksiyalari"""
+    _superuser_only(request)
+    metadata, rows = load_profile(name)
+    context = {
+        **admin.site.each_context(request),
+        "title": f"Profil: {metadata.get('path', name)}",
+        "profile": metadata,
+        "rows": rows[: PROFILING.get("TOP_FUNCTIONS", 50)],
+    }
+    return render(request, "admin/shop/profile_detail.html", context)
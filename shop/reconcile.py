@@ -0,0 +1,142 @@
+# shop/reconcile.py
+"""
+Ombor qoldig'ini (Product.quantity) kirim va sotuvlar tarixi bilan
+solishtirish.
+
+Kutilgan qoldiq = jami kirim - bekor qilinmagan sotuvlar (joriy + arxiv).
+Har bir do'kon uchun uchta GROUP BY so'rovi va mahsulotlar bo'yicha bitta
+o'tish - mahsulotlar soniga qarab so'rovlar soni oshmaydi. So'rovlar bitta
+tranzaksiyada (WAL da bitta snapshot) - orada yozilgan sotuv yig'indida
+bor-u qoldiqda yo'q bo'lib, soxta farq chiqmaydi. Tuzatish tekshiruvni
+yozish qulfi ostida qaytadan bajaradi va faqat qoldig'i tekshiruvdagidek
+qolgan mahsulotlarni yozadi.
+"""
+import operator
+from functools import reduce
+
+from django.db import transaction
+from django.db.models import Case, IntegerField, Q, Sum, Value, When
+from django.utils import timezone
+
+from . import cache as shop_cache
+from . import sharding
+from .models import Product, ProductIncome, Sale, SaleMonthlySummary
+from .watermarks import touch_shop
+
+
+def _sums(queryset, field):
+    rows = queryset.values("product_id").annotate(total=Sum(field)).order_by()
+    return {row["product_id"]: row["total"] or 0 for row in rows}
+
+
+def audit_shop(shop_id, product_ids=None):
+    """
+    Do'kon mahsulotlari (yoki faqat product_ids) ichida qoldig'i mos
+    kelmaydiganlari.
+    [{"product_id", "name", "quantity", "expected", "income", "sold",
+      "archived_sold"}, ...]
+    """
+    scope = {} if product_ids is None else {"product_id__in": product_ids}
+    with sharding.use_shop(shop_id), transaction.atomic(using=sharding.shard_for(shop_id)):
+        income = _sums(
+            ProductIncome.objects.filter(product__shop_id=shop_id, **scope), "quantity"
+        )
+        sold = _sums(
+            Sale.objects.filter(shop_id=shop_id, is_cancelled=False, **scope), "quantity"
+        )
+        archived = _sums(
+            SaleMonthlySummary.objects.filter(shop_id=shop_id, **scope), "sold_quantity"
+        )
+        products = Product.objects.filter(shop_id=shop_id)
+        if product_ids is not None:
+            products = products.filter(pk__in=product_ids)
+        products = list(products.order_by("id").values_list("id", "name", "quantity"))
+
+    mismatches = []
+    for product_id, name, quantity in products:
+        expected = (
+            income.get(product_id, 0)
+            - sold.get(product_id, 0)
+            - archived.get(product_id, 0)
+        )
+        if quantity != expected:
+            mismatches.append(
+                {
+                    "product_id": product_id,
+                    "name": name,
+                    "quantity": quantity,
+                    "expected": expected,
+                    "income": income.get(product_id, 0),
+                    "sold": sold.get(product_id, 0),
+                    "archived_sold": archived.get(product_id, 0),
+                }
+            )
+    return mismatches
+
+
+def stock_history(product_id, limit=5):
+    """
+    Mahsulotning oxirgi kirim va sotuvlari (vaqt bo'yicha, yangisi birinchi).
+    Bekor qilingan sotuv ikki qator: sotuv (-n) va uning bekor qilinishi
+    (+n) - yig'indisi omborga ta'sirini ko'rsatadi.
+    """
+    incomes = [
+        (created_at, "kirim", quantity)
+        for created_at, quantity in ProductIncome.objects.filter(product_id=product_id)
+        .order_by("-created_at")
+        .values_list("created_at", "quantity")[:limit]
+    ]
+    sales = Sale.objects.filter(product_id=product_id).order_by("-created_at")
+    lines = []
+    for created_at, quantity, is_cancelled, cancelled_at, restored_at in sales.values_list(
+        "created_at", "quantity", "is_cancelled", "cancelled_at", "restored_at"
+    )[:limit]:
+        lines.append((created_at, "sotuv", -quantity))
+        # Eski sotuvlarda cancelled_at bo'lmasligi mumkin
+        if is_cancelled:
+            lines.append((cancelled_at or created_at, "bekor", quantity))
+        elif restored_at is not None:
+            lines.append((cancelled_at or restored_at, "bekor", quantity))
+            lines.append((restored_at, "tiklash", -quantity))
+    # Bir vaqtli qatorlarda sotuv o'zidan keyingi bekor qilishdan pastda
+    return sorted(
+        incomes + lines, key=lambda line: (line[0], line[1] != "sotuv"), reverse=True
+    )[:limit]
+
+
+def repair_stock(shop_id, mismatches):
+    """
+    Farqlarni bitta shartli UPDATE bilan tuzatish. mismatches (audit_shop)
+    faqat qaysi mahsulotlarni tekshirishni bildiradi: tekshiruv yozish
+    qulfi ostida qaytadan bajariladi, qoldiq esa faqat o'sha tekshiruvdagi
+    qiymatda qolgan bo'lsa yoziladi (WHERE quantity = ...).
+    """
+    if not mismatches:
+        return 0
+
+    product_ids = sorted({item["product_id"] for item in mismatches})
+    alias = sharding.shard_for(shop_id)
+    with sharding.use_shop(shop_id), transaction.atomic(using=alias):
+        # update() signal yubormaydi. Birinchi yozuv - SQLite yozish qulfini
+        # shu yerda oladi, tekshiruvdan keyin boshqa sotuv yozilmaydi
+        touch_shop(shop_id, catalog=True)
+        current = audit_shop(shop_id, product_ids)
+        if not current:
+            return 0
+
+        unchanged = reduce(
+            operator.or_,
+            (Q(pk=item["product_id"], quantity=item["quantity"]) for item in current),
+        )
+        updated = Product.objects.filter(unchanged).update(
+            quantity=Case(
+                *(When(pk=item["product_id"], then=Value(item["expected"])) for item in current),
+                output_field=IntegerField(),
+            ),
+            updated_at=timezone.now(),
+        )
+        transaction.on_commit(
+            lambda: [shop_cache.bump_product(item["product_id"]) for item in current],
+            using=alias,
+        )
+    return updated
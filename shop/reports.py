@@ -0,0 +1,289 @@
+# shop/reports.py
+"""
+Egasining barcha do'konlari bo'yicha umumiy hisobot.
+
+Har bir ko'rsatkich guruhi (ombor, sotuvlar, arxiv, top mahsulotlar) barcha
+do'konlar uchun bitta GROUP BY so'rovida olinadi - do'konlar soniga qarab
+so'rovlar soni oshmaydi. Do'konlar turli bazalarda bo'lsa (sharding.py)
+so'rovlar har bir baza uchun alohida.
+"""
+import hashlib
+import heapq
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import (
+    Count,
+    DecimalField,
+    ExpressionWrapper,
+    F,
+    Min,
+    Q,
+    Sum,
+    Window,
+)
+from django.db.models.functions import RowNumber
+
+from . import cache as shop_cache
+from . import sharding
+from .models import (
+    Product,
+    Sale,
+    SaleArchive,
+    SaleArchiveState,
+    SaleMonthlySummary,
+    Shop,
+)
+
+TOP_PRODUCTS = 5
+
+SALE_TOTALS = {
+    "sales_count": Count("id", filter=Q(is_cancelled=False)),
+    "sold_quantity": Sum("quantity", filter=Q(is_cancelled=False)),
+    "revenue": Sum("total_amount", filter=Q(is_cancelled=False)),
+    "cancelled_count": Count("id", filter=Q(is_cancelled=True)),
+    "cancelled_amount": Sum("total_amount", filter=Q(is_cancelled=True)),
+}
+
+
+def _range_filters(start, end):
+    filters = {}
+    if start is not None:
+        filters["created_at__gte"] = start
+    if end is not None:
+        filters["created_at__lt"] = end
+    return filters
+
+
+def _add_totals(target, row):
+    for name in SALE_TOTALS:
+        target[name] += row[name] or 0
+
+
+def _stock_by_shop(shop_ids):
+    rows = (
+        Product.objects.filter(shop_id__in=shop_ids)
+        .values("shop_id")
+        .annotate(
+            products_count=Count("id"),
+            stock_quantity=Sum("quantity"),
+            stock_value=Sum(
+                ExpressionWrapper(
+                    F("price") * F("quantity"),
+                    output_field=DecimalField(max_digits=20, decimal_places=2),
+                )
+            ),
+        )
+        .order_by()
+    )
+    return {row["shop_id"]: row for row in rows}
+
+
+def _sales_by_shop(shop_ids, start, end, include_archive):
+    totals = defaultdict(lambda: defaultdict(Decimal))
+    ranged = start is not None or end is not None
+
+    rows = (
+        Sale.objects.filter(shop_id__in=shop_ids, **_range_filters(start, end))
+        .values("shop_id")
+        .annotate(**SALE_TOTALS)
+        .order_by()
+    )
+    for row in rows:
+        _add_totals(totals[row["shop_id"]], row)
+
+    if include_archive:
+        if ranged:
+            # Oraliq oy chegarasiga to'g'ri kelmasligi mumkin - arxivning o'zidan
+            rows = (
+                SaleArchive.objects.filter(
+                    shop_id__in=shop_ids, **_range_filters(start, end)
+                )
+                .values("shop_id")
+                .annotate(**SALE_TOTALS)
+                .order_by()
+            )
+        else:
+            rows = (
+                SaleMonthlySummary.objects.filter(shop_id__in=shop_ids)
+                .values("shop_id")
+                .annotate(
+                    sales_count=Sum("sales_count"),
+                    sold_quantity=Sum("sold_quantity"),
+                    revenue=Sum("revenue"),
+                    cancelled_count=Sum("cancelled_count"),
+                    cancelled_amount=Sum("cancelled_amount"),
+                )
+                .order_by()
+            )
+        for row in rows:
+            _add_totals(totals[row["shop_id"]], row)
+
+    return totals
+
+
+def _top_products_lifetime(shop_ids, limit):
+    """Butun davr uchun: mahsulot hisoblagichlari bo'yicha (oyna funksiyasi bilan)"""
+    rows = (
+        Product.objects.filter(shop_id__in=shop_ids, sold_qty__gt=0)
+        .annotate(
+            rank=Window(
+                RowNumber(),
+                partition_by=F("shop_id"),
+                order_by=[F("revenue").desc(), F("id").asc()],
+            )
+        )
+        .filter(rank__lte=limit)
+        .values("shop_id", "id", "name", "sold_qty", "revenue")
+        .order_by("shop_id", "rank")
+    )
+
+    top = defaultdict(list)
+    for row in rows:
+        top[row["shop_id"]].append(
+            {
+                "id": row["id"],
+                "name": row["name"],
+                "sold_quantity": row["sold_qty"],
+                "revenue": row["revenue"],
+            }
+        )
+    return top
+
+
+def _top_products_in_range(shop_ids, start, end, include_archive, limit):
+    """Oraliq uchun: (do'kon, mahsulot) bo'yicha guruhlab, har do'kondan top N"""
+    per_product = {}
+    models = [Sale, SaleArchive] if include_archive else [Sale]
+
+    for model in models:
+        rows = (
+            model.objects.filter(
+                shop_id__in=shop_ids, is_cancelled=False, **_range_filters(start, end)
+            )
+            .values("shop_id", "product_id")
+            .annotate(
+                name=Min("product__name"),
+                sold_quantity=Sum("quantity"),
+                revenue=Sum("total_amount"),
+            )
+            .order_by()
+        )
+        for row in rows:
+            key = (row["shop_id"], row["product_id"])
+            item = per_product.get(key)
+            if item is None:
+                per_product[key] = {
+                    "id": row["product_id"],
+                    "name": row["name"],
+                    "sold_quantity": row["sold_quantity"],
+                    "revenue": row["revenue"],
+                }
+            else:
+                item["sold_quantity"] += row["sold_quantity"]
+                item["revenue"] += row["revenue"]
+
+    by_shop = defaultdict(list)
+    for (shop_id, _product_id), item in per_product.items():
+        by_shop[shop_id].append(item)
+
+    return {
+        shop_id: heapq.nlargest(
+            limit, items, key=lambda item: (item["revenue"], -item["id"])
+        )
+        for shop_id, items in by_shop.items()
+    }
+
+
+def compute_owner_report(owner_id, start=None, end=None, limit=TOP_PRODUCTS):
+    shops = list(
+        Shop.objects.filter(owner_id=owner_id, is_active=True)
+        .order_by("name")
+        .values("id", "name")
+    )
+    shop_ids = [shop["id"] for shop in shops]
+
+    # Arxiv faqat oraliq arxivlangan davrga tushsa o'qiladi
+    archive_boundary = (
+        SaleArchiveState.objects.filter(shop_id__in=shop_ids)
+        .order_by("-archived_before")
+        .values_list("archived_before", flat=True)
+        .first()
+    )
+    include_archive = archive_boundary is not None and (
+        start is None or start < archive_boundary
+    )
+
+    stock, sales, top = {}, {}, {}
+    for alias, ids in sharding.group_by_shard(shop_ids).items():
+        with sharding.using(alias):
+            stock.update(_stock_by_shop(ids))
+            sales.update(_sales_by_shop(ids, start, end, include_archive))
+            if start is None and end is None:
+                top.update(_top_products_lifetime(ids, limit))
+            else:
+                top.update(_top_products_in_range(ids, start, end, include_archive, limit))
+
+    totals = defaultdict(Decimal)
+    rows = []
+    for shop in shops:
+        shop_stock = stock.get(shop["id"], {})
+        shop_sales = sales.get(shop["id"], {})
+        row = {
+            "id": shop["id"],
+            "name": shop["name"],
+            "products_count": shop_stock.get("products_count", 0),
+            "stock_quantity": shop_stock.get("stock_quantity") or 0,
+            "stock_value": shop_stock.get("stock_value") or Decimal("0.00"),
+            "sales_count": int(shop_sales.get("sales_count", 0)),
+            "sold_quantity": int(shop_sales.get("sold_quantity", 0)),
+            "revenue": shop_sales.get("revenue", Decimal("0.00")),
+            "cancelled_count": int(shop_sales.get("cancelled_count", 0)),
+            "cancelled_amount": shop_sales.get("cancelled_amount", Decimal("0.00")),
+            "top_products": top.get(shop["id"], []),
+        }
+        row["net_revenue"] = row["revenue"] - row["cancelled_amount"]
+        rows.append(row)
+
+        for name in (
+            "products_count",
+            "stock_value",
+            "sales_count",
+            "revenue",
+            "cancelled_count",
+            "cancelled_amount",
+            "net_revenue",
+        ):
+            totals[name] += row[name]
+
+    for name in ("products_count", "sales_count", "cancelled_count"):
+        totals[name] = int(totals[name])
+
+    return {
+        "shops": rows,
+        "totals": dict(totals),
+        "date_from": start.isoformat() if start else None,
+        "date_to": end.isoformat() if end else None,
+    }
+
+
+def get_owner_report(owner_id, start=None, end=None):
+    """Hisobot - egasining barcha do'konlari versiyalari bo'yicha keshlangan"""
+    shop_ids = list(
+        Shop.objects.filter(owner_id=owner_id, is_active=True)
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+    pairs = []
+    for shop_id in shop_ids:
+        pairs += [(shop_cache.SHOP_CATALOG, shop_id), (shop_cache.SHOP_SALES, shop_id)]
+    versions = shop_cache.get_versions(*pairs) if pairs else []
+
+    digest = hashlib.md5(
+        "|".join(map(str, shop_ids + versions)).encode(), usedforsecurity=False
+    ).hexdigest()
+    period = f"{start and start.date()}:{end and end.date()}"
+    key = f"owner:report:{owner_id}:{period}:{digest}"
+    return shop_cache.get_or_compute(
+        key, lambda: compute_owner_report(owner_id, start, end)
+    )
@@ -0,0 +1,599 @@
+# shop/sharding.py
+"""
+Do'konlar bo'yicha bazalarni bo'lish (sharding).
+
+Do'kon ma'lumotlari (xodimlar, mahsulotlar, kirimlar, sotuvlar va arxiv -
+ShardedModel lar) Shop.shard da ko'rsatilgan bazada, umumiy jadvallar
+(foydalanuvchilar, do'konlar, arizalar, tokenlar, bot) esa "default" da.
+Bitta do'konning yozishlari faqat o'z bazasini qulflaydi - SQLite da yozish
+o'tkazuvchanligi bazalar soniga qarab oshadi.
+
+Django routeri filter() argumentlarini ko'rmaydi, shuning uchun joriy baza
+kontekstda saqlanadi: so'rovda ShardMiddleware URL dagi shop_id/product_id/
+sale_id bo'yicha o'rnatadi, buyruqlar va fon ishlari - use_shop(). Bazadan
+o'qilgan obyektning bog'lanishlari o'z bazasiga boradi. Kontekstsiz so'rov
+"default" ga tushadi (admin faqat shu bazadagi do'konlarni ko'radi).
+
+Bazalar orasida JOIN yo'q, shuning uchun:
+- do'kon qatori o'z bazasiga ham yoziladi (nusxa): shop__owner kabi
+  bog'lanishlar shu bazada ishlaydi, har sotuvda yoziladigan o'zgarish
+  belgilari (watermarks.py) esa faqat nusxada yangilanadi;
+- ProductCategory barcha bazalarga nusxalanadi (fasetlar GROUP BY si);
+- foydalanuvchilarga select_related() o'rniga prefetch (shu moduldagi
+  select_related());
+- id lar barcha bazalarda yagona - "default" dagi IdSequence bloklaridan
+  (allocate_ids), do'kon ko'chirilganda id lar o'zgarmaydi. Do'kon bazalarida
+  tashqi kalit tekshiruvi o'chirilgan (settings.py).
+
+SHOP_SHARDS["ALIASES"] da bitta baza bo'lsa (standart) hech narsa
+o'zgarmaydi: router fikr bildirmaydi, qo'shimcha so'rov yo'q.
+Do'konni boshqa bazaga ko'chirish: manage.py rebalance_shards.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, transaction
+from django.db.models import Count, F, Max
+
+from . import cache as shop_cache
+from . import metrics
+from .models import (
+    IdSequence,
+    Product,
+    ProductCategory,
+    ProductIncome,
+    Sale,
+    SaleArchive,
+    SaleMonthlySummary,
+    ShardedModel,
+    Shop,
+    ShopStaff,
+)
+
+logger = logging.getLogger(__name__)
+
+SHARDS = getattr(settings, "SHOP_SHARDS", {})
+
+DEFAULT = DEFAULT_DB_ALIAS
+ALIASES = [
+    alias for alias in SHARDS.get("ALIASES", [DEFAULT]) if alias in settings.DATABASES
+] or [DEFAULT]
+ENABLED = len(ALIASES) > 1
+
+# Do'kon bazasida JOIN qilsa bo'ladigan umumiy modellar (nusxalari bor)
+REPLICATED = (Shop, ProductCategory)
+
+# Ko'chirish tartibi (ota jadval birinchi): model -> do'kon bo'yicha filtr
+SHOP_ROWS = (
+    (ShopStaff, "shop_id"),
+    (Product, "shop_id"),
+    (ProductIncome, "product__shop_id"),
+    (Sale, "shop_id"),
+    (SaleArchive, "shop_id"),
+    (SaleMonthlySummary, "shop_id"),
+)
+
+# Sotuv id si arxivda ham saqlanadi - yangi id ikkalasidan katta bo'lishi kerak
+ID_SOURCES = {Sale: (Sale, SaleArchive)}
+
+# (shop_id yoki None, baza)
+_current = ContextVar("shop_shard", default=None)
+
+# model -> [keyingi id, blok oxiri]; har bir jarayonda alohida
+_blocks = {}
+_blocks_lock = threading.Lock()
+
+
+def enabled():
+    return ENABLED
+
+
+def aliases():
+    return list(ALIASES)
+
+
+def is_sharded(model):
+    return issubclass(model, ShardedModel)
+
+
+@contextmanager
+def using(alias, shop_id=None):
+    """Blok ichidagi do'kon so'rovlari shu bazaga"""
+    token = _current.set((shop_id, alias))
+    try:
+        yield alias
+    finally:
+        _current.reset(token)
+
+
+def use_shop(shop):
+    """Do'kon (obyekt yoki id) bazasini joriy qilish"""
+    shop_id = shop.pk if isinstance(shop, Shop) else shop
+    return using(shard_for(shop), shop_id)
+
+
+def current():
+    """Joriy baza (kontekst bo'lmasa "default")"""
+    context = _current.get()
+    return context[1] if context else DEFAULT
+
+
+def shard_for(shop):
+    """Do'kon ma'lumotlari bazasi. Joriy kontekstdagi do'kon uchun so'rovsiz"""
+    if not ENABLED or shop is None:
+        return DEFAULT
+    if isinstance(shop, Shop):
+        return shop.shard
+    context = _current.get()
+    if context and context[0] == shop:
+        return context[1]
+    return (
+        Shop.objects.using(DEFAULT).filter(pk=shop).values_list("shard", flat=True).first()
+        or DEFAULT
+    )
+
+
+def group_by_shard(shop_ids):
+    """{baza: [shop_id, ...]} - hisobotlar har bir bazada alohida so'rov qiladi"""
+    if not ENABLED:
+        return {DEFAULT: list(shop_ids)} if shop_ids else {}
+    groups = {}
+    rows = Shop.objects.using(DEFAULT).filter(pk__in=shop_ids).values_list("id", "shard")
+    for shop_id, alias in rows:
+        groups.setdefault(alias, []).append(shop_id)
+    return groups
+
+
+def _find_shop_id(model, pk):
+    # Mahsulot va sotuv do'koni o'zgarmaydi - natija muddatsiz keshlanadi
+    key = f"shard:owner:{model._meta.model_name}:{pk}"
+    cache = shop_cache.get_cache()
+    shop_id = cache.get(key)
+    if shop_id is None:
+        for alias in ALIASES:
+            shop_id = (
+                model.objects.using(alias)
+                .filter(pk=pk)
+                .values_list("shop_id", flat=True)
+                .first()
+            )
+            if shop_id is not None:
+                cache.set(key, shop_id, None)
+                break
+    return shop_id
+
+
+def locate(shop_id=None, product_id=None, sale_id=None, **kwargs):
+    """
+    URL argumentlari bo'yicha do'kon: (shop_id, baza, ko'chirilmoqda) yoki None.
+    """
+    if shop_id is None:
+        if product_id is not None:
+            shop_id = _find_shop_id(Product, product_id)
+        elif sale_id is not None:
+            shop_id = _find_shop_id(Sale, sale_id)
+    if shop_id is None:
+        return None
+
+    row = (
+        Shop.objects.using(DEFAULT)
+        .filter(pk=shop_id)
+        .values_list("shard", "is_moving")
+        .first()
+    )
+    return (shop_id, *row) if row else None
+
+
+def staff_shop_ids(user_id):
+    """Foydalanuvchi xodim bo'lgan do'konlar (barcha bazalardan)"""
+    shop_ids = set()
+    for alias in ALIASES:
+        shop_ids.update(
+            ShopStaff.objects.using(alias)
+            .filter(user_id=user_id)
+            .values_list("shop_id", flat=True)
+        )
+    return shop_ids
+
+
+def select_related(queryset, *fields):
+    """
+    select_related() - do'kon bazasida JOIN qilib bo'lmaydigan umumiy
+    modellar (foydalanuvchilar) alohida so'rov bilan (prefetch) olinadi.
+    """
+    if not ENABLED or queryset.db == DEFAULT:
+        return queryset.select_related(*fields)
+
+    joined, prefetched = [], []
+    for name in fields:
+        related = queryset.model._meta.get_field(name).related_model
+        if is_sharded(related) or related in REPLICATED:
+            joined.append(name)
+        else:
+            prefetched.append(name)
+    if joined:
+        # Argumentsiz select_related() barcha bog'lanishlarni JOIN qiladi
+        queryset = queryset.select_related(*joined)
+    return queryset.prefetch_related(*prefetched)
+
+
+def pick_shard():
+    """Yangi do'kon uchun baza - do'konlari eng kam bo'lgani"""
+    counts = dict(
+        Shop.objects.using(DEFAULT)
+        .values_list("shard")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    return min(ALIASES, key=lambda alias: counts.get(alias, 0))
+
+
+class ShopRouter:
+    """
+    Do'kon modellari (ShardedModel) - do'kon bazasiga, qolganlari "default"
+    ga. Bitta baza bo'lsa hech qanday fikr bildirmaydi.
+    """
+
+    def _route(self, model, hints):
+        if not ENABLED:
+            return None
+        if not is_sharded(model):
+            # Aks holda Django bog'langan obyekt bazasini oladi (do'kon bazasidagi
+            # sotuvning kassiri ham o'sha bazadan qidirilardi)
+            return DEFAULT
+
+        instance = hints.get("instance")
+        if isinstance(instance, Shop):
+            return instance.shard
+        if instance is not None and is_sharded(type(instance)):
+            if instance._state.db is not None:
+                return instance._state.db
+            if _current.get() is None and getattr(instance, "shop_id", None):
+                return shard_for(instance.shop_id)
+        return current()
+
+    def db_for_read(self, model, **hints):
+        return self._route(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._route(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if ENABLED and (is_sharded(type(obj1)) or is_sharded(type(obj2))):
+            return True
+        return None
+
+
+def _reserve(model, size):
+    """IdSequence dan yangi blok: [boshi, boshi + size)"""
+    name = model._meta.label_lower
+    sequences = IdSequence.objects.using(DEFAULT)
+    while True:
+        try:
+            with transaction.atomic(using=DEFAULT):
+                if sequences.filter(name=name).update(next_id=F("next_id") + size):
+                    return sequences.filter(name=name).values_list("next_id", flat=True).get() - size
+
+                # Birinchi blok: barcha bazalardagi eng katta id dan keyin
+                start = 1 + max(
+                    source.objects.using(alias).aggregate(top=Max("pk"))["top"] or 0
+                    for source in ID_SOURCES.get(model, (model,))
+                    for alias in ALIASES
+                )
+                sequences.create(name=name, next_id=start + size)
+                return start
+        except IntegrityError:
+            # Boshqa jarayon birinchi blokni shu paytda yaratdi
+            continue
+
+
+def allocate_ids(model, count=1):
+    """
+    Yangi qatorlar uchun id lar. Bloklar SHOP_SHARDS["ID_BLOCK"] tadan -
+    "default" ga har bir yozuv uchun emas, blok tugaganda murojaat qilinadi
+    ("default" dagi tranzaksiya ichida - faqat kerakli sonini, keshlamasdan).
+    Bitta baza bo'lsa [] (baza o'zi beradi).
+    """
+    if not ENABLED:
+        return []
+
+    label = model._meta.label_lower
+    # "default" dagi tranzaksiya ichida olingan blok u bilan birga bekor
+    # qilinishi mumkin - keshlansa, boshqa jarayon shu id larni yana oladi
+    in_transaction = connections[DEFAULT].in_atomic_block
+    ids = []
+    with _blocks_lock:
+        block = _blocks.get(label)
+        while len(ids) < count:
+            if block is None or block[0] >= block[1]:
+                if in_transaction:
+                    missing = count - len(ids)
+                    start = _reserve(model, missing)
+                    ids.extend(range(start, start + missing))
+                    break
+                size = max(SHARDS.get("ID_BLOCK", 100), count - len(ids))
+                start = _reserve(model, size)
+                block = _blocks[label] = [start, start + size]
+            taken = min(count - len(ids), block[1] - block[0])
+            ids.extend(range(block[0], block[0] + taken))
+            block[0] += taken
+    return ids
+
+
+def assign_ids(objs):
+    """bulk_create dan oldin (save() chaqirilmaydi)"""
+    objs = [obj for obj in objs if obj.pk is None]
+    if objs:
+        for obj, pk in zip(objs, allocate_ids(type(objs[0]), len(objs))):
+            obj.pk = pk
+
+
+def _insert_rows(alias, model, fields, rows):
+    """Qiymatlarni o'zgartirmasdan yozish (auto_now maydonlari ham)"""
+    connection = connections[alias]
+    quote = connection.ops.quote_name
+    sql = "INSERT INTO {} ({}) VALUES ({})".format(
+        quote(model._meta.db_table),
+        ", ".join(quote(field.column) for field in fields),
+        ", ".join(["%s"] * len(fields)),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            sql,
+            [
+                [field.get_db_prep_save(value, connection) for field, value in zip(fields, row)]
+                for row in rows
+            ],
+        )
+
+
+def delete_rows(alias, model, lookup, value):
+    """
+    Signalsiz o'chirish - QuerySet.delete() har bir qator uchun signal
+    yuboradi (kesh, belgilar). O'chirilgan qatorlar soni qaytariladi.
+    """
+    connection = connections[alias]
+    query = model.objects.using(alias).filter(**{lookup: value}).values("pk")
+    sql, params = query.query.get_compiler(alias).as_sql()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM {} WHERE {} IN ({})".format(
+                connection.ops.quote_name(model._meta.db_table),
+                connection.ops.quote_name(model._meta.pk.column),
+                sql,
+            ),
+            params,
+        )
+        return cursor.rowcount
+
+
+def replicate_shop(shop_id, target, source=DEFAULT, watermarks=False, **overrides):
+    """
+    Do'kon qatorini target bazaga yozish (bor bo'lsa yangilash).
+    Belgilar nusxada yangilanadi, shuning uchun mavjud nusxaga faqat
+    ko'chirishda (watermarks=True) yoziladi.
+    """
+    fields = [field for field in Shop._meta.concrete_fields if not field.primary_key]
+    values = (
+        Shop.objects.using(source)
+        .filter(pk=shop_id)
+        .values(*[field.attname for field in fields])
+        .first()
+    )
+    if values is None or target == source:
+        return
+    values.update(overrides)
+
+    update = {
+        name: value
+        for name, value in values.items()
+        if watermarks or name not in Shop.WATERMARK_FIELDS
+    }
+    if not Shop.objects.using(target).filter(pk=shop_id).update(**update):
+        _insert_rows(
+            target,
+            Shop,
+            [Shop._meta.pk, *fields],
+            [[shop_id, *(values[field.attname] for field in fields)]],
+        )
+
+
+def sync_categories(alias, category_ids=None):
+    """ProductCategory ni do'kon bazasiga nusxalash (id lar bir xil)"""
+    if alias == DEFAULT:
+        return
+    fields = ProductCategory._meta.concrete_fields
+    names = [field.attname for field in fields]
+    categories = ProductCategory.objects.using(DEFAULT)
+    if category_ids is not None:
+        categories = categories.filter(pk__in=category_ids)
+    rows = list(categories.values_list(*names))
+
+    replicas = ProductCategory.objects.using(alias)
+    existing = set(replicas.filter(pk__in=[row[0] for row in rows]).values_list("pk", flat=True))
+    with transaction.atomic(using=alias):
+        # delete() + qayta yozish mahsulotlardagi kategoriyani NULL qilardi
+        for row in rows:
+            if row[0] in existing:
+                replicas.filter(pk=row[0]).update(**dict(zip(names[1:], row[1:])))
+        _insert_rows(
+            alias, ProductCategory, fields, [row for row in rows if row[0] not in existing]
+        )
+
+
+def purge_shop(shop_id, alias):
+    """Do'kon ma'lumotlarini (va nusxasini) bazadan o'chirish"""
+    deleted = 0
+    with transaction.atomic(using=alias):
+        for model, lookup in reversed(SHOP_ROWS):
+            deleted += delete_rows(alias, model, lookup, shop_id)
+        if alias != DEFAULT:
+            delete_rows(alias, Shop, "pk", shop_id)
+    return deleted
+
+
+def copy_shop(shop_id, source, target, batch_size=2000):
+    """Do'kon qatorlarini id lari bilan ko'chirish; {model nomi: soni}"""
+    copied = {}
+    with transaction.atomic(using=target):
+        # To'xtatilgan oldingi urinish qoldiqlari
+        purge_shop(shop_id, target)
+        replicate_shop(
+            shop_id, target, source=source, watermarks=True, shard=target, is_moving=False
+        )
+
+        for model, lookup in SHOP_ROWS:
+            fields = model._meta.concrete_fields
+            rows = (
+                model.objects.using(source)
+                .filter(**{lookup: shop_id})
+                .order_by("pk")
+                .values_list(*[field.attname for field in fields])
+            )
+            batch = []
+            copied[model._meta.model_name] = 0
+            for row in rows.iterator(chunk_size=batch_size):
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    _insert_rows(target, model, fields, batch)
+                    copied[model._meta.model_name] += len(batch)
+                    batch = []
+            if batch:
+                _insert_rows(target, model, fields, batch)
+                copied[model._meta.model_name] += len(batch)
+    return copied
+
+
+class ShardMoveError(Exception):
+    """Ko'chirilgan nusxa manba bilan mos kelmadi - do'kon eski bazada qoladi"""
+
+
+def _fingerprint(alias, shop_id):
+    """{model nomi: (qatorlar soni, eng katta id)} - nusxani tekshirish uchun"""
+    return {
+        model._meta.model_name: tuple(
+            model.objects.using(alias)
+            .filter(**{lookup: shop_id})
+            .aggregate(count=Count("pk"), top=Max("pk"))
+            .values()
+        )
+        for model, lookup in SHOP_ROWS
+    }
+
+
+def _lock_for_writes(alias, shop_id):
+    """
+    Manba bazada yozish qulfi (tranzaksiya ichida chaqiriladi). SQLite da
+    birinchi yozuv butun bazani qulflaydi (BEGIN IMMEDIATE bilan bir xil):
+    boshlangan yozuvlar commit qilinguncha kutiladi, keyingilari esa shu
+    tranzaksiya tugaguncha kutadi yoki "database is locked" bilan yiqiladi.
+    """
+    Shop.objects.using(alias).filter(pk=shop_id).update(is_moving=True)
+
+
+def move_shop(shop_id, target, grace=None, batch_size=2000):
+    """
+    Do'konni boshqa bazaga ko'chirish:
+    1. is_moving - yozuvchi so'rovlar 503 oladi (ShardMiddleware), `grace`
+       soniya boshlangan so'rovlar tugashi kutiladi;
+    2. manba bazada yozish qulfi olinadi - buyruqlar, bot va belgidan oldin
+       o'tib ketgan so'rovlar ham endi yoza olmaydi;
+    3. qatorlar target ga bitta tranzaksiyada (id lar bilan) nusxalanadi va
+       har bir jadval soni va eng katta id si manba bilan solishtiriladi -
+       farq bo'lsa ShardMoveError, do'kon eski bazada qoladi;
+    4. Shop.shard almashtiriladi va eski bazadagi qatorlar o'chiriladi -
+       qulf shundan keyin bo'shatiladi.
+    Qulf ostida kutib qolgan yozuv ko'chirishdan keyin eski bazaga tushsa
+    (qatorlari o'chirilgan do'konga) u log ga yoziladi.
+    Xato bo'lsa do'kon eski bazada qoladi, qayta ishga tushirish mumkin.
+    """
+    if target not in ALIASES:
+        raise ValueError(f"Noma'lum baza: {target}")
+    source = shard_for(shop_id)
+    if source == target:
+        return {}
+
+    if grace is None:
+        grace = SHARDS.get("MOVE_GRACE", 5)
+    Shop.objects.using(DEFAULT).filter(pk=shop_id).update(is_moving=True)
+    try:
+        time.sleep(grace)
+        sync_categories(target)
+        with transaction.atomic(using=source):
+            _lock_for_writes(source, shop_id)
+            copied = copy_shop(shop_id, source, target, batch_size)
+
+            expected = _fingerprint(source, shop_id)
+            actual = _fingerprint(target, shop_id)
+            if actual != expected:
+                purge_shop(shop_id, target)
+                raise ShardMoveError(
+                    f"do'kon #{shop_id}: {target} dagi nusxa {source} bilan mos emas"
+                    f" ({actual} != {expected})"
+                )
+
+            # source "default" bo'lsa shu tranzaksiyaning o'zida
+            Shop.objects.using(DEFAULT).filter(pk=shop_id).update(
+                shard=target, is_moving=False
+            )
+            purge_shop(shop_id, source)
+    except BaseException:
+        Shop.objects.using(DEFAULT).filter(pk=shop_id).update(is_moving=False)
+        raise
+
+    late = {name: count for name, (count, _top) in _fingerprint(source, shop_id).items() if count}
+    if late:
+        logger.error(
+            "do'kon #%s: ko'chirishdan keyin %s da yozuvlar qoldi: %s", shop_id, source, late
+        )
+    shop_cache.bump_shop(shop_id, catalog=True, sales=True)
+    metrics.inc("shop_shard_moves_total", source=source, target=target)
+    return copied
+
+
+def shard_loads():
+    """{baza: {shop_id: hozirgi sotuvlar soni}} - rebalance rejasi uchun"""
+    loads = {alias: {} for alias in ALIASES}
+    for shop_id, alias in Shop.objects.using(DEFAULT).values_list("id", "shard"):
+        if alias in loads:
+            loads[alias][shop_id] = 0
+    for alias in ALIASES:
+        rows = (
+            Sale.objects.using(alias)
+            .values("shop_id")
+            .annotate(count=Count("id"))
+            .order_by()
+            .values_list("shop_id", "count")
+        )
+        for shop_id, count in rows:
+            if shop_id in loads[alias]:
+                loads[alias][shop_id] = count
+    return loads
+
+
+def plan_moves(loads):
+    """
+    Ochko'z reja: eng og'ir bazadan eng yengiliga, farqni kamaytiradigan
+    eng katta do'kon ko'chiriladi. [(shop_id, manba, nishon), ...]
+    """
+    loads = {alias: dict(shops) for alias, shops in loads.items()}
+    moves = []
+    while True:
+        totals = {alias: sum(shops.values()) for alias, shops in loads.items()}
+        heavy = max(totals, key=totals.get)
+        light = min(totals, key=totals.get)
+        gap = totals[heavy] - totals[light]
+        candidates = [
+            (count, shop_id)
+            for shop_id, count in loads[heavy].items()
+            if 0 < count < gap
+        ]
+        if not candidates:
+            return moves
+        count, shop_id = max(candidates)
+        loads[light][shop_id] = loads[heavy].pop(shop_id)
+        moves.append((shop_id, heavy, light))
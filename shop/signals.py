@@ -0,0 +1,106 @@
+# shop/signals.py
+"""Ma'lumot o'zgarganda kesh versiyalari va o'zgarish belgilarini yangilash"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import cache as shop_cache
+from . import events, sharding
+from .models import (
+    Product,
+    ProductCategory,
+    ProductIncome,
+    Sale,
+    Shop,
+    ShopApplication,
+    ShopStaff,
+    TelegramUser,
+)
+from .watermarks import touch_shop
+
+
+def _bump_product_on_commit(product_id, using):
+    """Kesh versiyasi commit dan keyin - touch_shop dagi sabab bilan"""
+    transaction.on_commit(lambda: shop_cache.bump_product(product_id), using=using)
+
+
+@receiver([post_save, post_delete], sender=Sale)
+def sale_changed(sender, instance, **kwargs):
+    touch_shop(instance.shop_id, sales=True)
+    _bump_product_on_commit(instance.product_id, kwargs["using"])
+
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, instance, **kwargs):
+    touch_shop(instance.shop_id, catalog=True)
+    _bump_product_on_commit(instance.pk, kwargs["using"])
+    events.publish(instance.shop_id, "product", [instance.pk])
+
+
+@receiver([post_save, post_delete], sender=ProductIncome)
+def income_changed(sender, instance, **kwargs):
+    _bump_product_on_commit(instance.product_id, kwargs["using"])
+
+
+@receiver([post_save, post_delete], sender=Shop)
+def shop_changed(sender, instance, **kwargs):
+    if sharding.enabled() and instance.shard != sharding.DEFAULT:
+        if kwargs["signal"] is post_save:
+            # Do'kon bazasidagi nusxa (JOIN lar va belgilar uchun)
+            sharding.replicate_shop(instance.pk, instance.shard)
+        else:
+            # CASCADE faqat "default" dagi qatorlarni ko'radi
+            sharding.purge_shop(instance.pk, instance.shard)
+
+    # Do'kon kartasi (nomi, rasmi) katalog versiyasiga bog'langan
+    touch_shop(instance.pk, catalog=True)
+
+
+@receiver([post_save, post_delete], sender=ShopStaff)
+def staff_changed(sender, instance, **kwargs):
+    touch_shop(instance.shop_id, catalog=True)
+
+
+@receiver([post_save, pre_delete], sender=ProductCategory)
+def category_touched(sender, instance, **kwargs):
+    """
+    Kategoriya do'konga bog'lanmagan (shop_id yo'q) - nomi fasetlarda
+    ko'rinadigan do'konlar katalogi yangilanadi. O'chirishda oldindan:
+    SET_NULL dan keyin mahsulotlar kategoriyasi topilmaydi.
+    """
+    if kwargs["using"] != sharding.DEFAULT:
+        return  # do'kon bazasidagi nusxa (category_changed)
+    for alias in sharding.aliases():
+        shop_ids = (
+            Product.objects.using(alias)
+            .filter(category_id=instance.pk)
+            .values_list("shop_id", flat=True)
+            .order_by()
+            .distinct()
+        )
+        for shop_id in shop_ids:
+            with sharding.using(alias, shop_id):
+                touch_shop(shop_id, catalog=True)
+
+
+@receiver([post_save, post_delete], sender=ProductCategory)
+def category_changed(sender, instance, **kwargs):
+    # Fasetlar kategoriya nomini do'kon bazasida JOIN bilan oladi
+    if not sharding.enabled() or kwargs["using"] != sharding.DEFAULT:
+        return
+    for alias in sharding.aliases():
+        if alias == sharding.DEFAULT:
+            continue
+        if kwargs["signal"] is post_save:
+            sharding.sync_categories(alias, [instance.pk])
+        else:
+            ProductCategory.objects.using(alias).filter(pk=instance.pk).delete()
+
+
+@receiver([post_save, post_delete], sender=TelegramUser)
+@receiver([post_save, post_delete], sender=ShopApplication)
+def bot_data_changed(sender, instance, **kwargs):
+    # bot_status hisoblagichlari (stats.get_bot_counts)
+    transaction.on_commit(
+        lambda: shop_cache.bump_version(shop_cache.BOT, "status"), using=kwargs["using"]
+    )
@@ -0,0 +1,94 @@
+# shop/stats.py
+"""Do'kon statistikasi (keshlangan)"""
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+
+from . import cache as shop_cache
+from .archive import archived_totals
+from .models import Product, Sale, ShopApplication, TelegramUser
+
+BOT_COUNTS_TIMEOUT = shop_cache.SHOP_CACHE.get("BOT_COUNTS_TIMEOUT", 60)
+
+
+def compute_shop_stats(shop_id):
+    """Do'kon statistikasi: mahsulotlar, joriy sotuvlar va arxiv yig'indilari"""
+    products = Product.objects.filter(shop_id=shop_id).aggregate(
+        products_count=Count("id"),
+        products_quantity=Sum("quantity"),
+        remaining_value=Sum(
+            ExpressionWrapper(
+                F("price") * F("quantity"),
+                output_field=DecimalField(max_digits=20, decimal_places=2),
+            )
+        ),
+    )
+
+    sales = Sale.objects.filter(shop_id=shop_id).aggregate(
+        total_sales=Sum("total_amount", filter=Q(is_cancelled=False)),
+        total_sales_quantity=Sum("quantity", filter=Q(is_cancelled=False)),
+        total_cancelled=Sum("total_amount", filter=Q(is_cancelled=True)),
+        cancelled_quantity=Sum("quantity", filter=Q(is_cancelled=True)),
+    )
+
+    archived = archived_totals(shop_id=shop_id)
+
+    total_sales = (sales["total_sales"] or Decimal("0.00")) + archived["revenue"]
+    total_cancelled = (
+        sales["total_cancelled"] or Decimal("0.00")
+    ) + archived["cancelled_amount"]
+
+    return {
+        "total_products_count": products["products_count"],
+        "total_products_quantity": products["products_quantity"] or 0,
+        "remaining_value": products["remaining_value"] or Decimal("0.00"),
+        "total_sales": total_sales,
+        "total_sales_quantity": (sales["total_sales_quantity"] or 0)
+        + archived["sold_quantity"],
+        "total_cancelled": total_cancelled,
+        "cancelled_quantity": (sales["cancelled_quantity"] or 0)
+        + archived["cancelled_quantity"],
+        "net_sales": total_sales - total_cancelled,
+    }
+
+
+def get_shop_stats_at(shop_id, marks):
+    """
+    Do'kon statistikasi - bazadagi belgilar (watermarks.shop_watermarks)
+    bo'yicha keshlangan. Kesh versiyasi boshqa worker dagi yozuvdan keyin
+    eskirgan bo'lishi mumkin, belgilar esa yozuv bilan bitta tranzaksiyada.
+    """
+    stamp = ":".join(mark.isoformat() if mark else "-" for mark in marks)
+    key = f"shop:stats:marks:{shop_id}:{stamp}"
+    return shop_cache.get_or_compute(key, lambda: compute_shop_stats(shop_id))
+
+
+def get_shop_stats(shop_id):
+    """Do'kon statistikasi - katalog va sotuv versiyasi bo'yicha keshlangan"""
+    catalog_version, sales_version = shop_cache.shop_versions(shop_id)
+    key = f"shop:stats:{shop_id}:{catalog_version}:{sales_version}"
+    return shop_cache.get_or_compute(key, lambda: compute_shop_stats(shop_id))
+
+
+def compute_bot_counts():
+    """Bot foydalanuvchilari va kutilayotgan arizalar soni"""
+    users = TelegramUser.objects.aggregate(
+        total_users=Count("id"),
+        active_users=Count("id", filter=Q(is_bot_active=True)),
+    )
+    return {
+        **users,
+        "pending_applications": ShopApplication.objects.filter(
+            status="pending"
+        ).count(),
+    }
+
+
+def get_bot_counts():
+    """
+    bot_status uchun hisoblagichlar - versiya bo'yicha keshlangan.
+    Bot alohida jarayonda yozsa (locmem) versiya bu yerga yetib kelmaydi,
+    shuning uchun muddat qisqa.
+    """
+    key = f"bot:counts:{shop_cache.get_version(shop_cache.BOT, 'status')}"
+    return shop_cache.get_or_compute(key, compute_bot_counts, timeout=BOT_COUNTS_TIMEOUT)
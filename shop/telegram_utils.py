@@ -1,9 +1,13 @@
 # shop/telegram_utils.py
+import logging
 import requests
 from django.conf import settings
 from asgiref.sync import sync_to_async
 import aiohttp
 import asyncio
+from . import metrics
+
+logger = logging.getLogger(__name__)
 
 
 def send_application_to_admin(application):
@@ -14,7 +18,7 @@ def send_application_to_admin(application):
     admin_chat_id = settings.TELEGRAM_ADMIN_CHAT_ID
 
     if not bot_token or not admin_chat_id:
-        print("Telegram bot sozlanmagan!")
+        logger.warning("Telegram bot sozlanmagan!")
         return False
 
     # Xabar matni
@@ -62,14 +66,17 @@ def send_application_to_admin(application):
         )
 
         if response.status_code == 200:
-            print(f"Ariza #{application.id} adminga yuborildi")
+            metrics.inc("shop_telegram_messages_total", result="success")
+            logger.info("Ariza #%s adminga yuborildi", application.id)
             return True
         else:
-            print(f"Xatolik: {response.status_code} - {response.text}")
+            metrics.inc("shop_telegram_messages_total", result="failure")
+            logger.error("Xatolik: %s - %s", response.status_code, response.text)
             return False
 
     except Exception as e:
-        print(f"Telegram xatolik: {e}")
+        metrics.inc("shop_telegram_messages_total", result="failure")
+        logger.error("Telegram xatolik: %s", e)
         return False
 
 
@@ -124,15 +131,18 @@ async def send_application_to_admin_async(application):
                 timeout=aiohttp.ClientTimeout(total=10),
             ) as response:
                 if response.status == 200:
-                    print(f"Ariza #{application.id} adminga yuborildi (async)")
+                    metrics.inc("shop_telegram_messages_total", result="success")
+                    logger.info("Ariza #%s adminga yuborildi (async)", application.id)
                     return True
                 else:
+                    metrics.inc("shop_telegram_messages_total", result="failure")
                     text = await response.text()
-                    print(f"Xatolik: {response.status} - {text}")
+                    logger.error("Xatolik: %s - %s", response.status, text)
                     return False
 
     except Exception as e:
-        print(f"Telegram async xatolik: {e}")
+        metrics.inc("shop_telegram_messages_total", result="failure")
+        logger.error("Telegram async xatolik: %s", e)
         return False
 
 
@@ -168,7 +178,7 @@ Afsuski, "{application.shop_name}" do'koni uchun arizangiz rad etildi.
 Iltimos, yangi ariza qoldirib ko'ring yoki qo'llab-quvvatlash bilan bog'laning.
 """
 
-    print(f"Foydalanuvchiga yuborilishi kerak: {message}")
+    logger.info("Foydalanuvchiga yuborilishi kerak: %s", message)
 
     # Agar telegram_id bo'lsa:
     # if telegram_id:
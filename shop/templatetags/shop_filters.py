@@ -1,5 +1,8 @@
 # shop/templatetags/shop_filters.py (yangi fayl)
+import uuid
+
 from django import template
+from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 
 register = template.Library()
@@ -114,3 +117,11 @@ def format_price_input(value):
     except (ValueError, TypeError, AttributeError):
         # Xato bo'lsa, original qiymatni qaytarish
         return str(value)
+
+
+@register.simple_tag
+def idempotency_key_input():
+    """Forma uchun yangi idempotentlik kaliti (takroriy yuborishdan himoya)"""
+    return format_html(
+        '<input type="hidden" name="idempotency_key" value="{}">', uuid.uuid4()
+    )
@@ -1,3 +1,1931 @@
-from django.test import TestCase
+import json
+import logging
+import os
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+from io import StringIO
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.db.models import F
+from django.db.models.signals import post_delete
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import CommandError, call_command
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connection, connections, transaction
+from django.http import HttpResponse
+from django.test import (
+    Client,
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import cache as shop_cache
+from . import (
+    events,
+    facets,
+    log_utils,
+    metrics,
+    middleware,
+    profiling,
+    sharding,
+    throttle,
+    warmup,
+)
+from .management.commands.assign_barcodes import internal_barcode
+from .cache import get_cache
+from .archive import archive_chunk, archive_cutoff, archive_shop, sales_in_range
+from .counters import OutOfStock, find_drift, record_income, record_sale, repair
+from .reconcile import audit_shop, repair_stock
+from .reports import compute_owner_report
+from .models import (
+    ApiToken,
+    BotSession,
+    IdempotencyKey,
+    Product,
+    ProductCategory,
+    ProductIncome,
+    Sale,
+    SaleArchive,
+    SaleMonthlySummary,
+    Shop,
+    ShopApplication,
+    ShopStaff,
+    TelegramUser,
+)
+from .stats import get_shop_stats
+from .transitions import cancel_sale, restore_sale
+from .watermarks import shop_watermarks
+
+THREADS = 16
+
+# Standart file keshi ishlab turgan server bilan umumiy - testlar uchun alohida
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ShopTestCase(TestCase):
+    """
+    Barcha bazalar bilan (SHOP_SHARDS bo'lsa do'kon ma'lumotlari boshqa
+    bazalarda) va alohida locmem keshi bilan.
+    """
+
+    databases = "__all__"
+
+    def setUp(self):
+        # Kesh versiyalari testlar orasida qolmasin: id lar qayta ishlatiladi,
+        # on_commit dagi versiya yangilanishi esa TestCase da ishlamaydi
+        get_cache().clear()
+
+    def _should_check_constraints(self, connection):
+        # Do'kon bazasidagi nusxalar "default" dagi foydalanuvchilarga ishora
+        # qiladi - u yerda tashqi kalitlar o'chirilgan (settings.py)
+        return connection.alias == DEFAULT_DB_ALIAS and super()._should_check_constraints(
+            connection
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ShopTransactionTestCase(TransactionTestCase):
+    """Oqimlar bilan testlar uchun (commit lar haqiqiy)"""
+
+    databases = "__all__"
+
+    def setUp(self):
+        get_cache().clear()
+
+
+class StatsCacheTests(ShopTestCase):
+    """Versiyalangan statistika keshi (cache.py, stats.py)"""
+
+    def setUp(self):
+        super().setUp()
+        shop_cache.reset_cache_stats()
+        self.user = User.objects.create_user("egasi", password="x")
+        self.shop = Shop.objects.create(owner=self.user, name="Do'kon", phone="+998900000000")
+        self.product = Product.objects.create(
+            shop=self.shop, name="Non", price=Decimal("5000"), quantity=10, unit="dona"
+        )
+
+    def sell(self, quantity):
+        with self.captureOnCommitCallbacks(
+            using=sharding.shard_for(self.shop.pk), execute=True
+        ):
+            sale = Sale.objects.create(
+                shop=self.shop,
+                product=self.product,
+                quantity=quantity,
+                unit_price=self.product.price,
+                cashier=self.user,
+            )
+            record_sale(sale)
+        return sale
+
+    def test_second_read_is_served_from_cache(self):
+        first = get_shop_stats(self.shop.pk)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_shop_stats(self.shop.pk), first)
+
+        stats = shop_cache.get_cache_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["hit_ratio"], 0.5)
+
+    def test_sale_bumps_version_after_commit(self):
+        self.assertEqual(get_shop_stats(self.shop.pk)["total_sales_quantity"], 0)
+        versions = shop_cache.shop_versions(self.shop.pk)
+
+        self.sell(3)
+
+        self.assertNotEqual(shop_cache.shop_versions(self.shop.pk)[1], versions[1])
+        self.assertEqual(get_shop_stats(self.shop.pk)["total_sales_quantity"], 3)
+
+    def test_rolled_back_write_keeps_version(self):
+        version = shop_cache.get_version(shop_cache.PRODUCT, self.product.pk)
+
+        alias = sharding.shard_for(self.shop.pk)
+        with self.captureOnCommitCallbacks(using=alias, execute=True) as callbacks:
+            with transaction.atomic(using=alias):
+                self.product.name = "Sut"
+                self.product.save()
+                transaction.set_rollback(True)
+
+        self.assertEqual(callbacks, [])
+        self.assertEqual(shop_cache.get_version(shop_cache.PRODUCT, self.product.pk), version)
+
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+        barrier = threading.Barrier(THREADS)
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.1)
+            return 42
+
+        def run():
+            barrier.wait()
+            results.append(shop_cache.get_or_compute("test:single-flight", compute))
+
+        results = []
+        threads = [threading.Thread(target=run) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [42] * THREADS)
+
+
+class FragmentCacheTests(ShopTestCase):
+    """Do'kon kartasi va mahsulotlar jadvali shablon bo'laklari keshi"""
+
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user("egasi", password="x")
+        self.shop = Shop.objects.create(owner=self.owner, name="Do'kon", phone="+998900000000")
+        self.product = Product.objects.create(
+            shop=self.shop, name="Non", price=Decimal("5000"), quantity=10, unit="dona"
+        )
+        self.client.force_login(self.owner)
+
+    def committed(self):
+        return self.captureOnCommitCallbacks(
+            using=sharding.shard_for(self.shop.pk), execute=True
+        )
+
+    def test_shop_card_is_cached_until_shop_changes(self):
+        self.assertContains(self.client.get(reverse("home")), "Do&#x27;kon")
+
+        # Signal siz o'zgarish - versiya o'zgarmaydi, karta keshdan
+        Shop.objects.filter(pk=self.shop.pk).update(name="Yangi nom")
+        self.assertNotContains(self.client.get(reverse("home")), "Yangi nom")
+
+        with self.committed():
+            Shop.objects.get(pk=self.shop.pk).save()
+        self.assertContains(self.client.get(reverse("home")), "Yangi nom")
+
+    def test_product_table_is_cached_until_catalog_changes(self):
+        url = reverse("shop_detail", args=[self.shop.pk])
+        self.assertContains(self.client.get(url), "Non")
+
+        with sharding.use_shop(self.shop):
+            Product.objects.filter(pk=self.product.pk).update(name="Sut")
+        self.assertNotContains(self.client.get(url), "Sut")
+
+        with self.committed(), sharding.use_shop(self.shop):
+            Product.objects.get(pk=self.product.pk).save()
+        self.assertContains(self.client.get(url), "Sut")
+
+
+class QueryInstrumentationTests(ShopTestCase):
+    """So'rov SQL soni va vaqti (middleware.QueryInstrumentationMiddleware)"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user("egasi", password="x")
+        self.factory = RequestFactory()
+
+    def instrumented(self, **options):
+        with mock.patch.dict(middleware.INSTRUMENTATION, {"ENABLED": True, **options}):
+            return middleware.QueryInstrumentationMiddleware(self.repeated_queries)
+
+    def repeated_queries(self, request):
+        for _ in range(3):
+            User.objects.filter(pk=self.user.pk).first()
+        return HttpResponse("ok")
+
+    def test_disabled_middleware_is_not_used(self):
+        with mock.patch.dict(middleware.INSTRUMENTATION, {"ENABLED": False}):
+            with self.assertRaises(MiddlewareNotUsed):
+                middleware.QueryInstrumentationMiddleware(self.repeated_queries)
+
+    def test_server_timing_and_duplicate_origin(self):
+        view = self.instrumented(SLOW_REQUEST_MS=10**6)
+
+        with self.assertLogs("shop.perf", "INFO") as logs:
+            response = view(self.factory.get("/"))
+
+        self.assertIn('desc="3 queries"', response["Server-Timing"])
+        self.assertEqual(logs.records[0].perf["queries"], 3)
+        self.assertEqual(logs.records[0].perf["duplicates"], 1)
+        warning = logs.records[1].getMessage()
+        self.assertIn("3 marta", warning)
+        self.assertIn("shop/tests.py", warning)
+        self.assertIn("repeated_queries", warning)
+
+    def test_slow_request_logs_top_queries(self):
+        view = self.instrumented(SLOW_REQUEST_MS=0, TOP_QUERIES=2)
+
+        with self.assertLogs("shop.perf", "INFO"), self.assertLogs("shop.perf.slow") as logs:
+            view(self.factory.get("/"))
+
+        record = logs.records[0].perf
+        self.assertEqual(len(record["top_queries"]), 2)
+        self.assertEqual(record["duplicate_queries"][0]["count"], 3)
+
+
+class ProfilerTests(ShopTestCase):
+    """Superuser uchun so'rov profillari (middleware.ProfilerMiddleware, profiling.py)"""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser("admin", password="x")
+        self.staff = User.objects.create_user("xodim", password="x", is_staff=True)
+        self.factory = RequestFactory()
+        profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(profile_dir.cleanup)
+        patcher = mock.patch.dict(
+            middleware.PROFILING, {"ENABLED": True, "DIR": profile_dir.name}
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def slow_view(self, request):
+        User.objects.count()
+        return HttpResponse("ok")
+
+    def profile(self, user, **params):
+        request = self.factory.get("/", params)
+        request.user = user
+        return middleware.ProfilerMiddleware(self.slow_view)(request)
+
+    def test_disabled_middleware_is_not_used(self):
+        with mock.patch.dict(middleware.PROFILING, {"ENABLED": False}):
+            with self.assertRaises(MiddlewareNotUsed):
+                middleware.ProfilerMiddleware(self.slow_view)
+
+    def test_only_superuser_requests_are_profiled(self):
+        self.assertNotIn("X-Profile-Name", self.profile(self.staff, _profile=1))
+        self.assertNotIn("X-Profile-Name", self.profile(self.admin))
+        self.assertEqual(profiling.list_profiles(), [])
+
+        name = self.profile(self.admin, _profile=1)["X-Profile-Name"]
+
+        [metadata] = profiling.list_profiles()
+        self.assertEqual(metadata["name"], name)
+        self.assertEqual(metadata["user"], "admin")
+        self.assertEqual(metadata["queries"], 1)
+
+    def test_admin_pages_list_and_render_profiles(self):
+        name = self.profile(self.admin, _profile=1)["X-Profile-Name"]
+        self.client.force_login(self.admin)
+
+        self.assertContains(self.client.get(reverse("admin_profiles")), name)
+        self.assertContains(
+            self.client.get(reverse("admin_profile_detail", args=[name])), "slow_view"
+        )
+        self.assertEqual(
+            self.client.get(reverse("admin_profile_detail", args=["yo'q"])).status_code, 404
+        )
+
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(reverse("admin_profiles")).status_code, 403)
+
+
+class MetricsTests(ShopTestCase):
+    """Prometheus metrikalari (metrics.py, /metrics)"""
+
+    NAME = "shop_test_events_total"
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(self.forget_series)
+
+    def forget_series(self):
+        with metrics._lock:
+            for key in [key for key in metrics._counters if key[0] == self.NAME]:
+                del metrics._counters[key]
+            for key in [key for key in metrics._histograms if key[0] == self.NAME]:
+                del metrics._histograms[key]
+
+    def value(self, counters, **labels):
+        return counters.get((self.NAME, metrics._labels(labels)), 0)
+
+    def test_concurrent_increments_are_not_lost(self):
+        barrier = threading.Barrier(THREADS)
+
+        def run():
+            barrier.wait()
+            for _ in range(1000):
+                metrics.inc(self.NAME, shop="1")
+
+        threads = [threading.Thread(target=run) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        counters, _histograms, _gauges = metrics.collect()
+        self.assertEqual(self.value(counters, shop="1"), THREADS * 1000)
+
+    def test_histogram_exposition(self):
+        for value in (0.003, 0.2, 20):
+            metrics.observe(self.NAME, value, view="home")
+
+        lines = metrics.render().splitlines()
+
+        self.assertIn(f'{self.NAME}_bucket{{view="home",le="0.005"}} 1', lines)
+        self.assertIn(f'{self.NAME}_bucket{{view="home",le="0.25"}} 2', lines)
+        self.assertIn(f'{self.NAME}_bucket{{view="home",le="+Inf"}} 3', lines)
+        self.assertIn(f'{self.NAME}_count{{view="home"}} 3', lines)
+
+    def test_dead_worker_counters_are_retired_once(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        worker = subprocess.Popen(["true"])
+        worker.wait()
+        metrics._write(
+            os.path.join(directory.name, f"{worker.pid}.json"),
+            {
+                "pid": worker.pid,
+                "counters": [[self.NAME, [["shop", "1"]], 5]],
+                "histograms": [],
+                "gauges": {},
+            },
+        )
+        metrics.inc(self.NAME, shop="1")
+
+        with mock.patch.dict(metrics.METRICS, {"DIR": directory.name}):
+            for _ in range(2):
+                counters, _histograms, _gauges = metrics.collect()
+                self.assertEqual(self.value(counters, shop="1"), 6)
+
+        files = sorted(os.listdir(directory.name))
+        self.assertNotIn(f"{worker.pid}.json", files)
+        self.assertIn(metrics.RETIRED, files)
+
+    def test_endpoint_requires_staff_or_token(self):
+        staff = User.objects.create_user("xodim", password="x", is_staff=True)
+        cashier = User.objects.create_user("kassir", password="x")
+        url = reverse("metrics")
+
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_login(cashier)
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        with mock.patch.dict(metrics.METRICS, {"TOKEN": "maxfiy"}):
+            self.assertEqual(self.client.get(url).status_code, 401)
+            response = self.client.get(url, HTTP_AUTHORIZATION="Bearer maxfiy")
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+
+
+class AsyncLoggingTests(SimpleTestCase):
+    """Navbat orqali yoziladigan JSON loglar (log_utils.py)"""
+
+    def setUp(self):
+        self.stream = StringIO()
+        handler = logging.StreamHandler(self.stream)
+        handler.setFormatter(log_utils.JsonFormatter())
+        self.logger = logging.getLogger("shop.tests.async")
+        self.logger.addHandler(handler)
+        self.logger.propagate = False
+        self.addCleanup(self.logger.handlers.clear)
+
+        listeners = len(log_utils._listeners)
+        log_utils._make_async({"loggers": {self.logger.name: {}}})
+        self.listener = log_utils._listeners.pop(listeners)
+        self.addCleanup(log_utils._stop_listeners, [self.listener])
+
+    def records(self):
+        log_utils._stop_listeners([self.listener])
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_exception_keeps_structured_fields(self):
+        self.assertIsInstance(self.logger.handlers[0], log_utils.StructuredQueueHandler)
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            self.logger.exception("xato: %s", "sotuv", extra={"sale_id": 7})
+
+        [record] = self.records()
+        self.assertEqual(record["message"], "xato: sotuv")
+        self.assertEqual(record["sale_id"], 7)
+        self.assertIn("Traceback", record["exception"])
+        self.assertIn("ValueError: boom", record["exception"])
+
+    def test_stack_info_is_kept(self):
+        self.logger.warning("diqqat", stack_info=True)
+
+        [record] = self.records()
+        self.assertEqual(record["message"], "diqqat")
+        self.assertIn("test_stack_info_is_kept", record["stack"])
+
+
+class OwnerReportTests(ShopTestCase):
+    """Egasining barcha do'konlari bo'yicha hisobot (reports.py)"""
+
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user("egasi", password="x")
+        self.other = User.objects.create_user("boshqa", password="x")
+        self.shops = []
+        for index in range(4):
+            shop = Shop.objects.create(
+                owner=self.owner, name=f"Do'kon {index}", phone="+998900000000"
+            )
+            with sharding.use_shop(shop):
+                product = Product.objects.create(
+                    shop=shop, name="Non", price=Decimal("5000"), quantity=10, unit="dona"
+                )
+            self.shops.append((shop, product))
+        Shop.objects.create(owner=self.other, name="Begona", phone="+998900000001")
+
+    def sell(self, shop, product, quantity, cancelled=False):
+        with self.captureOnCommitCallbacks(
+            using=shop.shard, execute=True
+        ), sharding.use_shop(shop):
+            sale = Sale.objects.create(
+                shop=shop,
+                product=product,
+                quantity=quantity,
+                unit_price=product.price,
+                cashier=self.owner,
+                is_cancelled=cancelled,
+            )
+            if not cancelled:
+                record_sale(sale)
+        return sale
+
+    def test_totals_per_shop(self):
+        shop, product = self.shops[0]
+        self.sell(shop, product, 2)
+        self.sell(shop, product, 1, cancelled=True)
+
+        report = compute_owner_report(self.owner.pk)
+
+        self.assertEqual([row["id"] for row in report["shops"]], [s.pk for s, _ in self.shops])
+        row = report["shops"][0]
+        self.assertEqual(row["sales_count"], 1)
+        self.assertEqual(row["revenue"], Decimal("10000"))
+        self.assertEqual(row["cancelled_count"], 1)
+        self.assertEqual(row["cancelled_amount"], Decimal("5000"))
+        self.assertEqual(row["stock_value"], Decimal("40000"))
+        self.assertEqual([item["id"] for item in row["top_products"]], [product.pk])
+        self.assertEqual(report["totals"]["sales_count"], 1)
+        self.assertEqual(report["totals"]["products_count"], 4)
+
+    def test_queries_do_not_grow_with_shops(self):
+        groups = sharding.group_by_shard([shop.pk for shop, _ in self.shops])
+        with ExitStack() as stack:
+            captured = {
+                alias: stack.enter_context(CaptureQueriesContext(connections[alias]))
+                for alias in connections
+            }
+            compute_owner_report(self.owner.pk)
+
+        # do'konlar + arxiv chegarasi "default" da; ombor, sotuv va top -
+        # har bir baza uchun bittadan
+        for alias, context in captured.items():
+            expected = 3 if alias in groups else 0
+            if alias == DEFAULT_DB_ALIAS:
+                # sharding yoqilgan bo'lsa do'konlar bazasi ham so'raladi
+                expected += 3 if sharding.enabled() else 2
+            self.assertEqual(len(context), expected, alias)
+
+    def test_date_range_excludes_older_sales(self):
+        shop, product = self.shops[1]
+        old = self.sell(shop, product, 3)
+        self.sell(shop, product, 1)
+        with sharding.use_shop(shop):
+            Sale.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=30))
+
+        report = compute_owner_report(shop.owner_id, start=timezone.now() - timedelta(days=1))
+
+        row = report["shops"][1]
+        self.assertEqual((row["sales_count"], row["sold_quantity"]), (1, 1))
+        self.assertEqual(row["top_products"][0]["sold_quantity"], 1)
+
+    def test_json_lists_only_own_shops(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse("owner_report_json"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["shops"]), 4)
+
+    def test_page_redirects_without_owned_shops(self):
+        User.objects.create_user("kassir", password="x")
+        self.client.login(username="kassir", password="x")
+        response = self.client.get(reverse("owner_report"))
+
+        self.assertRedirects(response, reverse("home"), fetch_redirect_response=False)
+
+
+class CleanupSessionsTests(ShopTestCase):
+    """cleanup_sessions - eskirgan sessiyalarni bo'laklab o'chirish"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user("kassir", password="x")
+        now = timezone.now()
+        for index in range(3):
+            Session.objects.create(
+                session_key=f"old{index}", session_data="", expire_date=now - timedelta(hours=1)
+            )
+        Session.objects.create(
+            session_key="fresh", session_data="", expire_date=now + timedelta(days=1)
+        )
+        stale = [BotSession.objects.create(user=self.user) for _ in range(5)]
+        self.fresh = BotSession.objects.create(user=self.user)
+        # last_activity auto_now - save() emas, update() bilan eskirtiramiz
+        BotSession.objects.filter(pk__in=[row.pk for row in stale]).update(
+            last_activity=now - timedelta(seconds=3601)
+        )
+
+    def test_deletes_only_expired_rows_in_batches(self):
+        out = StringIO()
+        with mock.patch(
+            "shop.management.commands.cleanup_sessions.time.sleep"
+        ) as sleep:
+            call_command("cleanup_sessions", "--batch-size", "2", "--pause", "0.5", stdout=out)
+
+        self.assertEqual(list(Session.objects.values_list("session_key", flat=True)), ["fresh"])
+        self.assertEqual(list(BotSession.objects.values_list("pk", flat=True)), [self.fresh.pk])
+        # 3 sessiya: 2+1, 5 bot sessiyasi: 2+2+1 - to'liq bo'laklardan keyin pauza
+        self.assertEqual(sleep.call_args_list, [mock.call(0.5)] * 3)
+        self.assertIn("3 ta sessiya, 5 ta bot sessiyasi", out.getvalue())
+
+
+class LoginThrottleTests(ShopTestCase):
+    """Login urinishlarini cheklash (throttle.py)"""
+
+    def setUp(self):
+        super().setUp()
+        User.objects.create_user("kassir", password="parol")
+        patcher = mock.patch.dict(
+            throttle.THROTTLE,
+            {
+                "ENABLED": True,
+                "IP": {"CAPACITY": 3, "REFILL_PER_MINUTE": 10},
+                "USERNAME": {"CAPACITY": 2, "REFILL_PER_MINUTE": 1},
+                "IP_HEADER": None,
+            },
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Tokenlar urinishlar orasida to'lmasin
+        clock = mock.patch("shop.throttle.time")
+        clock.start().time.return_value = 1000.0
+        self.addCleanup(clock.stop)
+
+    def attempt(self, username, password="xato", ip="10.0.0.1"):
+        return self.client.post(
+            reverse("login"), {"username": username, "password": password}, REMOTE_ADDR=ip
+        )
+
+    def throttled(self, username, ip="10.0.0.1"):
+        with self.assertLogs("shop.throttle", "WARNING"):
+            response = self.attempt(username, ip=ip)
+        self.assertEqual(response.status_code, 429)
+        return response
+
+    def test_username_bucket_returns_429_with_retry_after(self):
+        self.assertEqual(self.attempt("kassir", ip="10.0.0.1").status_code, 200)
+        self.assertEqual(self.attempt("Kassir ", ip="10.0.0.2").status_code, 200)
+
+        response = self.throttled("kassir", ip="10.0.0.3")
+
+        # 1 token / daqiqa -> 60 soniyadan keyin
+        self.assertEqual(response["Retry-After"], "61")
+
+    def test_ip_bucket_returns_429_with_retry_after(self):
+        for username in ("a", "b", "c"):
+            self.assertEqual(self.attempt(username).status_code, 200)
+
+        response = self.throttled("d")
+
+        self.assertEqual(response["Retry-After"], "7")
+        self.assertEqual(self.attempt("d", ip="10.0.0.2").status_code, 200)
+
+    def test_successful_login_resets_username_bucket(self):
+        self.attempt("kassir", ip="10.0.0.1")
+        response = self.attempt("kassir", password="parol", ip="10.0.0.2")
+        self.assertRedirects(response, reverse("home"), fetch_redirect_response=False)
+        self.client.logout()
+
+        self.assertEqual(self.attempt("kassir", ip="10.0.0.3").status_code, 200)
+        self.assertEqual(self.attempt("kassir", ip="10.0.0.4").status_code, 200)
+        self.throttled("kassir", ip="10.0.0.5")
+
+
+class BenchConcurrencyTests(ShopTestCase):
+    """bench_concurrency bazaga foydalanuvchi yozmaydi"""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser("admin", password="x")
+
+    def test_unknown_username_is_rejected(self):
+        with self.assertRaisesMessage(CommandError, "Foydalanuvchi topilmadi"):
+            call_command("bench_concurrency", "--username", "yoq", stdout=StringIO())
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_uses_existing_user_session(self):
+        with mock.patch(
+            "shop.management.commands.bench_concurrency.Command.run_profile",
+            return_value={"rss_idle_kb": 0, "views": {}},
+        ) as run_profile:
+            call_command(
+                "bench_concurrency", "--username", "admin", "--profiles", "asgi", stdout=StringIO()
+            )
+
+        cookies = run_profile.call_args.args[2]
+        self.assertIn(settings.SESSION_COOKIE_NAME, cookies)
+        self.assertEqual(list(User.objects.all()), [self.admin])
+        # Sessiya oxirida o'chiriladi
+        self.assertFalse(Session.objects.exists())
+
+
+class WarmupTests(ShopTestCase):
+    """Worker isitish (warmup.py)"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user("egasi", password="x")
+        self.quiet = Shop.objects.create(owner=self.user, name="Tinch", phone="+998900000000")
+        self.busy = Shop.objects.create(owner=self.user, name="Gavjum", phone="+998900000001")
+        with sharding.use_shop(self.busy):
+            product = Product.objects.create(
+                shop=self.busy, name="Non", price=Decimal("5000"), quantity=10, unit="dona"
+            )
+            Sale.objects.create(
+                shop=self.busy, product=product, quantity=1, unit_price=product.price,
+                cashier=self.user,
+            )
+
+    def test_prefill_caches_recently_active_shops(self):
+        with mock.patch.dict(warmup.WARMUP, {"PREFILL_SHOPS": 1}):
+            self.assertEqual(warmup.prefill_caches(), 1)
+
+        shop_cache.reset_cache_stats()
+        with sharding.use_shop(self.busy):
+            get_shop_stats(self.busy.pk)
+        with sharding.use_shop(self.quiet):
+            get_shop_stats(self.quiet.pk)
+        stats = shop_cache.get_cache_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_warm_up_without_prime_skips_connections(self):
+        with mock.patch("shop.warmup.prime_connections") as prime, self.assertLogs(
+            "shop.perf", "INFO"
+        ) as logs:
+            warmup.warm_up(prime=False)
+
+        prime.assert_not_called()
+        record = logs.records[-1]
+        self.assertEqual(set(record.warmup["ms"]), {"code", "templates", "caches"})
+        self.assertGreater(record.warmup["templates"], 0)
+        self.assertEqual(record.warmup["shops"], 2)
+
+    def test_failing_step_does_not_stop_warm_up(self):
+        with mock.patch(
+            "shop.warmup.precompile_templates", side_effect=RuntimeError("buzuq")
+        ), self.assertLogs("shop.perf", "INFO") as logs:
+            warmup.warm_up()
+
+        self.assertEqual(logs.records[0].levelname, "ERROR")
+        self.assertIn("connections", logs.records[-1].warmup["ms"])
+        self.assertEqual(logs.records[-1].warmup["shops"], 2)
+
+
+@override_settings(
+    STORAGES={
+        "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+        "staticfiles": {"BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage"},
+    },
+)
+class StaticAssetsTests(ShopTestCase):
+    """O'z serverimizdagi, xeshlangan va oldindan siqilgan statik fayllar"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.static_root = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(cls.static_root.cleanup)
+        cls.enterClassContext(override_settings(STATIC_ROOT=cls.static_root.name))
+        super().setUpClass()
+        call_command("collectstatic", interactive=False, verbosity=0)
+
+    def test_page_uses_hashed_local_assets(self):
+        content = self.client.get(reverse("login")).content.decode()
+
+        for host in ("cdn.jsdelivr.net", "cdnjs.cloudflare.com", "fonts.googleapis.com"):
+            self.assertNotIn(host, content)
+        self.assertRegex(
+            content, r"/static/vendor/bootstrap-5\.3\.0/css/bootstrap\.min\.[0-9a-f]{12}\.css"
+        )
+        self.assertRegex(content, r"/static/css/base\.[0-9a-f]{12}\.css")
+        self.assertNotIn("<style>", content)
+
+    def test_hashed_asset_is_precompressed_and_immutable(self):
+        url = staticfiles_storage.url("css/base.css")
+        path = os.path.join(self.static_root.name, staticfiles_storage.stored_name("css/base.css"))
+        self.assertTrue(os.path.exists(path + ".gz"))
+        self.assertTrue(os.path.exists(path + ".br"))
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, br")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertIn("max-age=315360000", response["Cache-Control"])
+        response.close()
+
+
+class ConditionalGetTests(ShopTestCase):
+    """Shartli GET - do'kon, mahsulot va sotuvlar sahifalari (decorators.py)"""
+
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user("egasi", password="x")
+        self.stranger = User.objects.create_user("begona", password="x")
+        self.shop = Shop.objects.create(owner=self.owner, name="Do'kon", phone="+998900000000")
+        with sharding.use_shop(self.shop):
+            self.product = Product.objects.create(
+                shop=self.shop, name="Non", price=Decimal("5000"), quantity=10, unit="dona"
+            )
+        self.client.force_login(self.owner)
+
+    def sell(self):
+        with self.captureOnCommitCallbacks(
+            using=self.shop.shard, execute=True
+        ), sharding.use_shop(self.shop):
+            sale = Sale.objects.create(
+                shop=self.shop,
+                product=self.product,
+                quantity=1,
+                unit_price=self.product.price,
+                cashier=self.owner,
+            )
+            record_sale(sale)
+
+    def test_unchanged_page_returns_304(self):
+        for url in (
+            reverse("shop_detail", args=[self.shop.pk]),
+            reverse("product_detail", args=[self.product.pk]),
+            reverse("sales_history", args=[self.shop.pk]),
+        ):
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, 200, url)
+            self.assertIn("Last-Modified", first)
+
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+            self.assertEqual(response.status_code, 304, url)
+
+    def test_recorded_sale_changes_etag(self):
+        url = reverse("sales_history", args=[self.shop.pk])
+        etag = self.client.get(url)["ETag"]
+
+        self.sell()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_denied_request_has_no_validators(self):
+        etag = self.client.get(reverse("shop_detail", args=[self.shop.pk]))["ETag"]
+
+        for url in (
+            reverse("shop_detail", args=[self.shop.pk]),
+            reverse("product_detail", args=[self.product.pk]),
+        ):
+            # Har safar yangi mijoz - oldingi rad etishdagi xabar tekshiruvni o'chirmasin
+            client = Client()
+            client.force_login(self.stranger)
+            response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 302, url)
+            self.assertNotIn("ETag", response)
+            self.assertNotIn("Last-Modified", response)
+
+
+class BotEndpointsTests(ShopTestCase):
+    """bot_status hisoblagichlari va telegram_users oqimi"""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser("admin", password="x")
+        self.client.force_login(self.admin)
+        for index in range(5):
+            user = User.objects.create_user(f"tg{index}", password="x")
+            TelegramUser.objects.create(
+                user=user,
+                telegram_id=1000 + index,
+                username=f"bot_user{index}",
+                is_bot_active=index != 4,
+            )
+        self.application = ShopApplication.objects.create(
+            user=self.admin,
+            owner_full_name="Ali Valiyev",
+            shop_name="Yangi do'kon",
+            phone_number="+998900000000",
+            description="-",
+        )
+
+    def users_page(self, **params):
+        response = self.client.get(reverse("telegram_users"), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return json.loads(b"".join(response.streaming_content))
+
+    def test_bot_status_reports_real_counts(self):
+        status = self.client.get(reverse("bot_status")).json()
+        self.assertEqual(
+            (status["total_users"], status["active_users"], status["pending_applications"]),
+            (5, 4, 1),
+        )
+
+        # signal versiyani commit dan keyin yangilaydi
+        with self.captureOnCommitCallbacks(execute=True):
+            self.application.status = "approved"
+            self.application.save()
+
+        self.assertEqual(self.client.get(reverse("bot_status")).json()["pending_applications"], 0)
+
+    def test_telegram_users_pages_with_cursor(self):
+        first = self.users_page(page_size=2)
+        self.assertEqual([row["telegram_id"] for row in first["users"]], [1000, 1001])
+        self.assertIsNotNone(first["next"])
+
+        seen = [row["telegram_id"] for row in first["users"]]
+        next_url = first["next"]
+        while next_url:
+            page = json.loads(b"".join(self.client.get(next_url).streaming_content))
+            seen += [row["telegram_id"] for row in page["users"]]
+            next_url = page["next"]
+
+        self.assertEqual(seen, [1000, 1001, 1002, 1003, 1004])
+
+    def test_telegram_users_filters(self):
+        inactive = self.users_page(is_active="false")
+        self.assertEqual([row["telegram_id"] for row in inactive["users"]], [1004])
+        self.assertIsNone(inactive["next"])
+
+        found = self.users_page(q="user3")
+        self.assertEqual([row["telegram_username"] for row in found["users"]], ["bot_user3"])
+
+    def test_telegram_users_rejects_bad_cursor(self):
+        response = self.client.get(reverse("telegram_users"), {"after": "x"})
+        self.assertEqual(response.status_code, 400)
+
+
+class ReconcileTests(ShopTestCase):
+    """Ombor qoldig'ini tarix bilan solishtirish (reconcile.py)"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user("egasi", password="x")
+        self.shop = Shop.objects.create(owner=self.user, name="Do'kon", phone="+998900000000")
+        with sharding.use_shop(self.shop):
+            self.product = Product.objects.create(
+                shop=self.shop, name="Non", price=Decimal("5000"), quantity=10, unit="dona"
+            )
+            # Ombor miqdori formada o'zgaradi, kirim yozuvi - tarix
+            ProductIncome.objects.create(product=self.product, quantity=10, added_by=self.user)
+            sale = Sale.objects.create(
+                shop=self.shop,
+                product=self.product,
+                quantity=3,
+                unit_price=self.product.price,
+                cashier=self.user,
+            )
+            record_sale(sale)
+            # Tarixga yozilmagan o'zgarish: 7 o'rniga 5
+            Product.objects.filter(pk=self.product.pk).update(quantity=5)
+
+    def quantity(self):
+        with sharding.use_shop(self.shop):
+            return Product.objects.get(pk=self.product.pk).quantity
+
+    def test_audit_reports_expected_stock(self):
+        mismatches = audit_shop(self.shop.pk)
+
+        self.assertEqual(len(mismatches), 1)
+        item = mismatches[0]
+        self.assertEqual(
+            (item["product_id"], item["quantity"], item["expected"], item["income"], item["sold"]),
+            (self.product.pk, 5, 7, 10, 3),
+        )
+
+    def test_repair_sets_expected_stock(self):
+        with self.captureOnCommitCallbacks(using=self.shop.shard, execute=True):
+            self.assertEqual(repair_stock(self.shop.pk, audit_shop(self.shop.pk)), 1)
+
+        self.assertEqual(self.quantity(), 7)
+        self.assertEqual(audit_shop(self.shop.pk), [])
+
+    def test_repair_rechecks_stale_mismatches(self):
+        mismatches = audit_shop(self.shop.pk)
+        # Tekshiruvdan keyin boshqa jarayon tuzatib qo'ydi
+        with sharding.use_shop(self.shop):
+            Product.objects.filter(pk=self.product.pk).update(quantity=7)
+
+        self.assertEqual(repair_stock(self.shop.pk, mismatches), 0)
+        self.assertEqual(self.quantity(), 7)
+
+    def test_repair_keeps_sales_recorded_after_audit(self):
+        mismatches = audit_shop(self.shop.pk)
+        with sharding.use_shop(self.shop):
+            sale = Sale.objects.create(
+                shop=self.shop,
+                product=self.product,
+                quantity=2,
+                unit_price=self.product.price,
+                cashier=self.user,
+            )
+            record_sale(sale)
+
+        repair_stock(self.shop.pk, mismatches)
+
+        self.assertEqual(self.quantity(), 5)
+
+    def test_command_repairs_selected_shop(self):
+        out = StringIO()
+        call_command(
+            "reconcile_stock", "--shop", str(self.shop.pk), "--workers", "1", "--repair",
+            stdout=out,
+        )
+
+        self.assertIn("Tuzatildi: 1", out.getvalue())
+        self.assertIn("kutilgan 7", out.getvalue())
+        self.assertEqual(self.quantity(), 7)
+
+
+class SaleTransitionTests(ShopTransactionTestCase):
+    """Bir sotuvni ko'p oqimdan bir vaqtda bekor qilish/tiklash"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user("kassir", password="x")
+        shop = Shop.objects.create(owner=self.user, name="Do'kon", phone="+998900000000")
+        self.product = Product.objects.create(
+            shop=shop, name="Non", price=Decimal("5000"), quantity=100, unit="dona"
+        )
+        self.sale = Sale.objects.create(
+            shop=shop,
+            product=self.product,
+            quantity=5,
+            unit_price=self.product.price,
+            cashier=self.user,
+        )
+        record_sale(self.sale)
+
+    def hammer(self, *actions):
+        """Har bir oqim to'siqda kutadi, keyin o'z amalini bajaradi"""
+        barrier = threading.Barrier(len(actions))
+        results = []
+        errors = []
+
+        def run(action):
+            try:
+                barrier.wait()
+                sale = Sale.objects.get(pk=self.sale.pk)
+                results.append((action, action(sale, self.user)))
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(action,)) for action in actions]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        return results
+
+    def assertConsistent(self):
+        sale = Sale.objects.get(pk=self.sale.pk)
+        product = Product.objects.get(pk=self.product.pk)
+        sold = 0 if sale.is_cancelled else 5
+        self.assertEqual(product.quantity, 100 - sold)
+        self.assertEqual(product.sold_qty, sold)
+        self.assertEqual(product.revenue, Decimal("5000") * sold)
+        return sale, product
+
+    def test_concurrent_cancel_applies_once(self):
+        results = self.hammer(*[cancel_sale] * THREADS)
+
+        self.assertEqual(sum(ok for _, ok in results), 1)
+        sale, product = self.assertConsistent()
+        self.assertTrue(sale.is_cancelled)
+        self.assertEqual(product.cancelled_qty, 5)
+
+    def test_concurrent_restore_applies_once(self):
+        self.assertTrue(cancel_sale(self.sale, self.user))
+
+        results = self.hammer(*[restore_sale] * THREADS)
+
+        self.assertEqual(sum(ok for _, ok in results), 1)
+        sale, product = self.assertConsistent()
+        self.assertFalse(sale.is_cancelled)
+        self.assertEqual(product.cancelled_qty, 0)
+
+    def test_mixed_transitions_keep_stock_consistent(self):
+        results = self.hammer(*[cancel_sale, restore_sale] * (THREADS // 2))
+
+        cancels = sum(ok for action, ok in results if action is cancel_sale)
+        restores = sum(ok for action, ok in results if action is restore_sale)
+        # O'tishlar navbatma-navbat: bekor qilish soni tiklashdan ko'pi bilan bitta ko'p
+        self.assertIn(cancels - restores, (0, 1))
+        sale, product = self.assertConsistent()
+        self.assertEqual(sale.is_cancelled, cancels > restores)
+        self.assertEqual(product.cancelled_qty, 5 * (cancels - restores))
+
+    def test_restore_without_stock_is_refused(self):
+        self.assertTrue(cancel_sale(self.sale, self.user))
+        Product.objects.filter(pk=self.product.pk).update(quantity=2)
+
+        with self.assertRaises(OutOfStock):
+            restore_sale(self.sale, self.user)
+
+        sale = Sale.objects.get(pk=self.sale.pk)
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertTrue(sale.is_cancelled)
+        self.assertEqual(product.quantity, 2)
+        self.assertEqual(product.cancelled_qty, 5)
+
+    def test_concurrent_sales_never_oversell(self):
+        Product.objects.filter(pk=self.product.pk).update(quantity=3)
+        barrier = threading.Barrier(THREADS)
+        outcomes = []
+
+        def sell():
+            try:
+                barrier.wait()
+                with transaction.atomic():
+                    sale = Sale.objects.create(
+                        shop_id=self.product.shop_id,
+                        product=self.product,
+                        quantity=1,
+                        unit_price=self.product.price,
+                        cashier=self.user,
+                    )
+                    record_sale(sale)
+                outcomes.append(True)
+            except OutOfStock:
+                outcomes.append(False)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=sell) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(outcomes.count(True), 3)
+        self.assertEqual(outcomes.count(False), THREADS - 3)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).quantity, 0)
+        self.assertEqual(Sale.objects.count(), 4)
+
+
+class PosSyncTests(ShopTestCase):
+    """Oflayn kassa sotuvlarini yuklash (api.pos_sync_sales)"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user("kassir", password="x")
+        self.shop = Shop.objects.create(owner=self.user, name="Do'kon", phone="+998900000000")
+        self.product = Product.objects.create(
+            shop=self.shop, name="Non", price=Decimal("5000"), quantity=5, unit="dona"
+        )
+        self.token = ApiToken.objects.create(user=self.user, name="Kassa")
+        self.url = reverse("api_pos_sync_sales", args=[self.shop.pk])
+
+    def sync(self, *lines):
+        response = self.client.post(
+            self.url,
+            json.dumps({"sales": list(lines)}),
+            content_type="application/json",
+            HTTP_AUTHORIZATION=f"Token {self.token.key}",
+        )
+        return response, response.json()
+
+    def line(self, quantity, client_uuid=None):
+        return {
+            "uuid": str(client_uuid or uuid.uuid4()),
+            "product_id": self.product.pk,
+            "quantity": quantity,
+        }
+
+    def test_duplicate_uuid_replay_books_once(self):
+        line = self.line(2)
+
+        _response, first = self.sync(line)
+        _response, replay = self.sync(line)
+
+        self.assertEqual(first["results"][0]["status"], "created")
+        self.assertEqual(replay["results"][0]["status"], "duplicate")
+        self.assertEqual(replay["results"][0]["sale_id"], first["results"][0]["sale_id"])
+        self.assertEqual(Sale.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 3)
+        self.assertEqual(self.product.sold_qty, 2)
+
+    def test_duplicate_uuid_in_archive(self):
+        line = self.line(1)
+        self.sync(line)
+        Sale.objects.update(created_at=timezone.now() - timedelta(days=800))
+        list(archive_shop(self.shop.pk, archive_cutoff()))
+
+        _response, replay = self.sync(line)
+
+        self.assertEqual(replay["results"][0]["status"], "duplicate")
+        self.assertEqual(SaleArchive.objects.count(), 1)
+
+    def test_partial_stock_rejects_only_short_lines(self):
+        _response, data = self.sync(self.line(3), self.line(3), self.line(2))
+
+        statuses = [result["status"] for result in data["results"]]
+        self.assertEqual(statuses, ["created", "conflict", "created"])
+        self.assertEqual(data["results"][1]["available"], 2)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 0)
+        self.assertEqual(Sale.objects.count(), 2)
+
+    def test_non_integer_quantity_is_rejected(self):
+        for quantity in (2.7, "2", True):
+            response, data = self.sync(self.line(1), self.line(quantity))
+
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(data["index"], 1)
+            self.assertIn("sales[1].quantity", data["message"])
+        self.assertFalse(Sale.objects.exists())
+
+    def test_non_integer_product_id_is_rejected(self):
+        for product_id in (2.7, True, str(self.product.pk)):
+            line = dict(self.line(1), product_id=product_id)
+            response, data = self.sync(line)
+
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(data["index"], 0)
+            self.assertIn("sales[0].product_id", data["message"])
+        self.assertFalse(Sale.objects.exists())
+
+    def test_uuid_of_another_shop_is_not_disclosed(self):
+        outsider = User.objects.create_user("begona", password="x")
+        other = Shop.objects.create(owner=outsider, name="Boshqa", phone="+998900000001")
+        with sharding.use_shop(self.shop):
+            foreign = Sale.objects.create(
+                shop=self.shop,
+                product=self.product,
+                quantity=1,
+                unit_price=self.product.price,
+                cashier=self.user,
+                client_uuid=uuid.uuid4(),
+            )
+        Sale.objects.filter(pk=foreign.pk).update(shop=other)
+
+        _response, data = self.sync(self.line(1, foreign.client_uuid))
+
+        [result] = data["results"]
+        self.assertEqual(result["status"], "conflict")
+        self.assertNotIn("sale_id", result)
+
+    def test_repeated_integrity_error_returns_conflicts(self):
+        with mock.patch("shop.api._apply_batch", side_effect=IntegrityError):
+            response, data = self.sync(self.line(1), self.line(1))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["summary"], {"conflict": 2})
+
+
+class ArchiveTests(ShopTestCase):
+    """Sotuvlarni arxivlash va joriy/arxiv jadvallarini birga o'qish"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user("kassir", password="x")
+        self.shop = Shop.objects.create(owner=self.user, name="Do'kon", phone="+998900000000")
+        self.product = Product.objects.create(
+            shop=self.shop, name="Non", price=Decimal("5000"), quantity=100, unit="dona"
+        )
+        now = timezone.now()
+        # 5 ta eski (arxivga tushadigan) va 2 ta yangi sotuv
+        self.ages = [900, 850, 800, 750, 700, 3, 1]
+        for days in self.ages:
+            sale = Sale.objects.create(
+                shop=self.shop,
+                product=self.product,
+                quantity=1,
+                unit_price=self.product.price,
+                cashier=self.user,
+            )
+            Sale.objects.filter(pk=sale.pk).update(created_at=now - timedelta(days=days))
+        self.cutoff = archive_cutoff()
+
+    def test_interrupted_archive_resumes_without_double_count(self):
+        chunks = archive_shop(self.shop.pk, self.cutoff, batch_size=2)
+        self.assertEqual(next(chunks), 2)
+        chunks.close()  # jarayon to'xtadi
+
+        moved = sum(archive_shop(self.shop.pk, self.cutoff, batch_size=2))
+
+        self.assertEqual(moved, 3)
+        self.assertEqual(SaleArchive.objects.count(), 5)
+        self.assertEqual(Sale.objects.count(), 2)
+        summaries = SaleMonthlySummary.objects.filter(product=self.product)
+        self.assertEqual(sum(row.sales_count for row in summaries), 5)
+        self.assertEqual(sum(row.revenue for row in summaries), Decimal("25000"))
+
+    def test_sales_in_range_merges_hot_and_archived(self):
+        expected = list(
+            Sale.objects.order_by("-created_at").values_list("id", flat=True)
+        )
+        list(archive_shop(self.shop.pk, self.cutoff))
+
+        sales = sales_in_range(self.shop.pk)
+        self.assertEqual([sale.id for sale in sales], expected)
+
+        limited = sales_in_range(self.shop.pk, limit=4)
+        self.assertEqual([sale.id for sale in limited], expected[:4])
+
+        start = timezone.now() - timedelta(days=10)
+        recent = sales_in_range(self.shop.pk, start=start)
+        self.assertEqual([sale.id for sale in recent], expected[:2])
+
+    def test_chunk_skips_per_row_signals(self):
+        product_key = (shop_cache.PRODUCT, self.product.pk)
+        before = shop_cache.shop_versions(self.shop.pk)
+        product_before = shop_cache.get_versions(product_key)
+        handler = mock.Mock()
+        post_delete.connect(handler, sender=Sale)
+        self.addCleanup(post_delete.disconnect, handler, sender=Sale)
+
+        with self.captureOnCommitCallbacks(
+            using=sharding.shard_for(self.shop.pk), execute=True
+        ):
+            moved = archive_chunk(self.shop.pk, self.cutoff, batch_size=5)
+
+        self.assertEqual(moved, 5)
+        handler.assert_not_called()
+        self.assertNotEqual(shop_cache.shop_versions(self.shop.pk), before)
+        self.assertNotEqual(shop_cache.get_versions(product_key), product_before)
+
+
+class CounterDriftTests(ShopTestCase):
+    """Hisoblagichlarni kirim/sotuv/arxivdan qayta hisoblash"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user("kassir", password="x")
+        self.shop = Shop.objects.create(owner=self.user, name="Do'kon", phone="+998900000000")
+        self.product = Product.objects.create(
+            shop=self.shop, name="Non", price=Decimal("5000"), quantity=0, unit="dona"
+        )
+        # Kirim hisoblagichni o'zi yangilaydi, ombor miqdori esa formada
+        ProductIncome.objects.create(product=self.product, quantity=10, added_by=self.user)
+        Product.objects.filter(pk=self.product.pk).update(quantity=10)
+        for quantity in (2, 3):
+            sale = Sale.objects.create(
+                shop=self.shop,
+                product=self.product,
+                quantity=quantity,
+                unit_price=self.product.price,
+                cashier=self.user,
+            )
+            record_sale(sale)
+        self.assertTrue(cancel_sale(sale, self.user))
+
+    def test_consistent_counters_have_no_drift(self):
+        self.assertEqual(find_drift(self.shop.pk), [])
+
+    def test_drift_is_detected_and_repaired(self):
+        Product.objects.filter(pk=self.product.pk).update(sold_qty=99, cancelled_qty=0)
+
+        drift = find_drift(self.shop.pk)
+
+        self.assertEqual(len(drift), 1)
+        product_id, current, expected = drift[0]
+        self.assertEqual(product_id, self.product.pk)
+        self.assertEqual(current["sold_qty"], 99)
+        self.assertEqual(expected["sold_qty"], 2)
+        self.assertEqual(expected["cancelled_qty"], 3)
+        self.assertEqual(expected["revenue"], Decimal("10000"))
+
+        repair(drift)
+        self.assertEqual(find_drift(self.shop.pk), [])
+
+    def test_archived_sales_count_towards_expected(self):
+        Sale.objects.update(created_at=timezone.now() - timedelta(days=800))
+        list(archive_shop(self.shop.pk, archive_cutoff()))
+
+        self.assertEqual(find_drift(self.shop.pk), [])
+
+
+class IdempotencyTests(ShopTestCase):
+    """Forma takroriy yuborilganda amal bir marta bajariladi"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user("egasi", password="x")
+        self.shop = Shop.objects.create(owner=self.user, name="Do'kon", phone="+998900000000")
+        self.product = Product.objects.create(
+            shop=self.shop, name="Non", price=Decimal("5000"), quantity=10, unit="dona"
+        )
+        self.sale = Sale.objects.create(
+            shop=self.shop,
+            product=self.product,
+            quantity=2,
+            unit_price=self.product.price,
+            cashier=self.user,
+        )
+        record_sale(self.sale)
+        self.client.force_login(self.user)
+
+    def post(self, name, key):
+        return self.client.post(
+            reverse(name, args=[self.sale.pk]), {"idempotency_key": str(key)}, follow=True
+        )
+
+    def test_completed_action_is_replayed(self):
+        key = uuid.uuid4()
+        self.post("cancel_sale", key)
+
+        response = self.post("cancel_sale", key)
+
+        self.assertContains(response, "Bu amal allaqachon bajarilgan")
+        self.assertTrue(IdempotencyKey.objects.get(key=key).is_completed)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 10)
+        self.assertEqual(self.product.cancelled_qty, 2)
+
+    def test_rejected_action_is_not_stored(self):
+        key = uuid.uuid4()
+        # Sotuv bekor qilinmagan - tiklash rad etiladi
+        self.post("restore_sale", key)
+        self.assertFalse(IdempotencyKey.objects.filter(key=key).exists())
+
+        self.assertTrue(cancel_sale(self.sale, self.user))
+        response = self.post("restore_sale", key)
+
+        self.assertNotContains(response, "Bu amal allaqachon bajarilgan")
+        self.sale.refresh_from_db()
+        self.assertFalse(self.sale.is_cancelled)
+        self.assertTrue(IdempotencyKey.objects.get(key=key).is_completed)
+
+
+class LiveEventsTests(ShopTestCase):
+    """Jonli panel oqimi (views.shop_events) va heartbeat snapshot"""
+
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user("egasi", password="x")
+        self.outsider = User.objects.create_user("begona", password="x")
+        self.shop = Shop.objects.create(owner=self.owner, name="Do'kon", phone="+998900000000")
+        self.product = Product.objects.create(
+            shop=self.shop, name="Non", price=Decimal("5000"), quantity=10, unit="dona"
+        )
+        self.url = reverse("shop_events", args=[self.shop.pk])
+
+    def sell(self, quantity):
+        sale = Sale.objects.create(
+            shop=self.shop,
+            product=self.product,
+            quantity=quantity,
+            unit_price=self.product.price,
+            cashier=self.owner,
+        )
+        record_sale(sale)
+
+    def test_snapshot_stats_follow_db_watermarks(self):
+        get_shop_stats(self.shop.pk)
+        seen = shop_watermarks(self.shop.pk)
+
+        # TestCase da on_commit ishlamaydi - kesh versiyasi yangilanmaydi,
+        # xuddi yozuv boshqa worker da bo'lgandek
+        self.sell(3)
+        self.assertEqual(get_shop_stats(self.shop.pk)["total_sales_quantity"], 0)
+
+        marks, message = events.snapshot(self.shop.pk, seen)
+
+        self.assertNotEqual(marks, seen)
+        payload = json.loads(message.split("data: ", 1)[1])
+        self.assertEqual(payload["stats"]["total_sales_quantity"]["value"], 3)
+        self.assertEqual([row["id"] for row in payload["products"]], [self.product.pk])
+
+    def test_snapshot_is_silent_without_changes(self):
+        seen = shop_watermarks(self.shop.pk)
+        self.assertEqual(events.snapshot(self.shop.pk, seen), (seen, None))
+
+    async def test_stream_requires_shop_access(self):
+        await self.async_client.aforce_login(self.outsider)
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 403)
+
+    async def test_stream_starts_with_snapshot(self):
+        await self.async_client.aforce_login(self.owner)
+        response = await self.async_client.get(f"{self.url}?catalog=0&sales=0")
+
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        chunks = response.streaming_content
+        try:
+            self.assertTrue((await anext(chunks)).startswith(b"retry: "))
+            snapshot = (await anext(chunks)).decode()
+        finally:
+            await chunks.aclose()
+        self.assertTrue(snapshot.startswith("event: snapshot\n"))
+        self.assertIn(f'"id": {self.product.pk}', snapshot)
+
+
+class ProductFacetTests(ShopTestCase):
+    """Do'kon sahifasidagi mahsulot filtri sonlari va sahifalash"""
+
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user("egasi", password="x")
+        self.shop = Shop.objects.create(owner=self.owner, name="Do'kon", phone="+998900000000")
+        self.drinks = ProductCategory.objects.create(name="Ichimliklar")
+        self.bread = ProductCategory.objects.create(name="Non")
+        # (kategoriya, birlik, qoldiq): 3 mavjud + 1 kam ichimlik, 2 tugagan non,
+        # 1 kategoriyasiz
+        for category, unit, quantity in [
+            (self.drinks, "dona", 20),
+            (self.drinks, "dona", 30),
+            (self.drinks, "litr", 11),
+            (self.drinks, "litr", 5),
+            (self.bread, "dona", 0),
+            (self.bread, "kg", 0),
+            (None, "kg", 7),
+        ]:
+            Product.objects.create(
+                shop=self.shop,
+                category=category,
+                name=f"{unit} {quantity}",
+                price=Decimal("1000"),
+                quantity=quantity,
+                unit=unit,
+            )
+        self.client.force_login(self.owner)
+        self.url = reverse("shop_detail", args=[self.shop.pk])
+
+    def counts(self, response, name):
+        facet = next(facet for facet in response.context["facets"] if facet["name"] == name)
+        return {option["value"]: option["count"] for option in facet["options"]}
+
+    def test_unfiltered_counts(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.context["products_total"], 7)
+        self.assertEqual(
+            self.counts(response, "category"),
+            {str(self.drinks.pk): 4, str(self.bread.pk): 2, "none": 1},
+        )
+        self.assertEqual(self.counts(response, "unit"), {"dona": 3, "kg": 2, "litr": 2})
+        self.assertEqual(self.counts(response, "stock"), {"in_stock": 3, "low": 2, "out": 2})
+
+    def labels(self, response):
+        facet = next(facet for facet in response.context["facets"] if facet["name"] == "category")
+        return {option["value"]: option["label"] for option in facet["options"]}
+
+    def test_category_changes_refresh_facets(self):
+        self.client.get(self.url)  # fasetlar keshlandi
+
+        with self.captureOnCommitCallbacks(using=self.shop.shard, execute=True):
+            self.drinks.name = "Suvlar"
+            self.drinks.save()
+        response = self.client.get(self.url)
+        self.assertEqual(self.labels(response)[str(self.drinks.pk)], "Suvlar")
+
+        with self.captureOnCommitCallbacks(using=self.shop.shard, execute=True):
+            self.bread.delete()
+        response = self.client.get(self.url)
+        self.assertEqual(self.counts(response, "category"), {str(self.drinks.pk): 4, "none": 3})
+
+    def test_facet_counts_ignore_their_own_filter(self):
+        response = self.client.get(self.url, {"category": self.drinks.pk, "unit": "litr"})
+
+        self.assertEqual(response.context["products_total"], 2)
+        # Kategoriya sonlari faqat birlik filtri bilan
+        self.assertEqual(self.counts(response, "category"), {str(self.drinks.pk): 2})
+        # Birlik sonlari faqat kategoriya filtri bilan
+        self.assertEqual(self.counts(response, "unit"), {"dona": 2, "litr": 2})
+        self.assertEqual(self.counts(response, "stock"), {"in_stock": 1, "low": 1})
+        self.assertEqual(
+            sorted(product.quantity for product in response.context["products"]), [5, 11]
+        )
+
+    def test_stock_filter_and_uncategorized(self):
+        response = self.client.get(self.url, {"stock": "out"})
+        categories = [product.category_id for product in response.context["products"]]
+        self.assertEqual(categories, [self.bread.pk, self.bread.pk])
+
+        response = self.client.get(self.url, {"category": "none"})
+        self.assertEqual(response.context["products_total"], 1)
+
+    def test_pagination(self):
+        Product.objects.bulk_create(
+            Product(shop=self.shop, name=f"Mahsulot {index}", price=Decimal("1"), unit="dona")
+            for index in range(facets.PAGE_SIZE)
+        )
+        total = facets.PAGE_SIZE + 7
+
+        first = self.client.get(self.url)
+        last = self.client.get(self.url, {"page": 2})
+        beyond = self.client.get(self.url, {"page": 99})
+
+        self.assertEqual(first.context["page"]["num_pages"], 2)
+        self.assertEqual(len(first.context["products"]), facets.PAGE_SIZE)
+        self.assertEqual(first.context["page"]["next_url"], "?page=2")
+        self.assertEqual(len(last.context["products"]), total - facets.PAGE_SIZE)
+        self.assertIsNone(last.context["page"]["next_url"])
+        self.assertEqual(beyond.context["page"]["number"], 2)
+
+    def test_pagination_keeps_filters(self):
+        page = facets.paginate(120, {"unit": "kg"}, "2", page_size=50)
+        self.assertEqual(page["offset"], 50)
+        self.assertEqual(page["previous_url"], "?unit=kg&page=1")
+        self.assertEqual(page["next_url"], "?unit=kg&page=3")
+        self.assertEqual(facets.paginate(0, {}, "abc")["number"], 1)
+
+
+class BarcodeTests(ShopTestCase):
+    """Skaner qidiruvi huquqlari va shtrix-kodlarni ommaviy berish"""
+
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user("egasi", password="x")
+        self.cashier = User.objects.create_user("kassir", password="x")
+        self.outsider = User.objects.create_user("begona", password="x")
+        self.shop = Shop.objects.create(owner=self.owner, name="Do'kon", phone="+998900000000")
+        ShopStaff.objects.create(shop=self.shop, user=self.cashier, role="cashier")
+        self.other_shop = Shop.objects.create(
+            owner=self.outsider, name="Boshqa", phone="+998900000001"
+        )
+        self.milk = self.product(self.shop, "Sut", "4780000000011")
+        self.bread = self.product(self.shop, "Non", "4780000000028")
+        self.foreign = self.product(self.other_shop, "Begona", "4780000000035")
+
+    def product(self, shop, name, barcode=None):
+        return Product.objects.create(
+            shop=shop, name=name, price=Decimal("1000"), quantity=5, unit="dona", barcode=barcode
+        )
+
+    def scan(self, user, code, shop=None):
+        self.client.force_login(user)
+        url = reverse("scan_product", args=[(shop or self.shop).pk])
+        return self.client.get(url, {"code": code})
+
+    def test_owner_and_staff_find_product(self):
+        for user in (self.owner, self.cashier):
+            response = self.scan(user, " 4780000000011 ")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["product"]["id"], self.milk.pk)
+
+    def test_outsider_gets_not_found(self):
+        response = self.scan(self.outsider, "4780000000011")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()["status"], "not_found")
+
+    def test_code_of_another_shop_is_not_found(self):
+        self.assertEqual(self.scan(self.owner, "4780000000035").status_code, 404)
+        # Begona do'kon manzili orqali ham
+        self.assertEqual(self.scan(self.owner, "4780000000035", self.other_shop).status_code, 404)
+
+    def test_missing_code(self):
+        self.assertEqual(self.scan(self.owner, "  ").status_code, 400)
+
+    def assign(self, *args, csv_rows=None):
+        args = ["--shop", str(self.shop.pk), *args]
+        path = None
+        if csv_rows is not None:
+            with tempfile.NamedTemporaryFile(
+                "w", suffix=".csv", delete=False, encoding="utf-8"
+            ) as f:
+                f.write("product_id,barcode\n")
+                f.writelines(f"{product_id},{code}\n" for product_id, code in csv_rows)
+            path = f.name
+            args += ["--csv", path]
+        try:
+            call_command("assign_barcodes", *args, stdout=StringIO(), stderr=StringIO())
+        finally:
+            if path:
+                os.remove(path)
+
+    def barcodes(self):
+        return dict(Product.objects.filter(shop=self.shop).values_list("id", "barcode"))
+
+    def test_csv_swaps_codes_between_products(self):
+        self.assign(
+            csv_rows=[(self.milk.pk, "4780000000028"), (self.bread.pk, "4780000000011")]
+        )
+
+        self.assertEqual(
+            self.barcodes(), {self.milk.pk: "4780000000028", self.bread.pk: "4780000000011"}
+        )
+
+    def test_csv_rejects_code_held_by_unlisted_product(self):
+        extra = self.product(self.shop, "Tuz")
+
+        self.assign(csv_rows=[(extra.pk, "4780000000011"), (self.foreign.pk, "111")])
+
+        barcodes = self.barcodes()
+        self.assertIsNone(barcodes[extra.pk])
+        self.assertEqual(barcodes[self.milk.pk], "4780000000011")
+        self.foreign.refresh_from_db()
+        self.assertEqual(self.foreign.barcode, "4780000000035")
+
+    def test_internal_codes_for_products_without_barcode(self):
+        extra = self.product(self.shop, "Tuz")
+
+        self.assign("--dry-run")
+        self.assertIsNone(self.barcodes()[extra.pk])
+
+        self.assign()
+        code = self.barcodes()[extra.pk]
+        self.assertEqual(code, internal_barcode(extra.pk))
+        self.assertEqual(len(code), 13)
+        self.assertEqual(self.scan(self.cashier, code).json()["product"]["id"], extra.pk)
+
+
+@skipUnless(sharding.enabled(), "SHOP_SHARDS=shard1,shard2 python manage.py test shop")
+class ShardingTests(ShopTestCase):
+    """Do'kon bazasiga yo'naltirish, yagona id lar va do'konni ko'chirish"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user("kassir", password="x")
+        self.shop = Shop.objects.create(owner=self.user, name="Do'kon", phone="+998900000000")
+        self.source = self.shop.shard
+        self.target = next(alias for alias in sharding.aliases() if alias != self.source)
+
+        self.product = Product.objects.create(
+            shop=self.shop, name="Non", price=Decimal("5000"), quantity=0, unit="dona"
+        )
+        ProductIncome.objects.create(product=self.product, quantity=20, added_by=self.user)
+        Product.objects.filter(pk=self.product.pk).update(quantity=20)
+        sales = [self.sell(quantity) for quantity in (2, 3, 4)]
+        self.assertTrue(cancel_sale(sales[1], self.user))
+        self.assertTrue(cancel_sale(sales[2], self.user))
+        self.assertTrue(restore_sale(sales[2], self.user))
+
+    def sell(self, quantity):
+        sale = Sale.objects.create(
+            shop=self.shop,
+            product=self.product,
+            quantity=quantity,
+            unit_price=self.product.price,
+            cashier=self.user,
+        )
+        record_sale(sale)
+        return sale
+
+    def test_counters_outside_request_use_shop_database(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            shop = Shop.objects.create(
+                owner=self.user, name="Uzoq", phone="+998900000001", shard=self.target
+            )
+        with sharding.use_shop(shop):
+            product = Product.objects.create(
+                shop=shop, name="Suv", price=Decimal("3000"), quantity=5, unit="dona"
+            )
+            sale = Sale.objects.create(
+                shop=shop, product=product, quantity=2, unit_price=product.price,
+                cashier=self.user,
+            )
+            record_sale(sale)
+
+        # Kontekstsiz (buyruq, bot): so'rovlar tranzaksiya ochilgan bazaga
+        self.assertTrue(cancel_sale(sale, self.user))
+        record_income(product.pk, 3)
+
+        row = Product.objects.using(self.target).get(pk=product.pk)
+        self.assertEqual((row.quantity, row.cancelled_qty, row.total_income_qty), (5, 2, 3))
+        self.assertTrue(Sale.objects.using(self.target).get(pk=sale.pk).is_cancelled)
+
+    def rows(self, alias):
+        """{model nomi: id lar} - do'konning shu bazadagi qatorlari"""
+        return {
+            model._meta.model_name: sorted(
+                model.objects.using(alias)
+                .filter(**{lookup: self.shop.pk})
+                .values_list("pk", flat=True)
+            )
+            for model, lookup in sharding.SHOP_ROWS
+        }
+
+    def counters(self, alias):
+        return (
+            Product.objects.using(alias)
+            .filter(pk=self.product.pk)
+            .values("quantity", "sold_qty", "cancelled_qty", "revenue")
+            .get()
+        )
+
+    def assertMoved(self, before, counters):
+        shop = Shop.objects.using(DEFAULT_DB_ALIAS).get(pk=self.shop.pk)
+        self.assertEqual(shop.shard, self.target)
+        self.assertFalse(shop.is_moving)
+        self.assertEqual(sharding.shard_for(self.shop.pk), self.target)
+
+        self.assertEqual(self.rows(self.target), before)
+        self.assertEqual(self.counters(self.target), counters)
+        self.assertTrue(all(not ids for ids in self.rows(self.source).values()))
+        if self.source != DEFAULT_DB_ALIAS:
+            self.assertFalse(Shop.objects.using(self.source).filter(pk=self.shop.pk).exists())
+
+    def test_rows_are_routed_to_shop_shard(self):
+        with sharding.use_shop(self.shop):
+            self.assertEqual(sharding.current(), self.source)
+            product = Product.objects.get(pk=self.product.pk)
+            self.assertEqual(product._state.db, self.source)
+            # Nusxa orqali JOIN, foydalanuvchi esa "default" dan
+            self.assertEqual(product.shop.owner_id, self.user.pk)
+            self.assertEqual(
+                sharding.ShopRouter().db_for_read(User), DEFAULT_DB_ALIAS
+            )
+        other = Shop.objects.create(owner=self.user, name="Boshqa", phone="+998900000001")
+        self.assertEqual(other.shard, self.target)
+        self.assertEqual(sharding.shard_for(other.pk), self.target)
+
+    def test_allocated_ids_are_unique_across_shards(self):
+        existing = {
+            pk
+            for alias in sharding.aliases()
+            for model in (Sale, SaleArchive)
+            for pk in model.objects.using(alias).values_list("pk", flat=True)
+        }
+        first = sharding.allocate_ids(Sale, 250)
+        second = sharding.allocate_ids(Sale, 3)
+
+        self.assertEqual(len(set(first + second)), 253)
+        self.assertFalse(existing & set(first + second))
+
+        other = Shop.objects.create(owner=self.user, name="Boshqa", phone="+998900000001")
+        with sharding.use_shop(other):
+            product = Product.objects.create(
+                shop=other, name="Sut", price=Decimal("1000"), quantity=5, unit="dona"
+            )
+            sale = Sale.objects.create(
+                shop=other, product=product, quantity=1, unit_price=product.price, cashier=self.user
+            )
+        self.assertEqual(sale._state.db, self.target)
+        self.assertNotIn(sale.pk, existing | set(first + second))
+
+    def test_move_keeps_rows_ids_and_counters(self):
+        before = self.rows(self.source)
+        counters = self.counters(self.source)
+
+        copied = sharding.move_shop(self.shop.pk, self.target, grace=0)
+
+        self.assertEqual(copied["sale"], 3)
+        self.assertMoved(before, counters)
+        # Ko'chirilgan do'konda sotuv davom etadi, id lar to'qnashmaydi
+        with sharding.use_shop(self.shop.pk):
+            self.product = Product.objects.get(pk=self.product.pk)
+            sale = self.sell(1)
+        self.assertEqual(sale._state.db, self.target)
+        self.assertNotIn(sale.pk, before["sale"])
+        self.assertEqual(self.counters(self.target)["quantity"], counters["quantity"] - 1)
+
+        # Qaytarish: endi manba do'kon bazasi (nusxasi ham o'chiriladi)
+        before, counters = self.rows(self.target), self.counters(self.target)
+        self.source, self.target = self.target, self.source
+        sharding.move_shop(self.shop.pk, self.target, grace=0)
+        self.assertMoved(before, counters)
+
+    def test_rebalance_command_moves_shop(self):
+        before = self.rows(self.source)
+        counters = self.counters(self.source)
+        out = StringIO()
+
+        call_command(
+            "rebalance_shards",
+            "--move", str(self.shop.pk), "--to", self.target, "--grace", "0",
+            stdout=out,
+        )
+
+        self.assertIn("ko'chirildi", out.getvalue())
+        self.assertMoved(before, counters)
+
+    def test_move_aborts_when_copy_differs(self):
+        before = self.rows(self.source)
+        copy_shop = sharding.copy_shop
+
+        def lossy_copy(shop_id, source, target, batch_size):
+            # Nusxalash paytida yo'qolgan yozuv
+            copied = copy_shop(shop_id, source, target, batch_size)
+            Sale.objects.using(target).filter(pk=before["sale"][-1]).delete()
+            return copied
+
+        with mock.patch.object(sharding, "copy_shop", lossy_copy):
+            with self.assertRaises(sharding.ShardMoveError):
+                sharding.move_shop(self.shop.pk, self.target, grace=0)
+
+        shop = Shop.objects.using(DEFAULT_DB_ALIAS).get(pk=self.shop.pk)
+        self.assertEqual(shop.shard, self.source)
+        self.assertFalse(shop.is_moving)
+        self.assertEqual(self.rows(self.source), before)
+        self.assertTrue(all(not ids for ids in self.rows(self.target).values()))
+
+
+@skipUnless(sharding.enabled(), "SHOP_SHARDS=shard1,shard2 python manage.py test shop")
+class ShardMoveLockTests(ShopTransactionTestCase):
+    """Ko'chirish paytida manba bazaga boshqa yozuvchi kira olmaydi"""
+
+    def setUp(self):
+        super().setUp()
+        # Test bazalarini yaratish (migrate) tashqi kalit tekshiruvini qayta
+        # yoqib qo'yadi - do'kon bazalari settings.py dagidek ochilsin
+        for alias in sharding.aliases():
+            if alias != DEFAULT_DB_ALIAS:
+                connections[alias].close()
+        user = User.objects.create_user("kassir", password="x")
+        self.shop = Shop.objects.create(owner=user, name="Do'kon", phone="+998900000000")
+        with sharding.use_shop(self.shop):
+            self.product = Product.objects.create(
+                shop=self.shop, name="Non", price=Decimal("5000"), quantity=10, unit="dona"
+            )
+        self.source = self.shop.shard
+        self.target = next(alias for alias in sharding.aliases() if alias != self.source)
+
+    def test_writer_waits_until_shop_is_moved(self):
+        updated = []
+
+        def write():
+            try:
+                updated.append(
+                    Product.objects.using(self.source)
+                    .filter(pk=self.product.pk)
+                    .update(quantity=F("quantity") - 1)
+                )
+            finally:
+                connections[self.source].close()
+
+        copy_shop = sharding.copy_shop
+        writer = threading.Thread(target=write)
+
+        def copy_with_writer(*args):
+            writer.start()
+            writer.join(0.5)
+            self.assertTrue(writer.is_alive())
+            return copy_shop(*args)
+
+        with mock.patch.object(sharding, "copy_shop", copy_with_writer):
+            sharding.move_shop(self.shop.pk, self.target, grace=0)
+        writer.join()
+
+        # Yozuv ko'chirilgan nusxaga emas, o'chirilgan eski qatorga tushdi
+        self.assertEqual(updated, [0])
+        self.assertEqual(
+            Product.objects.using(self.target).get(pk=self.product.pk).quantity, 10
+        )
@@ -0,0 +1,113 @@
+# shop/throttle.py
+"""
+Login urinishlarini cheklash (token bucket).
+
+Har bir IP va har bir login uchun alohida "chelak": har urinish bitta token
+oladi, tokenlar vaqt o'tishi bilan to'ladi. Tekshiruv authenticate() dan
+oldin bajariladi - cheklangan urinish parol xeshlash (PBKDF2) ga yetib
+bormaydi. Holat SHOP_CACHE["ALIAS"] keshida saqlanadi, shuning uchun
+umumiy kesh (redis/file) bilan barcha worker lar uchun amal qiladi.
+locmem da har bir worker o'zicha sanaydi (N worker - N barobar urinish),
+shuning uchun DEBUG siz bunday sozlama tizim tekshiruvida xato beradi.
+"""
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core import checks
+
+from . import metrics
+from .cache import CACHE_ALIAS, get_cache
+
+logger = logging.getLogger(__name__)
+
+THROTTLE = getattr(settings, "SHOP_LOGIN_THROTTLE", {})
+
+DEFAULT_BUCKETS = {
+    "ip": {"CAPACITY": 20, "REFILL_PER_MINUTE": 10},
+    "username": {"CAPACITY": 5, "REFILL_PER_MINUTE": 1},
+}
+
+
+def _bucket_settings(scope):
+    return {**DEFAULT_BUCKETS[scope], **THROTTLE.get(scope.upper(), {})}
+
+
+def _key(scope, value):
+    digest = hashlib.md5(value.encode(), usedforsecurity=False).hexdigest()
+    return f"shop:throttle:login:{scope}:{digest}"
+
+
+def _take(scope, value, now):
+    """
+    Chelakdan bitta token olish. (ruxsat, qayta urinishgacha soniya).
+    get/set atomar emas - parallel so'rovlarda bir-ikki ortiqcha urinish
+    o'tishi mumkin, bu cheklov maqsadi uchun yetarli.
+    """
+    config = _bucket_settings(scope)
+    capacity = config["CAPACITY"]
+    rate = config["REFILL_PER_MINUTE"] / 60.0
+
+    cache = get_cache()
+    key = _key(scope, value)
+    tokens, updated = cache.get(key, (capacity, now))
+    tokens = min(capacity, tokens + (now - updated) * rate)
+
+    # To'liq to'lishi uchun kerak bo'lgan vaqtdan keyin kalit kerak emas
+    timeout = int(capacity / rate) + 1 if rate else None
+
+    if tokens < 1:
+        cache.set(key, (tokens, now), timeout)
+        return False, int((1 - tokens) / rate) + 1 if rate else None
+
+    cache.set(key, (tokens - 1, now), timeout)
+    return True, 0
+
+
+def client_ip(request):
+    header = THROTTLE.get("IP_HEADER")
+    if header and request.META.get(header):
+        # X-Forwarded-For: "mijoz, proxy1, proxy2"
+        return request.META[header].split(",")[0].strip()
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def check_login(request, username):
+    """
+    Login urinishiga ruxsat bormi. (True, 0) yoki (False, retry_after).
+    """
+    if not THROTTLE.get("ENABLED", True):
+        return True, 0
+
+    now = time.time()
+    checks = [("ip", client_ip(request)), ("username", username.strip().lower())]
+    for scope, value in checks:
+        allowed, retry_after = _take(scope, value, now)
+        if not allowed:
+            metrics.inc("shop_login_throttled_total", scope=scope)
+            logger.warning("Login cheklandi (%s): %s", scope, value)
+            return False, retry_after
+    return True, 0
+
+
+def reset_username(username):
+    """Muvaffaqiyatli kirishdan keyin login chelagini to'ldirish"""
+    get_cache().delete(_key("username", username.strip().lower()))
+
+
+@checks.register(checks.Tags.security)
+def check_shared_cache(app_configs, **kwargs):
+    """Cheklov holati barcha worker lar uchun umumiy keshda bo'lishi kerak"""
+    if not THROTTLE.get("ENABLED", True):
+        return []
+    backend = settings.CACHES[CACHE_ALIAS]["BACKEND"]
+    if not backend.endswith("LocMemCache"):
+        return []
+    message = (
+        "Login cheklovi locmem keshida - har bir worker urinishlarni alohida sanaydi"
+    )
+    hint = "CACHE_BACKEND=file yoki redis (yoki LOGIN_THROTTLE=False)"
+    if settings.DEBUG:
+        return [checks.Warning(message, hint=hint, id="shop.W001")]
+    return [checks.Error(message, hint=hint, id="shop.E001")]
@@ -0,0 +1,68 @@
+# shop/transitions.py
+"""
+Sotuv holati: faol <-> bekor qilingan.
+
+Har bir o'tish bitta tranzaksiyada: shartli UPDATE (WHERE is_cancelled =
+kutilgan holat), ombor va hisoblagichlarning F() o'zgarishi. Ikki kishi
+bir vaqtda bosganda faqat bittasining UPDATE i qatorni o'zgartiradi,
+ikkinchisi hech narsa qilmaydi - ombor ikki marta qaytarilmaydi.
+Tiklashda ombor yetmasa (mahsulot bu orada sotib bo'lingan) OutOfStock
+chiqadi va o'tish bekor qilinadi.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import metrics, sharding
+from .counters import record_cancel, record_restore
+from .models import Sale
+from .watermarks import touch_shop
+
+# o'tish: (kutilgan is_cancelled, yangi is_cancelled, hisoblagich, metrika)
+TRANSITIONS = {
+    "cancel": (False, True, record_cancel, "shop_sale_cancellations_total"),
+    "restore": (True, False, record_restore, "shop_sale_restores_total"),
+}
+
+
+def _transition(sale, name, **fields):
+    expected, target, record, metric = TRANSITIONS[name]
+
+    # Tranzaksiya va so'rovlar bitta (do'kon) bazasida
+    with sharding.use_shop(sale.shop_id) as alias, transaction.atomic(using=alias):
+        changed = Sale.objects.filter(pk=sale.pk, is_cancelled=expected).update(
+            is_cancelled=target, **fields
+        )
+        if changed:
+            # update() signal yubormaydi. Belgi hisoblagichdan oldin - jonli
+            # panel hodisasi (record ichida) yangi sotuv versiyasini ko'rsin
+            touch_shop(sale.shop_id, sales=True)
+            record(sale)
+
+    if not changed:
+        metrics.inc("shop_sale_transition_conflicts_total", transition=name)
+        return False
+
+    sale.is_cancelled = target
+    for field, value in fields.items():
+        setattr(sale, field, value)
+    metrics.inc(metric, shop_id=sale.shop_id)
+    return True
+
+
+def cancel_sale(sale, user):
+    """Sotuvni bekor qilish. False - sotuv allaqachon bekor qilingan"""
+    return _transition(sale, "cancel", cancelled_by=user, cancelled_at=timezone.now())
+
+
+def restore_sale(sale, user, reason=""):
+    """
+    Bekor qilingan sotuvni tiklash. False - sotuv bekor qilinmagan,
+    OutOfStock - omborda yetarli mahsulot yo'q
+    """
+    return _transition(
+        sale,
+        "restore",
+        restored_by=user,
+        restored_at=timezone.now(),
+        restoration_reason=reason,
+    )
@@ -1,6 +1,6 @@
 # shop/urls.py
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     # Auth
@@ -16,6 +16,7 @@ urlpatterns = [
         "shop/<int:shop_id>/settings/", views.shop_settings_view, name="shop_settings"
     ),
     path("shop/<int:shop_id>/add-staff/", views.add_staff_view, name="add_staff"),
+    path("shop/<int:shop_id>/events/", views.shop_events, name="shop_events"),
     # Product Management
     path("shop/<int:shop_id>/add-product/", views.add_product_view, name="add_product"),
     path("product/<int:product_id>/", views.product_detail_view, name="product_detail"),
@@ -30,11 +31,24 @@ urlpatterns = [
     # Sales
     path("sale/<int:sale_id>/restore/", views.restore_sale_view, name="restore_sale"),
     path("shop/<int:shop_id>/sell/", views.sell_product_view, name="sell_product"),
+    path("shop/<int:shop_id>/scan/", views.scan_product_view, name="scan_product"),
     path("shop/<int:shop_id>/sales/", views.sales_history_view, name="sales_history"),
+    # Egasining umumiy hisoboti
+    path("report/", views.owner_report_view, name="owner_report"),
+    path("report/json/", views.owner_report_json, name="owner_report_json"),
     path("sale/<int:sale_id>/cancel/", views.cancel_sale_view, name="cancel_sale"),
     # bot/urls.py (yangi fayl)
     path('webhook/', views.telegram_webhook, name='telegram_webhook'),
     path('status/', views.bot_status, name='bot_status'),
     path('users/', views.telegram_users, name='telegram_users'),
+    path("cache-stats/", views.cache_stats, name="cache_stats"),
+    path("metrics", views.metrics_view, name="metrics"),
+    # POS API
+    path("api/shops/<int:shop_id>/catalog/", api.pos_catalog, name="api_pos_catalog"),
+    path(
+        "api/shops/<int:shop_id>/sales/sync/",
+        api.pos_sync_sales,
+        name="api_pos_sync_sales",
+    ),
 
 ]
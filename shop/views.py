@@ -2,15 +2,22 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
-from .decorators import owner_required
+from .decorators import conditional_page, idempotent, owner_required
+import asyncio
 import logging
 import json
+from asgiref.sync import sync_to_async
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.db.models import Sum, Q
-from django.http import JsonResponse
+from django.db import transaction
+from django.db.models import Q
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from datetime import datetime, timedelta
 from decimal import Decimal
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.utils.dateparse import parse_date
 from .models import (
     Shop,
     ShopApplication,
@@ -19,6 +26,7 @@ from .models import (
     Product,
     ProductIncome,
     Sale,
+    normalize_barcode,
 )
 from .forms import (
     RegisterForm,
@@ -30,6 +38,14 @@ from .forms import (
     SaleForm,
 )
 from .telegram_utils import send_application_to_admin
+from . import events, facets, metrics, sharding, throttle
+from .stats import get_bot_counts, get_shop_stats
+from .counters import OutOfStock, record_sale
+from .transitions import cancel_sale, restore_sale
+from .archive import get_archived_before, sales_in_range
+from .reports import get_owner_report
+from .watermarks import product_watermarks, shop_watermarks
+from .cache import SHOP_CATALOG, attach_shop_versions, get_cache_stats, get_version
 
 
 def register_view(request):
@@ -64,9 +80,23 @@ def login_view(request):
         if form.is_valid():
             username = form.cleaned_data["username"]
             password = form.cleaned_data["password"]
+
+            # Cheklov parol xeshlashdan (authenticate) oldin tekshiriladi
+            allowed, retry_after = throttle.check_login(request, username)
+            if not allowed:
+                messages.error(
+                    request,
+                    "Juda ko'p urinish! Iltimos, birozdan keyin qayta urinib ko'ring.",
+                )
+                response = render(request, "shop/login.html", {"form": form}, status=429)
+                if retry_after:
+                    response["Retry-After"] = str(retry_after)
+                return response
+
             user = authenticate(request, username=username, password=password)
 
             if user is not None:
+                throttle.reset_username(username)
                 login(request, user)
                 messages.success(request, f"Xush kelibsiz, {user.username}!")
                 return redirect("home")
@@ -88,6 +118,7 @@ def logout_view(request):
 
 # shop/views.py ga yangi funksiya qo'shing
 @login_required
+@idempotent("restore_sale")
 def restore_sale_view(request, sale_id):
     """Bekor qilingan sotuvni qayta tiklash (faqat glavniy admin)"""
     sale = get_object_or_404(Sale, id=sale_id)
@@ -108,20 +139,17 @@ def restore_sale_view(request, sale_id):
         # Formadan sabab olish
         restoration_reason = request.POST.get("restoration_reason", "")
 
-        # Sotuvni qayta tiklash
-        sale.is_cancelled = False
-        sale.restored_by = request.user
-        sale.restoration_reason = restoration_reason
-        from django.utils import timezone
-
-        sale.restored_at = timezone.now()
-        sale.save()
+        # Sotuvni qayta tiklash va mahsulot miqdorini kamaytirish
+        try:
+            restored = restore_sale(sale, request.user, restoration_reason)
+        except OutOfStock as exc:
+            messages.error(request, str(exc))
+            return redirect("sales_history", shop_id=shop.id)
+        if not restored:
+            messages.warning(request, "Bu sotuv allaqachon bekor qilinmagan!")
+            return redirect("sales_history", shop_id=shop.id)
 
-        # Mahsulot miqdorini kamaytirish (qaytadan sotilgani uchun)
         product = sale.product
-        product.quantity -= sale.quantity
-        product.save()
-
         messages.success(
             request,
             f"Sotuv qayta tiklandi! {sale.quantity} dona {product.name} qaytadan sotildi deb hisoblandi.",
@@ -141,10 +169,12 @@ def restore_sale_view(request, sale_id):
 def home_view(request):
     """Asosiy sahifa"""
 
-    # Barcha do‘konlar (egasi yoki xodimi bo‘lgan)
+    # Barcha do‘konlar (egasi yoki xodimi bo‘lgan). Xodimlar do'kon
+    # bazalarida (sharding.py) - JOIN o'rniga id lar ro'yxati
     all_shops = Shop.objects.filter(
-        Q(owner=request.user) | Q(staff__user=request.user), is_active=True
-    ).distinct()
+        Q(owner=request.user) | Q(pk__in=sharding.staff_shop_ids(request.user.id)),
+        is_active=True,
+    )
 
     # Egasi bo‘lgan do‘konlar
     owned_shops = all_shops.filter(owner=request.user)
@@ -162,8 +192,11 @@ def home_view(request):
         user=request.user, status="rejected"
     ).order_by("-updated_at")[:3]
 
+    shops = attach_shop_versions(all_shops)
+
     context = {
-        "shops": all_shops,
+        "shops": shops,
+        "total_shops_count": len(shops),
         "owned_shops": owned_shops,
         "staff_shops": staff_shops,
         "pending_applications": pending_applications,
@@ -202,9 +235,12 @@ def shop_application_view(request):
 
 
 @login_required
+@conditional_page(shop_watermarks)
 def shop_detail_view(request, shop_id):
     """Do'kon tafsilotlari"""
-    shop = get_object_or_404(Shop, id=shop_id, is_active=True)
+    shop = get_object_or_404(
+        Shop.objects.using(sharding.current()), id=shop_id, is_active=True
+    )
 
     # Foydalanuvchi huquqlarini tekshirish
     is_owner = shop.owner == request.user
@@ -214,44 +250,36 @@ def shop_detail_view(request, shop_id):
         messages.error(request, "Sizda bu do'konni ko'rish huquqi yo'q!")
         return redirect("home")
 
-    # Mahsulotlar
-    products = Product.objects.filter(shop=shop)
-
-    # To'liq statistika
-    total_products_count = products.count()
-    total_products_quantity = products.aggregate(total=Sum("quantity"))["total"] or 0
-
-    # Jami sotuv
-    total_sales = shop.get_total_sales_amount()
-    total_sales_quantity = shop.get_total_sales_quantity()
-
-    # Bekor qilingan
-    total_cancelled = shop.get_total_cancelled_amount()
-    cancelled_quantity = (
-        shop.sales.filter(is_cancelled=True).aggregate(total=Sum("quantity"))["total"]
-        or 0
+    # Mahsulotlar: fasetlar (keshdan), filtr va sahifa
+    selected = facets.parse_filters(request.GET)
+    facet_list, products_total = facets.build_facets(facets.get_facet_rows(shop.id), selected)
+    page = facets.paginate(products_total, selected, request.GET.get("page"))
+    products = (
+        facets.filter_products(Product.objects.filter(shop=shop), selected)
+        .select_related("category")
+        .order_by("-created_at", "-id")[page["offset"] : page["limit"]]
     )
-
-    # Qolgan mahsulotlarning qiymati
-    remaining_value = shop.get_remaining_value()
-
-    # Foydalar
-    net_sales = total_sales - total_cancelled
+    # Oqim (events.snapshot) solishtiradigan belgilar - o'sha funksiyadan
+    catalog_mark, sales_mark = shop_watermarks(shop.id)
 
     context = {
         "shop": shop,
         "products": products,
+        "facets": facet_list,
+        "selected_filters": selected,
+        "products_total": products_total,
+        "page": page,
         "is_owner": is_owner,
         "staff_position": staff_position,
-        "total_products_count": total_products_count,
-        "total_products_quantity": total_products_quantity,
-        "total_sales": total_sales,
-        "total_sales_quantity": total_sales_quantity,
-        "total_cancelled": total_cancelled,
-        "cancelled_quantity": cancelled_quantity,
-        "remaining_value": remaining_value,
-        "net_sales": net_sales,
+        # Mahsulotlar jadvali shu versiya, filtr va sahifa bo'yicha keshlanadi
+        "catalog_version": get_version(SHOP_CATALOG, shop.id),
+        "products_key": facets.cache_key(selected, page),
+        # Jonli hodisalar oqimi shu belgilardan keyingi o'zgarishlarni yuboradi
+        "live_catalog": events.to_micros(catalog_mark),
+        "live_sales": events.to_micros(sales_mark),
     }
+    # To'liq statistika (keshdan)
+    context.update(get_shop_stats(shop.id))
 
     return render(request, "shop/shop_detail.html", context)
 
@@ -270,19 +298,16 @@ def shop_settings_view(request, shop_id):
     else:
         form = ShopForm(instance=shop)
 
-    # Qo'shimcha statistika
-    total_products = shop.get_total_products()
-    total_sales = shop.get_total_sales_amount()
-    total_cancelled = shop.get_total_cancelled_amount()
-    remaining_value = shop.get_remaining_value()
+    # Qo'shimcha statistika (keshdan)
+    stats = get_shop_stats(shop.id)
 
     context = {
         "shop": shop,
         "form": form,
-        "total_products": total_products,
-        "total_sales": total_sales,
-        "total_cancelled": total_cancelled,
-        "remaining_value": remaining_value,
+        "total_products": stats["total_products_count"],
+        "total_sales": stats["total_sales"],
+        "total_cancelled": stats["total_cancelled"],
+        "remaining_value": stats["remaining_value"],
     }
 
     return render(request, "shop/shop_settings.html", context)
@@ -324,7 +349,9 @@ def add_staff_view(request, shop_id):
     else:
         form = StaffForm()
 
-    staff_list = ShopStaff.objects.filter(shop=shop).select_related("user", "added_by")
+    staff_list = sharding.select_related(
+        ShopStaff.objects.filter(shop=shop), "user", "added_by"
+    )
 
     return render(
         request,
@@ -349,7 +376,7 @@ def add_product_view(request, shop_id):
         return redirect("shop_detail", shop_id=shop.id)
 
     if request.method == "POST":
-        form = ProductForm(request.POST, request.FILES)
+        form = ProductForm(request.POST, request.FILES, shop=shop)
         if form.is_valid():
             # Narxni tozalash (bo'shliqlarni olib tashlash)
             price = form.cleaned_data.get("price", "0")
@@ -400,6 +427,7 @@ def add_product_view(request, shop_id):
 
 
 @login_required
+@conditional_page(product_watermarks)
 def product_detail_view(request, product_id):
     """Mahsulot tafsilotlari"""
     product = get_object_or_404(Product, id=product_id)
@@ -413,20 +441,18 @@ def product_detail_view(request, product_id):
         messages.error(request, "Sizda bu mahsulotni ko'rish huquqi yo'q!")
         return redirect("home")
 
-    # To'liq statistika
-    total_income = product.get_total_income()
-    total_sold = product.get_total_sold()
+    # To'liq statistika (mahsulot hisoblagichlaridan)
+    total_income = product.total_income_qty
+    total_sold = product.sold_qty
     remaining = product.get_remaining()
-    total_revenue = product.get_total_revenue()
+    total_revenue = product.revenue
     total_value = product.get_total_value()
 
     # Tarix
-    income_history = ProductIncome.objects.filter(product=product).select_related(
-        "added_by"
-    )[:10]
-    sales_history = Sale.objects.filter(product=product).select_related(
-        "cashier", "cancelled_by"
+    income_history = sharding.select_related(
+        ProductIncome.objects.filter(product=product), "added_by"
     )[:10]
+    sales_history = sales_in_range(shop.id, product_id=product.id, limit=10)
 
     context = {
         "product": product,
@@ -518,6 +544,7 @@ def delete_product_view(request, product_id):
 
 
 @login_required
+@idempotent("sell_product")
 def sell_product_view(request, shop_id):
     """Mahsulot sotish"""
     shop = get_object_or_404(Shop, id=shop_id)
@@ -550,18 +577,24 @@ def sell_product_view(request, shop_id):
                 sale.unit_price = product.price
                 sale.total_amount = Decimal(str(quantity)) * product.price
                 sale.cashier = request.user
-                sale.save()
 
-                # Mahsulot miqdorini kamaytirish
-                product.quantity -= quantity
-                product.save()
-
-                messages.success(
-                    request,
-                    f"Sotuv muvaffaqiyatli! {quantity} dona {product.name} sotildi. "
-                    f"Summa: {sale.total_amount:,.0f} so'm",
-                )
-                return redirect("shop_detail", shop_id=shop.id)
+                # Mahsulot miqdorini kamaytirish - parallel sotuv ombordagi
+                # qoldiqni olib qo'ygan bo'lsa sotuv ham yozilmaydi
+                try:
+                    with transaction.atomic(using=sharding.shard_for(shop)):
+                        sale.save()
+                        record_sale(sale)
+                except OutOfStock as exc:
+                    messages.error(request, str(exc))
+                else:
+                    metrics.inc("shop_sales_total", shop_id=shop.id)
+
+                    messages.success(
+                        request,
+                        f"Sotuv muvaffaqiyatli! {quantity} dona {product.name} sotildi. "
+                        f"Summa: {sale.total_amount:,.0f} so'm",
+                    )
+                    return redirect("shop_detail", shop_id=shop.id)
     else:
         form = SaleForm(shop=shop)
 
@@ -573,6 +606,49 @@ def sell_product_view(request, shop_id):
 
 
 @login_required
+def scan_product_view(request, shop_id):
+    """
+    Skaner: ?code=<shtrix-kod> -> mahsulot, narx va qoldiq (JSON).
+    Huquq ham shu so'rovda tekshiriladi - (shop, barcode) indeksi bo'yicha
+    bitta SELECT. Begona do'kon kodi "topilmadi" bilan bir xil javob oladi.
+    """
+    code = normalize_barcode(request.GET.get("code"))
+    if not code:
+        return JsonResponse({"status": "error", "message": "Kod berilmagan"}, status=400)
+
+    product = (
+        Product.objects.filter(shop_id=shop_id, barcode=code)
+        .filter(Q(shop__owner=request.user) | Q(shop__staff__user=request.user))
+        .values("id", "name", "price", "quantity", "unit", "barcode")
+        .first()
+    )
+    if product is None:
+        metrics.inc("shop_barcode_scans_total", result="not_found")
+        return JsonResponse(
+            {"status": "not_found", "message": "Mahsulot topilmadi"}, status=404
+        )
+
+    metrics.inc("shop_barcode_scans_total", result="found")
+    return JsonResponse(
+        {"status": "ok", "product": {**product, "price": str(product["price"])}}
+    )
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def _date_range(request):
+    """?date_from=YYYY-MM-DD&date_to=YYYY-MM-DD -> (sanalar, [start, end) oralig'i)"""
+    date_from = parse_date(request.GET.get("date_from") or "")
+    date_to = parse_date(request.GET.get("date_to") or "")
+    start = _start_of_day(date_from) if date_from else None
+    end = _start_of_day(date_to + timedelta(days=1)) if date_to else None
+    return date_from, date_to, start, end
+
+
+@login_required
+@conditional_page(shop_watermarks)
 def sales_history_view(request, shop_id):
     """Sotuvlar tarixi"""
     shop = get_object_or_404(Shop, id=shop_id)
@@ -585,39 +661,27 @@ def sales_history_view(request, shop_id):
         messages.error(request, "Sizda sotuvlarni ko'rish huquqi yo'q!")
         return redirect("home")
 
-    sales = (
-        Sale.objects.filter(shop=shop)
-        .select_related("product", "cashier", "cancelled_by")
-        .order_by("-created_at")
-    )
-
-    # To'liq statistika
-    total_sales = sales.filter(is_cancelled=False).aggregate(total=Sum("total_amount"))[
-        "total"
-    ] or Decimal("0.00")
+    # Sana oralig'i (?date_from=YYYY-MM-DD&date_to=YYYY-MM-DD). Oraliq
+    # berilmasa faqat arxivlanmagan (oxirgi) sotuvlar ko'rsatiladi, arxiv
+    # esa oraliq arxivlangan davrga tushgandagina o'qiladi.
+    date_from, date_to, start, end = _date_range(request)
+    archived_before = get_archived_before(shop.id)
+    sales = sales_in_range(shop.id, start=start or archived_before, end=end)
 
-    total_sales_quantity = (
-        sales.filter(is_cancelled=False).aggregate(total=Sum("quantity"))["total"] or 0
-    )
-
-    total_cancelled = sales.filter(is_cancelled=True).aggregate(
-        total=Sum("total_amount")
-    )["total"] or Decimal("0.00")
-
-    cancelled_quantity = (
-        sales.filter(is_cancelled=True).aggregate(total=Sum("quantity"))["total"] or 0
-    )
-
-    net_sales = total_sales - total_cancelled
+    # To'liq statistika (keshdan)
+    stats = get_shop_stats(shop.id)
 
     context = {
         "shop": shop,
         "sales": sales,
-        "total_sales": total_sales,
-        "total_sales_quantity": total_sales_quantity,
-        "total_cancelled": total_cancelled,
-        "cancelled_quantity": cancelled_quantity,
-        "net_sales": net_sales,
+        "date_from": date_from,
+        "date_to": date_to,
+        "archived_before": archived_before,
+        "total_sales": stats["total_sales"],
+        "total_sales_quantity": stats["total_sales_quantity"],
+        "total_cancelled": stats["total_cancelled"],
+        "cancelled_quantity": stats["cancelled_quantity"],
+        "net_sales": stats["net_sales"],
         "is_owner": is_owner,
         "staff_position": staff_position,
     }
@@ -626,6 +690,7 @@ def sales_history_view(request, shop_id):
 
 
 @login_required
+@idempotent("cancel_sale")
 def cancel_sale_view(request, sale_id):
     """Sotuvni bekor qilish"""
     sale = get_object_or_404(Sale, id=sale_id)
@@ -649,19 +714,13 @@ def cancel_sale_view(request, sale_id):
         return redirect("sales_history", shop_id=shop.id)
 
     if request.method == "POST":
-        # Sotuvni bekor qilish
-        sale.is_cancelled = True
-        sale.cancelled_by = request.user
-        from django.utils import timezone
-
-        sale.cancelled_at = timezone.now()
-        sale.save()
+        # Sotuvni bekor qilish va mahsulot miqdorini qaytarish (bitta
+        # tranzaksiyada; parallel bosilgan ikkinchi so'rov hech narsa qilmaydi)
+        if not cancel_sale(sale, request.user):
+            messages.warning(request, "Bu sotuv allaqachon bekor qilingan!")
+            return redirect("sales_history", shop_id=shop.id)
 
-        # Mahsulot miqdorini qaytarish
         product = sale.product
-        product.quantity += sale.quantity
-        product.save()
-
         messages.success(
             request,
             f"Sotuv bekor qilindi! {sale.quantity} dona {product.name} omborda qaytarildi.",
@@ -675,59 +734,250 @@ logger = logging.getLogger(__name__)
 
 
 @csrf_exempt
-def telegram_webhook(request):
-    """Telegram webhook"""
+async def telegram_webhook(request):
+    """Telegram webhook (asinxron - javobni kutayotganda oqim band qilinmaydi)"""
     if request.method == "POST":
         try:
             data = json.loads(request.body)
-            logger.info(f"Webhook data: {data}")
+            logger.info("Webhook data: %s", data)
 
             # Bu yerda webhook ma'lumotlarini qayta ishlash
             # Aslida bot polling orqali ishlaydi, lekin webhook ham qo'shish mumkin
 
             return JsonResponse({"status": "ok"})
         except Exception as e:
-            logger.error(f"Webhook xatolik: {e}")
+            logger.error("Webhook xatolik: %s", e)
             return JsonResponse({"status": "error", "message": str(e)})
 
     return JsonResponse({"status": "method not allowed"}, status=405)
 
 
 @login_required
-def bot_status(request):
+async def bot_status(request):
     """Bot holati"""
     from django.conf import settings
 
+    counts = await sync_to_async(get_bot_counts)()
     status = {
         "bot_username": "ShopControlBot",
         "is_active": True,
         "admin_chat_id": settings.TELEGRAM_ADMIN_CHAT_ID,
-        "total_users": 0,  # Bu yerda haqiqiy ma'lumotlar
-        "pending_applications": 0,
+        **counts,
     }
 
     return JsonResponse(status)
 
 
-@login_required
-def telegram_users(request):
-    """Telegram foydalanuvchilari"""
+TELEGRAM_USER_FIELDS = (
+    "id",
+    "user__username",
+    "telegram_id",
+    "username",
+    "phone",
+    "is_bot_active",
+    "created_at",
+)
+
+
+def _telegram_user_json(row):
+    return json.dumps(
+        {
+            "id": row["id"],
+            "username": row["user__username"],
+            "telegram_id": row["telegram_id"],
+            "telegram_username": row["username"],
+            "phone": row["phone"],
+            "is_active": row["is_bot_active"],
+            "created_at": row["created_at"].strftime("%d.%m.%Y %H:%M"),
+        },
+        ensure_ascii=False,
+    )
+
+
+def _telegram_users_page(request):
+    """
+    Filtrlar va kursor (?after=<id>) bo'yicha queryset. OFFSET ishlatilmaydi -
+    uzoq sahifalar ham indeks bo'yicha boshlanadi.
+    """
+    from django.conf import settings
     from shop.models import TelegramUser
 
-    users = TelegramUser.objects.all().select_related("user")
-    user_list = []
-
-    for user in users:
-        user_list.append(
-            {
-                "id": user.id,
-                "username": user.user.username,
-                "telegram_id": user.telegram_id,
-                "telegram_username": user.username,
-                "phone": user.phone,
-                "is_active": user.is_bot_active,
-                "created_at": user.created_at.strftime("%d.%m.%Y %H:%M"),
-            }
+    api = settings.SHOP_API
+    try:
+        page_size = int(request.GET.get("page_size") or api["TELEGRAM_USERS_PAGE_SIZE"])
+        after = int(request.GET.get("after") or 0)
+    except ValueError:
+        return None, None
+    page_size = max(1, min(page_size, api["TELEGRAM_USERS_MAX_PAGE_SIZE"]))
+
+    users = TelegramUser.objects.filter(id__gt=after)
+    is_active = request.GET.get("is_active")
+    if is_active in ("true", "1"):
+        users = users.filter(is_bot_active=True)
+    elif is_active in ("false", "0"):
+        users = users.filter(is_bot_active=False)
+    if request.GET.get("language"):
+        users = users.filter(language=request.GET["language"])
+    query = request.GET.get("q", "").strip()
+    if query:
+        users = users.filter(
+            Q(username__icontains=query)
+            | Q(user__username__icontains=query)
+            | Q(phone__icontains=query)
         )
 
-    return JsonResponse({"users": user_list})
+    return users.order_by("id").values(*TELEGRAM_USER_FIELDS)[:page_size], page_size
+
+
+def _next_page_url(request, last_id):
+    params = request.GET.copy()
+    params["after"] = last_id
+    return f"{request.path}?{params.urlencode()}"
+
+
+@login_required
+async def telegram_users(request):
+    """
+    Telegram foydalanuvchilari - sahifalab, JSON oqim sifatida.
+    Qatorlar values() dan bo'laklab o'qiladi va darhol yoziladi, butun
+    ro'yxat xotirada yig'ilmaydi.
+    """
+    rows, page_size = _telegram_users_page(request)
+    if rows is None:
+        return JsonResponse({"status": "error", "message": "Noto'g'ri parametr"}, status=400)
+
+    chunk_size = min(page_size, 500)
+
+    def tail(count, last_id):
+        next_url = _next_page_url(request, last_id) if count == page_size else None
+        return f'], "next": {json.dumps(next_url)}}}'
+
+    async def stream_async():
+        count, last_id = 0, None
+        yield '{"users": ['
+        async for row in rows.aiterator(chunk_size=chunk_size):
+            yield ("," if count else "") + _telegram_user_json(row)
+            count, last_id = count + 1, row["id"]
+        yield tail(count, last_id)
+
+    def stream_sync():
+        count, last_id = 0, None
+        yield '{"users": ['
+        for row in rows.iterator(chunk_size=chunk_size):
+            yield ("," if count else "") + _telegram_user_json(row)
+            count, last_id = count + 1, row["id"]
+        yield tail(count, last_id)
+
+    # WSGI async iteratorni to'liq xotiraga yig'adi - u yerda sinxron oqim
+    stream = stream_async() if hasattr(request, "scope") else stream_sync()
+    return StreamingHttpResponse(stream, content_type="application/json")
+
+
+@login_required
+async def shop_events(request, shop_id):
+    """
+    Do'kon paneli uchun Server-Sent Events oqimi (shop/events.py).
+    Faqat ASGI da: WSGI da har bir ochiq panel butun oqimni band qiladi,
+    shuning uchun 204 - brauzer qayta ulanmaydi, panel oddiy ishlaydi.
+    """
+    from django.conf import settings
+
+    if not hasattr(request, "scope") or not settings.SHOP_EVENTS["ENABLED"]:
+        return HttpResponse(status=204)
+
+    user = await request.auser()
+    # Xodimlar jadvali do'kon bazasida, do'kon nusxasi ham o'sha yerda
+    allowed = await Shop.objects.using(sharding.current()).filter(
+        Q(owner=user) | Q(staff__user=user), pk=shop_id, is_active=True
+    ).aexists()
+    if not allowed:
+        return HttpResponse(status=403)
+
+    try:
+        seen = (
+            events.from_micros(int(request.GET["catalog"])),
+            events.from_micros(int(request.GET["sales"])),
+        )
+    except (KeyError, ValueError, OverflowError):
+        seen = None
+    heartbeat = settings.SHOP_EVENTS["HEARTBEAT"]
+
+    async def stream():
+        nonlocal seen
+        subscriber = events.subscribe(shop_id)
+        try:
+            yield f"retry: {settings.SHOP_EVENTS['RETRY_MS']}\n\n"
+            # Sahifa ochilgandan (yoki uzilishdan) beri bo'lgan o'zgarishlar
+            seen, message = await sync_to_async(events.snapshot)(shop_id, seen)
+            if message:
+                yield message
+            while True:
+                try:
+                    yield await asyncio.wait_for(subscriber.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    seen, message = await sync_to_async(events.snapshot)(shop_id, seen)
+                    yield message or ": ping\n\n"
+        finally:
+            events.unsubscribe(subscriber)
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # nginx proksi javobni buferlamasligi uchun
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@login_required
+def owner_report_view(request):
+    """Egasining barcha do'konlari bo'yicha umumiy hisobot"""
+    date_from, date_to, start, end = _date_range(request)
+    report = get_owner_report(request.user.id, start, end)
+
+    if not report["shops"]:
+        messages.info(request, "Sizda egasi bo'lgan faol do'kon yo'q.")
+        return redirect("home")
+
+    context = {
+        "report": report,
+        "date_from": date_from,
+        "date_to": date_to,
+    }
+    return render(request, "shop/owner_report.html", context)
+
+
+@login_required
+def owner_report_json(request):
+    """Umumiy hisobot (JSON)"""
+    _date_from, _date_to, start, end = _date_range(request)
+    return JsonResponse(get_owner_report(request.user.id, start, end))
+
+
+@login_required
+async def cache_stats(request):
+    """Kesh hit/miss statistikasi (faqat superuser)"""
+    user = await request.auser()
+    if not user.is_superuser:
+        return JsonResponse({"status": "forbidden"}, status=403)
+
+    return JsonResponse(get_cache_stats())
+
+
+def metrics_view(request):
+    """Prometheus uchun metrikalar"""
+    from django.conf import settings
+
+    # Sotuv hisoblagichlari do'konlar bo'yicha - ochiq berilmaydi: token
+    # bo'lsa Bearer token, bo'lmasa faqat xodim (admin sessiyasi)
+    token = settings.SHOP_METRICS.get("TOKEN")
+    if token:
+        authorized = constant_time_compare(
+            request.headers.get("Authorization", ""), f"Bearer {token}"
+        )
+    else:
+        authorized = request.user.is_authenticated and request.user.is_staff
+    if not authorized:
+        return HttpResponse("Unauthorized", status=401, content_type="text/plain")
+
+    return HttpResponse(
+        metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
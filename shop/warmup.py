@@ -0,0 +1,144 @@
+# shop/warmup.py
+"""
+Worker ishga tushganda "isitish".
+
+Deploy yoki worker qayta tug'ilgandan keyingi birinchi so'rovlar sekin:
+shablonlar kompilyatsiya qilinadi, URL resolver quriladi, bazaga ulanish
+ochiladi, keshlar bo'sh. warm_up() bularning hammasini so'rov kelishidan
+oldin bajaradi (website/gunicorn_conf.py dagi post_worker_init).
+"""
+import logging
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import F, Max
+from django.template import TemplateDoesNotExist, TemplateSyntaxError
+from django.template.loader import get_template
+from django.urls import get_resolver
+
+logger = logging.getLogger("shop.perf")
+
+WARMUP = getattr(settings, "SHOP_WARMUP", {})
+
+
+def warm_code():
+    """View, admin va URL resolver ni yuklash"""
+    from django.contrib import admin
+
+    from . import views  # noqa: F401
+
+    # shop.admin ni admin.autodiscover() allaqachon yuklagan
+    resolver = get_resolver()
+    resolver.reverse_dict  # noqa: B018 - resolver ichki jadvallarini quradi
+    admin.site.get_urls()
+
+
+def precompile_templates():
+    """
+    templates/shop dagi barcha shablonlarni kompilyatsiya qilish.
+    Keshlangan loader (DEBUG=False) bilan natija worker xotirasida qoladi.
+    """
+    base = Path(settings.BASE_DIR) / "templates"
+    names = ["base.html"] + [
+        path.relative_to(base).as_posix() for path in sorted((base / "shop").glob("*.html"))
+    ]
+    compiled = 0
+    for name in names:
+        try:
+            get_template(name)
+            compiled += 1
+        except (TemplateDoesNotExist, TemplateSyntaxError) as e:
+            logger.warning("Shablon kompilyatsiya qilinmadi: %s (%s)", name, e)
+    return compiled
+
+
+def prime_connections():
+    """
+    Bazaga ulanishni ochish (SQLite PRAGMA lari init_command da bajariladi).
+    Django ulanishlari oqimga bog'langan - faqat shu (asosiy) oqim uchun
+    ochiladi. Shuning uchun faqat so'rovlarni asosiy oqimda bajaradigan
+    sinxron worker da foydali; gthread/ASGI worker larda so'rovlar boshqa
+    oqimlarda bajariladi va warm_up(prime=False) bilan bu bosqich o'tkaziladi.
+    """
+    for connection in connections.all():
+        connection.ensure_connection()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+
+
+def prefill_caches():
+    """Oxirgi sotuvlari eng yangi bo'lgan do'konlar statistikasini keshlash"""
+    from . import sharding
+    from .models import Sale, Shop
+    from .stats import get_shop_stats
+
+    limit = WARMUP.get("PREFILL_SHOPS", 20)
+    if not limit:
+        return 0
+
+    if sharding.enabled():
+        # Sotuvlar do'kon bazalarida - JOIN o'rniga har bir bazadan oxirgi sotuv
+        last_sale = {}
+        for alias in sharding.aliases():
+            last_sale.update(
+                Sale.objects.using(alias)
+                .values("shop_id")
+                .annotate(last=Max("created_at"))
+                .order_by()
+                .values_list("shop_id", "last")
+            )
+        shops = Shop.objects.filter(is_active=True).values_list("id", flat=True)
+        shop_ids = sorted(
+            shops,
+            key=lambda shop_id: (shop_id in last_sale, last_sale.get(shop_id), shop_id),
+            reverse=True,
+        )[:limit]
+    else:
+        shop_ids = list(
+            Shop.objects.filter(is_active=True)
+            .annotate(last_sale=Max("sales__created_at"))
+            .order_by(F("last_sale").desc(nulls_last=True), "-id")
+            .values_list("id", flat=True)[:limit]
+        )
+    for shop_id in shop_ids:
+        with sharding.use_shop(shop_id):
+            get_shop_stats(shop_id)
+    return len(shop_ids)
+
+
+def warm_up(prime=True):
+    """prime=False - so'rovlar asosiy oqimda bajarilmaydi (prime_connections)"""
+    if not WARMUP.get("ENABLED", True):
+        return
+
+    started = time.perf_counter()
+    timings = {}
+    result = {}
+
+    steps = [("code", warm_code), ("templates", precompile_templates)]
+    if prime:
+        steps.append(("connections", prime_connections))
+    steps.append(("caches", prefill_caches))
+
+    for name, step in steps:
+        step_started = time.perf_counter()
+        try:
+            result[name] = step()
+        except Exception:
+            # Isitish ixtiyoriy - xato worker ni to'xtatmasligi kerak
+            logger.exception("Isitish bosqichi xato bilan tugadi: %s", name)
+        timings[name] = round((time.perf_counter() - step_started) * 1000, 1)
+
+    logger.info(
+        "Worker isitildi: %.0f ms",
+        (time.perf_counter() - started) * 1000,
+        extra={
+            "warmup": {
+                "ms": timings,
+                "templates": result.get("templates"),
+                "shops": result.get("caches"),
+            }
+        },
+    )
@@ -0,0 +1,73 @@
+# shop/watermarks.py
+"""
+Do'kon o'zgarish belgilari.
+
+Kesh versiyalari (cache.py) faqat keshda yashaydi - kesh tozalansa yoki
+kalit chiqarib yuborilsa versiya yo'qolishi mumkin. Shartli GET
+(304) uchun esa eskirgan belgi xato sahifa ko'rsatadi, shuning uchun
+belgilar bazada ham saqlanadi: Shop.catalog_changed_at va
+Shop.sales_changed_at. Mahsulot belgisi - Product.updated_at (save() va
+counters.py dagi har bir o'zgarishda yangilanadi).
+
+Bazalar bo'lingan bo'lsa (sharding.py) do'kon belgilari do'kon bazasidagi
+nusxada yoziladi va o'qiladi - har sotuvdagi yozish "default" ni qulflamaydi.
+"""
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from . import cache as shop_cache
+from . import sharding
+from .models import Product, Shop, ShopStaff
+
+
+def touch_shop(shop_id, catalog=False, sales=False):
+    """
+    Bazadagi belgi joriy tranzaksiya bilan birga yoziladi, kesh versiyasi
+    esa commit dan keyin yangilanadi - aks holda parallel so'rov eski
+    ma'lumotni yangi versiya ostida keshlab qo'yishi mumkin.
+    """
+    alias = sharding.shard_for(shop_id)
+    transaction.on_commit(
+        lambda: shop_cache.bump_shop(shop_id, catalog=catalog, sales=sales), using=alias
+    )
+
+    now = timezone.now()
+    fields = {}
+    if catalog:
+        fields["catalog_changed_at"] = now
+    if sales:
+        fields["sales_changed_at"] = now
+    if fields and shop_id is not None:
+        Shop.objects.using(alias).filter(pk=shop_id).update(**fields)
+
+
+def _member(user_id, shop="pk", owner="owner_id"):
+    """Foydalanuvchi do'kon egasi yoki xodimi (xodimlar do'kon bazasida)"""
+    staff = ShopStaff.objects.filter(shop_id=OuterRef(shop), user_id=user_id)
+    return Q(**{owner: user_id}) | Exists(staff)
+
+
+def shop_watermarks(shop_id, user_id=None):
+    """
+    Do'kon sahifalari uchun belgilar - bitta yengil so'rov.
+    user_id berilsa do'konni ko'ra olmaydigan foydalanuvchiga None.
+    """
+    shops = Shop.objects.using(sharding.shard_for(shop_id)).filter(pk=shop_id)
+    if user_id is not None:
+        shops = shops.filter(_member(user_id))
+    return shops.values_list(*Shop.WATERMARK_FIELDS).first()
+
+
+def product_watermarks(product_id, user_id=None):
+    """
+    Mahsulot sahifasi uchun: mahsulot, do'kon katalogi va sotuvlar belgilari.
+    Sahifadagi oxirgi sotuvlar admin da tahrirlanganda mahsulot belgisi
+    o'zgarmaydi - sotuvlar belgisi esa har qanday Sale o'zgarishida yangilanadi.
+    """
+    products = Product.objects.filter(pk=product_id)
+    if user_id is not None:
+        products = products.filter(_member(user_id, shop="shop_id", owner="shop__owner_id"))
+    return products.values_list(
+        "updated_at", "shop__catalog_changed_at", "shop__sales_changed_at"
+    ).first()
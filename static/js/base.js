@@ -0,0 +1,142 @@
+// static/js/base.js - narx va miqdor maydonlarini formatlash
+// Real-time formatlash
+document.addEventListener('DOMContentLoaded', function () {
+    // Formatlash funksiyasi - 17 000 format
+    function formatNumber(number) {
+        return number.toString().replace(/\B(?=(\d{3})+(?!\d))/g, " ");
+    }
+
+    // Kiritilgan qiymatni tozalash
+    function cleanNumberInput(value) {
+        // Barcha bo'shliq va vergullarni olib tashlash
+        return value.replace(/[,\s]/g, '');
+    }
+
+    // Barcha narxlarni formatlash (faqat ko'rsatish uchun)
+    document.querySelectorAll('.format-price').forEach(element => {
+        let value = element.textContent.trim();
+        value = cleanNumberInput(value);
+
+        if (/^\d+$/.test(value)) {
+            let numValue = parseInt(value);
+            if (!isNaN(numValue)) {
+                element.textContent = formatNumber(numValue);
+            }
+        }
+    });
+
+    // Statistik kartalarni formatlash
+    document.querySelectorAll('.stat-amount').forEach(element => {
+        let text = element.textContent.trim();
+        let match = text.match(/([\d\s,]+)(.*)/);
+
+        if (match) {
+            let number = cleanNumberInput(match[1]);
+            let currency = match[2];
+
+            if (/^\d+$/.test(number)) {
+                let numValue = parseInt(number);
+                if (!isNaN(numValue)) {
+                    element.textContent = formatNumber(numValue) + currency;
+                }
+            }
+        }
+    });
+
+    // Inputlar uchun real-time formatlash (NARX uchun)
+    document.querySelectorAll('input[data-format="price"]').forEach(input => {
+        input.addEventListener('input', function () {
+            // Fokusda bo'lganda formatni olib tashlash
+            let cursorPosition = this.selectionStart;
+            let originalValue = this.value;
+
+            // Tozalangan qiymat
+            let cleanValue = cleanNumberInput(originalValue);
+
+            // Faqat raqamlar qolsin
+            cleanValue = cleanValue.replace(/[^\d]/g, '');
+
+            if (!cleanValue) {
+                this.value = '';
+                return;
+            }
+
+            // Formatlash (bo'shliq bilan)
+            let formattedValue = formatNumber(cleanValue);
+
+            // Kursorni to'g'ri o'rniga qaytarish
+            this.value = formattedValue;
+
+            // Kursorni yangi o'ringa ko'chirish
+            let newCursorPosition = cursorPosition;
+            if (formattedValue.length !== originalValue.length) {
+                // Agar format o'zgarsa, kursorni moslashtirish
+                let diff = formattedValue.length - originalValue.length;
+                newCursorPosition = cursorPosition + diff;
+
+                // Chegaralarni tekshirish
+                newCursorPosition = Math.max(0, Math.min(newCursorPosition, formattedValue.length));
+            }
+
+            this.setSelectionRange(newCursorPosition, newCursorPosition);
+        });
+
+        // Inputga kirishda (focus) formatni olib tashlash
+        input.addEventListener('focus', function () {
+            let value = this.value;
+            if (value) {
+                this.value = cleanNumberInput(value);
+            }
+        });
+
+        // Inputdan chiqishda (blur) formatlash
+        input.addEventListener('blur', function () {
+            let value = this.value;
+            if (value) {
+                let cleanValue = cleanNumberInput(value);
+                if (/^\d+$/.test(cleanValue)) {
+                    this.value = formatNumber(cleanValue);
+                }
+            }
+        });
+    });
+
+    // Miqdor inputlari uchun formatlash
+    document.querySelectorAll('input[data-format="quantity"]').forEach(input => {
+        input.addEventListener('input', function () {
+            let value = this.value;
+            let cleanValue = cleanNumberInput(value);
+
+            // Faqat raqamlar qolsin
+            cleanValue = cleanValue.replace(/[^\d]/g, '');
+
+            if (!cleanValue) {
+                this.value = '';
+                return;
+            }
+
+            this.value = formatNumber(cleanValue);
+        });
+    });
+
+    // Form yuborilishidan oldin formatni olib tashlash
+    document.querySelectorAll('form').forEach(form => {
+        form.addEventListener('submit', function () {
+            // Narx inputlarini tozalash
+            this.querySelectorAll('input[data-format="price"]').forEach(input => {
+                let value = input.value;
+                if (value) {
+                    input.value = cleanNumberInput(value);
+                }
+            });
+
+            // Miqdor inputlarini tozalash
+            this.querySelectorAll('input[data-format="quantity"]').forEach(input => {
+                let value = input.value;
+                if (value) {
+                    input.value = cleanNumberInput(value);
+                }
+            });
+        });
+    });
+});
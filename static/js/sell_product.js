@@ -0,0 +1,87 @@
+// static/js/sell_product.js - mahsulot tanlanganda miqdor maydoni
+document.addEventListener('DOMContentLoaded', function () {
+    const productSelect = document.getElementById('id_product');
+    const quantityInput = document.getElementById('id_quantity');
+
+    // Mahsulot tanlanganda
+    productSelect.addEventListener('change', function () {
+        const selectedOption = this.options[this.selectedIndex];
+        if (selectedOption && selectedOption.value) {
+            // Ombordagi miqdorni olish (bu yerda siz backenddan ma'lumot olishingiz kerak)
+            // Hozircha faqat placeholder
+            quantityInput.placeholder = "Maksimal miqdor...";
+            quantityInput.max = ""; // Bu yerda max qiymatni o'rnatishingiz kerak
+        }
+    });
+
+    // Skaner: kod + Enter. Topilgan mahsulot tanlanadi, xuddi shu mahsulot
+    // qayta skanerlansa miqdor bittaga oshadi (ombordagidan oshmaydi)
+    const scanInput = document.getElementById('scanInput');
+    const scanResult = document.getElementById('scanResult');
+
+    function showScan(text, ok) {
+        scanResult.textContent = text;
+        scanResult.className = 'd-block mt-1 ' + (ok ? 'text-success' : 'text-danger');
+    }
+
+    function addScanned(product) {
+        const option = productSelect.querySelector('option[value="' + product.id + '"]');
+        if (!option || product.quantity <= 0) {
+            showScan(product.name + ' - omborda qolmagan', false);
+            return;
+        }
+
+        let quantity = 1;
+        if (productSelect.value === String(product.id)) {
+            quantity = (parseInt(quantityInput.value.replace(/[^\d]/g, '')) || 0) + 1;
+        }
+        if (quantity > product.quantity) {
+            quantity = product.quantity;
+            showScan(product.name + ' - omborda faqat ' + product.quantity + ' ' + product.unit, false);
+        } else {
+            showScan(product.name + ' - ' + Number(product.price).toLocaleString('ru-RU').replace(/,/g, ' ')
+                + " so'm, omborda " + product.quantity + ' ' + product.unit, true);
+        }
+
+        productSelect.value = String(product.id);
+        quantityInput.max = product.quantity;
+        quantityInput.value = quantity;
+    }
+
+    if (scanInput) {
+        scanInput.addEventListener('keydown', function (event) {
+            if (event.key !== 'Enter') {
+                return;
+            }
+            // Skaner Enter bosadi - formani yubormaslik
+            event.preventDefault();
+            const code = this.value.trim();
+            this.value = '';
+            if (!code) {
+                return;
+            }
+
+            fetch(this.dataset.scanUrl + '?code=' + encodeURIComponent(code), {
+                headers: { 'Accept': 'application/json' },
+            })
+                .then(response => response.json())
+                .then(data => {
+                    if (data.status === 'ok') {
+                        addScanned(data.product);
+                    } else {
+                        showScan(code + ' - ' + (data.message || 'Mahsulot topilmadi'), false);
+                    }
+                })
+                .catch(() => showScan("Server bilan bog'lanib bo'lmadi", false));
+        });
+    }
+
+    // Real-time formatlash
+    quantityInput.addEventListener('input', function () {
+        let value = this.value.replace(/[^\d]/g, '');
+        if (value) {
+            value = parseInt(value).toLocaleString('ru-RU').replace(/,/g, ' ');
+            this.value = value;
+        }
+    });
+});
@@ -0,0 +1,62 @@
+// static/js/shop_live.js - do'kon paneli: jonli yangilanish (SSE)
+// Server har bir hodisada mutlaq qiymatlarni yuboradi (statistika va
+// o'zgargan mahsulot qatorlari) - hodisa qayta kelsa ham natija o'zgarmaydi.
+document.addEventListener('DOMContentLoaded', function () {
+    const live = document.getElementById('shop-live');
+    if (!live || !window.EventSource) {
+        return;
+    }
+
+    const url = live.dataset.eventsUrl
+        + '?catalog=' + encodeURIComponent(live.dataset.catalog)
+        + '&sales=' + encodeURIComponent(live.dataset.sales);
+
+    // Mahsulot qo'shilgan yoki o'chirilgan - jadval sahifasi va filtr
+    // sonlarini faqat sahifani yangilash to'g'rilaydi
+    function showReload() {
+        live.classList.remove('d-none');
+    }
+
+    function applyStats(stats) {
+        Object.keys(stats).forEach(key => {
+            document.querySelectorAll('[data-stat="' + key + '"]').forEach(element => {
+                element.innerHTML = stats[key].html;
+            });
+        });
+
+        const count = stats.total_products_count;
+        if (count && Number(count.value) !== Number(live.dataset.products)) {
+            showReload();
+        }
+    }
+
+    function applyProducts(products, removed) {
+        products.forEach(product => {
+            // Boshqa sahifadagi yoki filtrga tushmagan mahsulot
+            const row = document.querySelector('tr[data-product-id="' + product.id + '"]');
+            if (!row) {
+                return;
+            }
+            row.querySelector('[data-cell="stock"]').innerHTML = product.stock_html;
+            row.querySelector('[data-cell="value"]').innerHTML = product.value_html;
+        });
+
+        removed.forEach(id => {
+            const row = document.querySelector('tr[data-product-id="' + id + '"]');
+            if (row) {
+                row.remove();
+            }
+        });
+    }
+
+    function onEvent(event) {
+        const data = JSON.parse(event.data);
+        applyProducts(data.products, data.removed);
+        applyStats(data.stats);
+    }
+
+    const source = new EventSource(url);
+    ['sale', 'cancel', 'restore', 'income', 'stock', 'product', 'snapshot'].forEach(kind => {
+        source.addEventListener(kind, onEvent);
+    });
+});
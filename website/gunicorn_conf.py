@@ -0,0 +1,67 @@
+# website/gunicorn_conf.py
+"""
+Gunicorn sozlamalari.
+
+    gunicorn -c website/gunicorn_conf.py
+
+SERVER_PROFILE muhit o'zgaruvchisi:
+    wsgi (standart) - sinxron worker lar, website.wsgi
+    asgi            - uvicorn worker lar, website.asgi: async view lar
+                      (bot_status, telegram_users, webhook, cache_stats,
+                      shop_events) kutish paytida oqimni band qilmaydi;
+                      jonli panel (SSE) faqat shu profilda ishlaydi
+
+Ilova master jarayonda oldindan yuklanadi (preload): kod fork orqali
+bo'lishiladi. Har bir worker so'rov qabul qilishdan oldin isitiladi
+(shop/warmup.py). max_requests + jitter worker larni navbat bilan
+yangilaydi - hammasi bir vaqtda qayta tug'ilmaydi.
+"""
+import multiprocessing
+import os
+
+SERVER_PROFILE = os.environ.get("SERVER_PROFILE", "wsgi")
+
+CPU_COUNT = multiprocessing.cpu_count()
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+preload_app = os.environ.get("GUNICORN_PRELOAD", "True") == "True"
+
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 2000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", max_requests // 10))
+
+if SERVER_PROFILE == "asgi":
+    wsgi_app = "website.asgi:application"
+    worker_class = "uvicorn_worker.UvicornWorker"
+    # Har bir worker o'z event loop ida ko'p so'rovni kutadi
+    workers = int(os.environ.get("GUNICORN_WORKERS", CPU_COUNT))
+elif SERVER_PROFILE == "wsgi":
+    wsgi_app = "website.wsgi:application"
+    workers = int(os.environ.get("GUNICORN_WORKERS", CPU_COUNT * 2 + 1))
+    threads = int(os.environ.get("GUNICORN_THREADS", 1))
+    worker_class = "gthread" if threads > 1 else "sync"
+else:
+    raise RuntimeError(f"Noma'lum SERVER_PROFILE: {SERVER_PROFILE}")
+
+# locmem keshi jarayon ichida: bir worker dagi yozuv kesh versiyasini faqat
+# o'zida yangilaydi, qolganlari eskirgan statistikani ko'rsatadi
+if workers > 1 and os.environ.get("CACHE_BACKEND", "file") == "locmem":
+    raise RuntimeError(
+        "CACHE_BACKEND=locmem bilan faqat bitta worker (GUNICORN_WORKERS=1) ishlaydi;"
+        " file yoki redis keshini tanlang"
+    )
+
+
+def post_fork(server, worker):
+    # preload da master ochgan ulanishlar bolaga o'tmasligi kerak
+    if preload_app:
+        from django.db import connections
+
+        connections.close_all()
+
+
+def post_worker_init(worker):
+    from shop.warmup import warm_up
+
+    # Ulanishlar oqimga bog'langan - faqat sync worker so'rovni shu oqimda bajaradi
+    warm_up(prime=worker_class == "sync")
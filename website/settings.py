@@ -2,11 +2,13 @@
 import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = "django-insecure-your-secret-key-change-in-production"
 
-DEBUG = True
+DEBUG = os.environ.get("DEBUG", "True") == "True"
 
 ALLOWED_HOSTS = ["*"]
 
@@ -21,13 +23,19 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "shop.middleware.MetricsMiddleware",
+    "shop.middleware.RequestContextMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
+    "shop.middleware.ShardMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "shop.middleware.QueryInstrumentationMiddleware",
+    "shop.middleware.ProfilerMiddleware",
 ]
 
 ROOT_URLCONF = "website.urls"
@@ -48,15 +56,135 @@ TEMPLATES = [
     },
 ]
 
+# Productionda shablonlar bir marta kompilyatsiya qilinib, xotirada saqlanadi
+if not DEBUG:
+    TEMPLATES[0]["APP_DIRS"] = False
+    TEMPLATES[0]["OPTIONS"]["loaders"] = [
+        (
+            "django.template.loaders.cached.Loader",
+            [
+                "django.template.loaders.filesystem.Loader",
+                "django.template.loaders.app_directories.Loader",
+            ],
+        ),
+    ]
+
 WSGI_APPLICATION = "website.wsgi.application"
 
+# Ulanish so'rovlar orasida saqlanadi (worker isitishda ochilgan ulanish
+# birinchi so'rovga qoladi). PRAGMA lar har bir yangi ulanishda bajariladi:
+# WAL - o'qishlar yozishni kutmaydi.
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", 60)),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            "timeout": 20,
+            "init_command": (
+                "PRAGMA journal_mode=WAL;"
+                "PRAGMA synchronous=NORMAL;"
+                "PRAGMA temp_store=MEMORY;"
+                "PRAGMA cache_size=-20000;"
+                "PRAGMA mmap_size=134217728;"
+            ),
+        },
+        # Test bazasi faylda: xotiradagi SQLite da oqimli testlar
+        # (shop/tests.py) "table is locked" bilan yiqiladi
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
+    }
+}
+
+# Do'konlar bo'yicha bazalar (shop/sharding.py): SHOP_SHARDS="shard1,shard2" -
+# har biri alohida SQLite fayli, do'kon ma'lumotlari Shop.shard bazasida.
+# Yangi bazaga jadvallar: python manage.py migrate --database shard1
+# Bazalar orasida tashqi kalitlarni SQLite tekshira olmaydi (foydalanuvchi,
+# do'kon "default" da) - do'kon bazalarida tekshiruv o'chiriladi.
+SHARD_ALIASES = [
+    alias.strip() for alias in os.environ.get("SHOP_SHARDS", "").split(",") if alias.strip()
+]
+for alias in SHARD_ALIASES:
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "NAME": BASE_DIR / f"{alias}.sqlite3",
+        "OPTIONS": {
+            **DATABASES["default"]["OPTIONS"],
+            "init_command": DATABASES["default"]["OPTIONS"]["init_command"]
+            + "PRAGMA foreign_keys=OFF;",
+        },
+        "TEST": {"NAME": BASE_DIR / f"test_{alias}.sqlite3"},
     }
+
+DATABASE_ROUTERS = ["shop.sharding.ShopRouter"]
+
+SHOP_SHARDS = {
+    "ALIASES": ["default", *SHARD_ALIASES],
+    "ID_BLOCK": 100,  # bir jarayon "default" dan bir marta oladigan id lar
+    "MOVE_GRACE": 5,  # ko'chirishdan oldin boshlangan so'rovlarni kutish (soniya)
 }
 
+# Kesh sozlamalari: file (standart), redis yoki locmem. Kesh versiyalari,
+# hisoblash qulflari va login cheklovi barcha worker lar uchun umumiy
+# bo'lishi kerak - locmem faqat bitta jarayon bilan ishlaydi (runserver,
+# testlar, GUNICORN_WORKERS=1; gunicorn_conf.py ko'p worker bilan ishga
+# tushmaydi).
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "file")
+REDIS_URL = os.environ.get("REDIS_URL", "redis://127.0.0.1:6379/1")
+
+if CACHE_BACKEND == "redis":
+    try:
+        import redis  # noqa: F401
+    except ImportError:
+        raise ImproperlyConfigured("CACHE_BACKEND=redis uchun redis paketi o'rnatilmagan")
+elif CACHE_BACKEND not in ("file", "locmem"):
+    raise ImproperlyConfigured(f"Noma'lum CACHE_BACKEND: {CACHE_BACKEND}")
+
+if CACHE_BACKEND == "redis":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+elif CACHE_BACKEND == "file":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.environ.get("CACHE_DIR", BASE_DIR / ".django_cache"),
+            "OPTIONS": {"MAX_ENTRIES": 20000},
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "shopcontrol",
+            "OPTIONS": {"MAX_ENTRIES": 20000},
+        }
+    }
+
+SHOP_CACHE = {
+    "ALIAS": "default",
+    "STATS_TIMEOUT": 300,  # 5 daqiqa
+    "LOCK_TIMEOUT": 10,  # hisoblash qulfi (soniya)
+    "LOCK_WAIT": 2.0,  # boshqa jarayon hisoblashini kutish (soniya)
+    "BOT_COUNTS_TIMEOUT": 60,  # bot_status hisoblagichlari
+}
+
+# Sessiyalar: db, cached_db yoki cookie (imzolangan cookie - bazaga umuman
+# murojaat yo'q). cached_db faqat umumiy kesh (redis/file) bilan to'g'ri
+# ishlaydi - locmem da har bir worker o'z nusxasini saqlaydi.
+SESSION_BACKEND = os.environ.get(
+    "SESSION_BACKEND", "db" if CACHE_BACKEND == "locmem" else "cached_db"
+)
+SESSION_ENGINE = {
+    "db": "django.contrib.sessions.backends.db",
+    "cached_db": "django.contrib.sessions.backends.cached_db",
+    "cookie": "django.contrib.sessions.backends.signed_cookies",
+}[SESSION_BACKEND]
+SESSION_COOKIE_HTTPONLY = True
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -84,6 +212,20 @@ STATIC_URL = "/static/"
 STATICFILES_DIRS = [BASE_DIR / "static"]
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
+# Statik fayllar WhiteNoise orqali: productionda nomida kontent xeshi bor
+# (app.3f2a1c.css), oldindan gzip/brotli qilingan va "immutable" kesh
+# sarlavhasi bilan beriladi. collectstatic deploy da bajarilishi shart.
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {
+        "BACKEND": (
+            "django.contrib.staticfiles.storage.StaticFilesStorage"
+            if DEBUG
+            else "whitenoise.storage.CompressedManifestStaticFilesStorage"
+        ),
+    },
+}
+
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
@@ -105,3 +247,138 @@ BOT_SETTINGS = {
     "SUPPORT_USERNAME": "@shopcontrol_support",
 }
 
+# So'rovlarni o'lchash (SQL soni/vaqti, Server-Timing, sekin so'rovlar logi)
+SHOP_INSTRUMENTATION = {
+    "ENABLED": os.environ.get("SHOP_INSTRUMENTATION", "False") == "True",
+    "SLOW_REQUEST_MS": int(os.environ.get("SLOW_REQUEST_MS", 500)),
+    "TOP_QUERIES": 5,
+    "DUPLICATE_THRESHOLD": 3,  # shuncha marta takrorlansa N+1 deb hisoblanadi
+}
+
+# Superuser uchun so'rov profillari (X-Profile: 1 yoki ?_profile=1)
+SHOP_PROFILING = {
+    "ENABLED": os.environ.get("SHOP_PROFILING", "False") == "True",
+    "DIR": Path(os.environ.get("PROFILE_DIR", BASE_DIR / "profiles")),
+    "MAX_PROFILES": 200,
+    "TOP_FUNCTIONS": 50,
+}
+
+# Prometheus metrikalari (/metrics). Bir nechta worker bo'lsa METRICS_DIR
+# ko'rsatilishi kerak - har bir jarayon o'z holatini shu yerga yozadi.
+# METRICS_TOKEN bo'lmasa /metrics faqat xodimlarga (is_staff) ochiq.
+SHOP_METRICS = {
+    "ENABLED": os.environ.get("SHOP_METRICS", "True") == "True",
+    "DIR": os.environ.get("METRICS_DIR"),
+    "FLUSH_INTERVAL": 5,  # soniya
+    "TOKEN": os.environ.get("METRICS_TOKEN"),
+}
+
+# Oflayn kassa (POS) API
+SHOP_API = {
+    "MAX_BATCH": 500,  # bitta sinxronizatsiya paketidagi sotuvlar soni
+    "TELEGRAM_USERS_PAGE_SIZE": 100,  # telegram_users sahifasi (standart)
+    "TELEGRAM_USERS_MAX_PAGE_SIZE": 5000,
+}
+
+# Sotish/bekor qilish/tiklash formalarining takroriy yuborilishidan himoya
+SHOP_IDEMPOTENCY = {
+    "TTL": 24 * 3600,  # kalit saqlanish muddati (soniya)
+    "WAIT": 2.0,  # parallel takroriy so'rov birinchisini kutadigan vaqt
+}
+
+# Login urinishlarini cheklash (token bucket, SHOP_CACHE keshida)
+SHOP_LOGIN_THROTTLE = {
+    "ENABLED": os.environ.get("LOGIN_THROTTLE", "True") == "True",
+    "IP": {"CAPACITY": 20, "REFILL_PER_MINUTE": 10},
+    "USERNAME": {"CAPACITY": 5, "REFILL_PER_MINUTE": 1},
+    # Proksi ortida: "HTTP_X_FORWARDED_FOR" (faqat ishonchli proksi bo'lsa)
+    "IP_HEADER": os.environ.get("LOGIN_THROTTLE_IP_HEADER"),
+}
+
+# Do'kon, mahsulot va sotuvlar tarixi sahifalari uchun shartli GET (304).
+# APP_VERSION - shablonlar o'zgargan deployda eski ETag larni bekor qiladi.
+SHOP_CONDITIONAL_GET = {
+    "ENABLED": os.environ.get("CONDITIONAL_GET", "True") == "True",
+    "VERSION": os.environ.get("APP_VERSION", ""),
+}
+
+# Do'kon sahifasidagi mahsulotlar ro'yxati (shop/facets.py)
+SHOP_PRODUCT_LIST = {
+    "PAGE_SIZE": 50,
+}
+
+# Do'kon paneli uchun jonli hodisalar (SSE, shop/events.py) - faqat ASGI
+# profilida (SERVER_PROFILE=asgi), WSGI da oqim 204 qaytaradi
+SHOP_EVENTS = {
+    "ENABLED": os.environ.get("LIVE_EVENTS", "True") == "True",
+    "HEARTBEAT": 20,  # soniya: ping va do'kon belgilarini tekshirish
+    "QUEUE_SIZE": 100,  # har bir panel navbati (to'lsa hodisa tashlanadi)
+    "RETRY_MS": 5000,  # brauzer qayta ulanishdan oldin kutadi
+}
+
+# Worker isitish (shop/warmup.py, gunicorn post_worker_init)
+SHOP_WARMUP = {
+    "ENABLED": os.environ.get("WARMUP", "True") == "True",
+    "PREFILL_SHOPS": 20,  # statistikasi oldindan keshlanadigan do'konlar
+}
+
+# Eski sotuvlarni arxivlash (manage.py archive_sales)
+SHOP_ARCHIVE = {
+    "HORIZON_DAYS": 365,  # shundan eski sotuvlar arxivga ko'chiriladi
+    "BATCH_SIZE": 2000,  # bitta tranzaksiyada ko'chiriladigan sotuvlar
+}
+
+LOG_DIR = Path(os.environ.get("LOG_DIR", BASE_DIR / "logs"))
+LOG_DIR.mkdir(parents=True, exist_ok=True)
+
+# Loglar: JSON formatda, so'rov konteksti bilan. Handlerlar asinxron -
+# so'rov oqimi faqat navbatga yozadi (shop/log_utils.py).
+LOGGING_CONFIG = "shop.log_utils.configure_logging"
+
+SHOP_LOGGING = {
+    "ASYNC": os.environ.get("LOG_ASYNC", "True") == "True",
+}
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "json": {"()": "shop.log_utils.JsonFormatter"},
+    },
+    "filters": {
+        "request_context": {"()": "shop.log_utils.RequestContextFilter"},
+        "rate_limit": {
+            "()": "shop.log_utils.RateLimitFilter",
+            "rate": 20,  # bir joydan daqiqasiga 20 tadan ko'p ogohlantirish/xato yozilmaydi
+            "per": 60,
+        },
+    },
+    "handlers": {
+        "console": {
+            "class": "logging.StreamHandler",
+            "formatter": "json",
+            "filters": ["request_context", "rate_limit"],
+        },
+        "slow_requests": {
+            "class": "logging.handlers.RotatingFileHandler",
+            "filename": LOG_DIR / "slow_requests.log",
+            "maxBytes": 10 * 1024 * 1024,
+            "backupCount": 5,
+            "formatter": "json",
+            "filters": ["request_context"],
+        },
+    },
+    "loggers": {
+        "shop": {
+            "handlers": ["console"],
+            "level": os.environ.get("LOG_LEVEL", "INFO"),
+            "propagate": False,
+        },
+        "shop.perf": {"handlers": ["console"], "level": "INFO", "propagate": False},
+        "shop.perf.slow": {
+            "handlers": ["slow_requests"],
+            "level": "WARNING",
+            "propagate": False,
+        },
+    },
+}
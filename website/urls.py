@@ -4,7 +4,19 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from shop import profiling
+
 urlpatterns = [
+    path(
+        "admin/profiles/",
+        admin.site.admin_view(profiling.profiles_view),
+        name="admin_profiles",
+    ),
+    path(
+        "admin/profiles/<str:name>/",
+        admin.site.admin_view(profiling.profile_detail_view),
+        name="admin_profile_detail",
+    ),
     path("admin/", admin.site.urls),
     path("", include("shop.urls")),
 ]